@@ -35,6 +35,9 @@ def create_app(config_class='config.DevelopmentConfig'):
     app.elasticsearch = Elasticsearch([app.config['ELASTICSEARCH_URL']]) \
             if app.config['ELASTICSEARCH_URL'] else None
 
+    from app.player_store import init_player_store
+    init_player_store(app)
+
     return app
 
 
@@ -3,4 +3,5 @@ from flask import Blueprint
 # API Blueprint
 bp = Blueprint('api', __name__)
 
-from app.api import players, errors, auth
+from app.api import (
+    players, compare, leaders, similar, headshots, errors, auth)
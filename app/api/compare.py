@@ -0,0 +1,117 @@
+from flask import request
+from app import db, cache
+from app.api import bp
+from app.api.errors import bad_request, error_response
+from app.api.players import parse_player_ids
+from app.api.serializers import json_response, link_template, parse_fields
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+from app.snapshots import current_version
+
+
+# Stats where the lowest value leads
+LOWER_IS_BETTER = {'turnovers'}
+
+
+def compare_cache_key():
+    """
+    Cache key of a compare request: the requested ids, sorted, so 'A vs B'
+    and 'B vs A' share a cache entry, and the requested fields if any,
+    under the version of the players table (see request_cache_key).
+    """
+    prefix = f'compare:{current_version()}:'
+    try:
+        ids = sorted(parse_player_ids(request.args.get('ids', '')))
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError:
+        return prefix + request.args.get('ids', '') + ':' + \
+            request.args.get('fields', '')
+    key = prefix + ','.join(str(id) for id in ids)
+    if fields is not None:
+        key += ':' + ','.join(fields)
+    return key
+
+
+def compare_stat(ids, values, lower_is_better=False):
+    """
+    Compare one stat of the players 'ids', whose values are 'values' (None
+    where unknown). Returns the values, the id of the leading player (None
+    if no value is known or the best value is shared), and each player's
+    difference with and ratio to the leader's value.
+    """
+    known = [value for value in values if value is not None]
+    best = (min if lower_is_better else max)(known) if known else None
+    leaders = [id for id, value in zip(ids, values) if value == best]
+    return {
+        'values': values,
+        'leader': leaders[0] if best is not None and len(leaders) == 1
+            else None,
+        'differences': [
+            round(value - best, 3) if value is not None else None
+            for value in values],
+        'ratios': [
+            round(value / best, 3) if value is not None and best else None
+            for value in values],
+    }
+
+
+def compare_rows(rows, stats=None):
+    """
+    Compare the stats of players given as (id, *stats) rows, 'stats' being
+    SHOOTING_STATS + OTHER_STATS by default. Stats are compared column by
+    column in a single pass over the transposed rows and grouped like
+    Player.to_dict().
+    """
+    stats = SHOOTING_STATS + OTHER_STATS if stats is None else stats
+    ids, *columns = zip(*rows)
+    compared = {
+        stat: compare_stat(list(ids), list(values), stat in LOWER_IS_BETTER)
+        for stat, values in zip(stats, columns)}
+    shooting = {stat: compared[stat] for stat in SHOOTING_STATS
+                if stat in compared}
+    return {
+        **({'shooting': shooting} if shooting else {}),
+        **{stat: compared[stat] for stat in OTHER_STATS if stat in compared},
+    }
+
+
+@bp.route('/players/compare', methods=['GET'])
+@cache.cached(timeout=60, key_prefix=compare_cache_key)
+def compare_players():
+    """
+    Compares the players whose primary keys are listed in the 'ids' query
+    parameter (e.g. ?ids=1,2), 2 or more of them. Returns the players, in
+    increasing id order, and every stat of Player.to_dict() side by side
+    with the leading player, and each player's difference with and ratio
+    to the leader. Requested ids that matched no player are listed in
+    'missing'; returns a 404 error if fewer than 2 players were found.
+    Only the stats listed in the 'fields' query parameter are compared if
+    it is given.
+    """
+    try:
+        ids = sorted(parse_player_ids(request.args.get('ids', '')))
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return bad_request(str(e))
+    if len(ids) < 2:
+        return bad_request('At least 2 ids must be compared')
+    stats = tuple(stat for stat in SHOOTING_STATS + OTHER_STATS
+                  if fields is None or stat in fields)
+    if not stats:
+        return bad_request('fields must include a stat to compare')
+    rows = db.session.query(
+        Player.id, Player.player_name,
+        *[getattr(Player, stat) for stat in stats]).filter(
+        Player.id.in_(ids)).order_by(Player.id).all()
+    if len(rows) < 2:
+        return error_response(404, 'At least 2 players must be found')
+    found = {row[0] for row in rows}
+    self_link = link_template('api.get_player_id', 'id')
+    return json_response({
+        'players': [{
+            'id': row[0],
+            'player_name': row[1],
+            '_links': {'self': self_link.format(row[0])}
+        } for row in rows],
+        'stats': compare_rows([(row[0], *row[2:]) for row in rows], stats),
+        'missing': [id for id in ids if id not in found]
+    })
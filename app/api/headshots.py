@@ -0,0 +1,32 @@
+from flask import abort, request, send_file
+from app.api import bp
+from app.image_store import IMAGE_NAME, image_store
+
+
+# Stored images never change, so clients and proxies may keep them for a year
+HEADSHOT_MAX_AGE = 31536000
+HEADSHOT_CACHE_CONTROL = f'public, max-age={HEADSHOT_MAX_AGE}, immutable'
+
+
+@bp.route('/headshots/<string:name>', methods=['GET'])
+def get_headshot(name):
+    """
+    Serve a mirrored player headshot from the image store (IMAGE_STORE_DIR).
+    'name' is the content hash of the image plus its extension, as linked
+    from a player's representation, so the image's strong ETag is its hash
+    and it is cached for good. Returns 304 if the client's If-None-Match
+    matches, without reading the image, and a 404 error if no such image
+    is stored.
+    """
+    if not IMAGE_NAME.match(name):
+        abort(404)
+    try:
+        # The file is streamed, and closed unread for a 304
+        response = send_file(
+            image_store().path(name), conditional=False, add_etags=False,
+            cache_timeout=HEADSHOT_MAX_AGE)
+    except FileNotFoundError:
+        abort(404)
+    response.set_etag(name.split('.')[0])
+    response.headers['Cache-Control'] = HEADSHOT_CACHE_CONTROL
+    return response.make_conditional(request)
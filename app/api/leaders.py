@@ -0,0 +1,64 @@
+from flask import request
+from app.api import bp
+from app.api.errors import bad_request, error_response
+from app.api.serializers import json_response, link_template
+from app.leaders import ATTEMPTS, LEADER_STATS, leaders
+
+
+# Most entries returned by one leaderboard request
+MAX_LEADERS = 100
+
+
+@bp.route('/leaders/<string:stat>', methods=['GET'])
+def get_leaders(stat):
+    """
+    Returns the top players in 'stat' (a Player stat, e.g. points) as a
+    JSON response, ranked with ties sharing a rank. Query parameters:
+    'limit' (25 by default, at most MAX_LEADERS), 'position' to keep the
+    players of a position (e.g. PG) and, for percentage stats,
+    'min_attempts' to keep the players averaging at least that many
+    attempts. Entries come from the precomputed leaderboards of
+    app.leaders, so the players table is not sorted per request.
+    """
+    if stat not in LEADER_STATS:
+        return error_response(404, f'Unknown stat: {stat}')
+    limit = request.args.get('limit', 25, type=int)
+    if not 1 <= limit <= MAX_LEADERS:
+        return bad_request(f'limit must be between 1 and {MAX_LEADERS}')
+    position = request.args.get('position') or None
+    min_attempts = None
+    if 'min_attempts' in request.args:
+        if stat not in ATTEMPTS:
+            return bad_request(f'{stat} has no attempts to filter by')
+        min_attempts = request.args.get('min_attempts', type=float)
+        if min_attempts is None:
+            return bad_request('min_attempts must be a number')
+
+    entries = leaders(stat, limit, position, min_attempts)
+    self_link = link_template('api.get_player_id', 'id')
+    items = []
+    for index, (id, player_name, positions, value, attempts) in enumerate(
+            entries):
+        # Tied players share the rank of the first of them
+        rank = items[-1]['rank'] if items and items[-1]['value'] == value \
+            else index + 1
+        item = {
+            'rank': rank,
+            'id': id,
+            'player_name': player_name,
+            'positions': positions,
+            'value': value,
+            '_links': {'self': self_link.format(id)}
+        }
+        if stat in ATTEMPTS:
+            item['attempts'] = attempts
+        items.append(item)
+    return json_response({
+        'stat': stat,
+        'items': items,
+        '_meta': {
+            'limit': limit,
+            'position': position,
+            'min_attempts': min_attempts
+        }
+    })
@@ -1,70 +1,430 @@
-from flask import jsonify, request, url_for
+from bisect import bisect_right
+from urllib.parse import urlencode
+from flask import abort, jsonify, request, url_for
+import hashlib
+import math
 from app.api import bp
 from app.api.auth import auth
 from app.models import Player
 from app.api.errors import bad_request
+from app.leaders import patch_leaderboards
+from app.percentiles import PERCENTILE_STATS, add_percentiles
+from app.player_store import player_store
+from app.snapshots import current_version
+from app.api.serializers import (
+    count_cache_key, count_players, json_response, parse_fields,
+    player_rows, player_serializer, request_cache_key)
 from app import db, cache
 
 
+def request_serializer(fields=None):
+    """
+    Return the PlayerSerializer of the fields listed in 'fields', or in the
+    request's 'fields' argument (e.g. ?fields=points,assists), so only
+    these columns are read and returned. Raises ValueError for an unknown
+    field.
+    """
+    if fields is None:
+        fields = request.args.get('fields')
+    return player_serializer(parse_fields(fields))
+
+
+def request_percentiles():
+    """
+    Return whether the request asks for the league percentile and rank of
+    the players' stats, with ?percentiles=true (see add_percentiles).
+    """
+    return request.args.get('percentiles', '').lower() in ('1', 'true', 'yes')
+
+
 @bp.route('/players/<int:id>', methods=['GET'])
-@cache.cached(timeout=60, query_string=True)
+@cache.cached(timeout=60, key_prefix=request_cache_key)
 def get_player_id(id):
     """
     Queries database for player corresponding to provided primary key (id)
     in URL and returns JSON response if found. Otherwise, returns a 404 error.
+    Only the fields listed in the 'fields' query parameter are returned if
+    it is given, and with ?percentiles=true the league percentile of each
+    stat, as with every player read endpoint.
     """
-    return jsonify(Player.query.get_or_404(id).to_dict())
+    try:
+        serializer = request_serializer()
+    except ValueError as e:
+        return bad_request(str(e))
+    store = player_store()
+    if store is not None:
+        if store.find(id) is None:
+            abort(404)
+        row = store.values([id], serializer.columns)[0]
+    else:
+        row = player_rows(
+            Player.query.filter(Player.id == id), serializer).first_or_404()
+    data = serializer([row])
+    return json_response(
+        (add_percentiles(data) if request_percentiles() else data)[0])
+
+
+@bp.route('/players/<int:id>/percentiles', methods=['GET'])
+@cache.cached(timeout=60, key_prefix=request_cache_key)
+def get_player_percentiles(id):
+    """
+    Queries database for player corresponding to provided primary key (id)
+    in URL and returns the league percentile and rank of each of their
+    stats as JSON response, grouped like Player.to_dict(). Returns a 404
+    error if the player is not found.
+    """
+    serializer = player_serializer(('player_name',) + PERCENTILE_STATS)
+    row = player_rows(
+        Player.query.filter(Player.id == id), serializer).first_or_404()
+    data = add_percentiles(serializer([row]))[0]
+    return json_response({
+        'id': data['id'],
+        'player_name': data['player_name'],
+        'percentiles': data['percentiles'],
+        '_links': data['_links']
+    })
 
 
 # TODO change this to elasticsearch to account for players with same name
 @bp.route('/players/<string:player_name>', methods=['GET'])
-@cache.cached(timeout=60, query_string=True)
+@cache.cached(timeout=60, key_prefix=request_cache_key)
 def get_player_name(player_name):
     """
     Queries database for player corresponding to provided player name in URL
     and returns player as JSON response if found. Otherwise, returns 404
     error.
     """
-    player = Player.query.filter_by(
-        player_name=player_name.replace('+', ' ')).first_or_404()
-    return jsonify(player.to_dict())
+    try:
+        serializer = request_serializer()
+    except ValueError as e:
+        return bad_request(str(e))
+    player_name = player_name.replace('+', ' ')
+    store = player_store()
+    if store is not None:
+        id = store.find_name(player_name)
+        if id is None:
+            abort(404)
+        row = store.values([id], serializer.columns)[0]
+    else:
+        row = player_rows(Player.query.filter_by(
+            player_name=player_name), serializer).first_or_404()
+    data = serializer([row])
+    return json_response(
+        (add_percentiles(data) if request_percentiles() else data)[0])
+
+
+# Most players accepted by one batch lookup
+MAX_BATCH_IDS = 100
+
+
+def player_cache_key(id, fields=None, version=None):
+    """
+    Return the cache key of the serialized player with primary key id, with
+    only 'fields' (see parse_fields) if given. Keys include the version of
+    the players table (see app.snapshots), the current one by default, so
+    every field set of a player is out of date once players are written.
+    """
+    if version is None:
+        version = current_version()
+    if fields is None:
+        return f'player:{version}:{id}'
+    return f'player:{version}:{id}:' + ','.join(fields)
+
+
+def parse_player_ids(ids):
+    """
+    Return the player ids in 'ids' (a comma separated string or a list),
+    without duplicates and in the requested order. Raises ValueError if an
+    id is not an integer or there are more than MAX_BATCH_IDS of them.
+    """
+    if isinstance(ids, str):
+        ids = [id for id in ids.split(',') if id.strip()]
+    if not isinstance(ids, list):
+        raise ValueError('ids must be a list of player ids')
+    try:
+        ids = list(dict.fromkeys(int(id) for id in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be integers')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids can be requested')
+    return ids
 
 
-@bp.route('/players/', methods=['GET'])
-@cache.cached(timeout=60, query_string=True)
+def player_fragments(ids, fields=None):
+    """
+    Return a dict mapping the ids of the players found among 'ids' to their
+    to_dict() representation, with only 'fields' if given. Representations
+    are cached per player and field set, so overlapping batches share them;
+    the players not cached are loaded with a single IN query.
+    """
+    version = current_version()
+    cached = cache.get_many(*[
+        player_cache_key(id, fields, version) for id in ids]) if ids else []
+    fragments = {id: data for id, data in zip(ids, cached)
+                 if data is not None}
+    missing = [id for id in ids if id not in fragments]
+    if missing:
+        serializer = player_serializer(fields)
+        loaded = {data['id']: data for data in serializer(player_rows(
+            Player.query.filter(Player.id.in_(missing)), serializer))}
+        cache.set_many({player_cache_key(id, fields, version): data
+                        for id, data in loaded.items()}, timeout=60)
+        fragments.update(loaded)
+    return fragments
+
+
+def players_batch_response(ids, fields=None):
+    """
+    Return the JSON response of a batch lookup: the players of 'ids' in
+    the requested order, with the fields listed in 'fields' or in the
+    request's 'fields' argument, and the ids that matched no player.
+    """
+    try:
+        ids = parse_player_ids(ids)
+        fields = parse_fields(
+            request.args.get('fields') if fields is None else fields)
+    except ValueError as e:
+        return bad_request(str(e))
+    fragments = player_fragments(ids, fields)
+    items = [fragments[id] for id in ids if id in fragments]
+    return json_response({
+        'items': add_percentiles(items) if request_percentiles() else items,
+        'missing': [id for id in ids if id not in fragments]
+    })
+
+
+def parse_sort(sort):
+    """
+    Return the sort order (see PaginatedAPIMixin.to_cursor_dict) of 'sort',
+    a comma separated list of Player columns, each prefixed with '-' to
+    sort in descending order (e.g. '-points,assists'). Players are sorted
+    by id last. Raises ValueError for an unknown column.
+    """
+    columns = Player.__table__.columns
+    order = []
+    seen = set()
+    for name in (name.strip() for name in sort.split(',')):
+        descending = name.startswith('-')
+        name = name[1:] if descending else name
+        if not name or name in seen:
+            continue
+        if name not in columns:
+            raise ValueError(f'Unknown sort field: {name}')
+        seen.add(name)
+        column = getattr(Player, name)
+        order.append(column.desc() if descending else column)
+    if 'id' not in seen:
+        order.append(Player.id)
+    return order
+
+
+def parse_filters(args):
+    """
+    Return the criteria of the stat range filters among the request
+    arguments 'args': min_<column> and max_<column> (e.g.
+    min_three_pt_pct=0.38) keep the players whose numeric Player column is
+    at least or at most the value. Raises ValueError for an unknown column
+    or a value that is not a number.
+    """
+    columns = Player.__table__.columns
+    criteria = []
+    for name, value in args.items(multi=True):
+        bound, _, column = name.partition('_')
+        if bound not in ('min', 'max'):
+            continue
+        if column not in columns or \
+                columns[column].type.python_type not in (int, float):
+            raise ValueError(f'Unknown range filter: {name}')
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f'{name} must be a number')
+        if not math.isfinite(value):
+            raise ValueError(f'{name} must be a number')
+        column = getattr(Player, column)
+        criteria.append(column >= value if bound == 'min' else column <= value)
+    return criteria
+
+
+def filters_count_key(args):
+    """
+    Return the cache key of the number of players matched by the range
+    filters among the request arguments 'args' (see parse_filters): the
+    filters in canonical order and form, so their pages share it however
+    they are written, under the version of the players table, since the
+    totals of every filter cannot be deleted on writes.
+    """
+    filters = sorted((name, float(value))
+                     for name, value in args.items(multi=True)
+                     if name.startswith(('min_', 'max_')))
+    return f'count:players:{current_version()}:' + hashlib.md5(
+        urlencode(filters).encode()).hexdigest()
+
+
+def store_page(store, keys, serializer, page, per_page, endpoint,
+               **kwargs):
+    """
+    Return the dictionary of a page of players read from the PlayerStore
+    'store' instead of the database, like the page of players_page_response.
+    'keys' is (sort keys, start, stop, types): the players of the page are
+    the sort keys (tuples of values ending with the id, e.g. (name, id))
+    in range(start, stop) of the sorted list, and 'types' the types of
+    the values of a valid cursor. Raises ValueError if the cursor is not
+    valid.
+    """
+    keys, start, stop, types = keys
+    total = stop - start
+    size = max(per_page, 0)
+    cursor = request.args.get('cursor')
+    with store.lock:
+        # Writes may have shortened the keys since the range was taken
+        stop = min(stop, len(keys))
+        if cursor:
+            values = Player.decode_cursor(cursor, len(types))
+            if not all(isinstance(value, kind)
+                       for value, kind in zip(values, types)):
+                raise ValueError('Invalid cursor')
+            start = bisect_right(keys, tuple(values), start, stop)
+        elif cursor is None:
+            start += (max(page, 1) - 1) * size
+        page_keys = keys[start:min(start + size, stop)] \
+            if start < stop else []
+        items = serializer(store.values(
+            [key[-1] for key in page_keys], serializer.columns))
+    if cursor is None:
+        return Player.page_dict(
+            items, page, per_page, total, endpoint, **kwargs)
+    next_cursor = Player.encode_cursor(list(page_keys[-1])) \
+        if page_keys and start + size < stop else None
+    return Player.cursor_dict(items, cursor, next_cursor, per_page, total,
+                              endpoint, **kwargs)
+
+
+def players_page_response(query, order, endpoint, count_key, memory=None,
+                          **kwargs):
+    """
+    Return the JSON response of a page of the players of 'query', sorted by
+    the 'order' columns, using the request's per_page and either its
+    'cursor' (see PaginatedAPIMixin.to_cursor_dict) or its page number.
+    The total is cached under 'count_key' (see count_players), unless it is
+    None. With 'memory', the (store, keys) of the same players in the
+    PlayerStore (see store_page), the page is read from the store instead.
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 10, type=int), 50)
+    try:
+        serializer = request_serializer()
+    except ValueError as e:
+        return bad_request(str(e))
+    if 'fields' in request.args:
+        kwargs['fields'] = ','.join(parse_fields(request.args['fields']) or ())
+    if memory is not None:
+        try:
+            data = store_page(*memory, serializer, page, per_page, endpoint,
+                              **kwargs)
+        except ValueError as e:
+            return bad_request(str(e))
+    elif 'cursor' in request.args:
+        total = count_players(query, count_key)
+        try:
+            data = Player.to_cursor_dict(
+                player_rows(query, serializer), order,
+                request.args['cursor'], per_page, endpoint,
+                serialize=serializer, total=total, **kwargs)
+        except ValueError as e:
+            return bad_request(str(e))
+    else:
+        data = Player.to_collection_dict(
+            player_rows(query.order_by(*Player.order_clauses(order)),
+                        serializer), page, per_page, endpoint,
+            serialize=serializer, total=count_players(query, count_key),
+            **kwargs)
+    if request_percentiles():
+        add_percentiles(data['items'])
+    return json_response(data)
+
+
+@bp.route('/players/', methods=['GET'], strict_slashes=False)
+@cache.cached(timeout=60, key_prefix=request_cache_key)
 def get_all_players():
     """
     Queries database for the entire player table, paginates results, and
     returns JSON response.
+
+    With an 'ids' query parameter (e.g. /players?ids=1,2,3), returns only
+    the players with these primary keys instead, in the requested order,
+    along with the requested ids that matched no player.
+
+    Players are sorted by id, or by the columns of the 'sort' query
+    parameter (e.g. ?sort=-points,assists, see parse_sort), players missing
+    a sorted stat coming last. They can be filtered by stat ranges, e.g.
+    ?min_points=20&min_three_pt_pct=0.38 (see parse_filters).
+
+    With a 'cursor' query parameter (empty for the first page), pages are
+    read by keyset pagination instead of by page number: each page links
+    to the next with the 'next_cursor' token.
     """
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 50)
-    data = Player.to_collection_dict(
-        Player.query, page, per_page, 'api.get_all_players')
-    return jsonify(data)
+    if 'ids' in request.args:
+        return players_batch_response(request.args['ids'])
+    try:
+        order = parse_sort(request.args.get('sort', ''))
+        criteria = parse_filters(request.args)
+    except ValueError as e:
+        return bad_request(str(e))
+    # Links keep the sort and filters
+    kwargs = {name: request.args.getlist(name) for name in request.args
+              if name == 'sort' or name.startswith(('min_', 'max_'))}
+    store = player_store()
+    memory = None
+    if store is not None and not kwargs:
+        memory = (store, (store.id_keys, 0, len(store.id_keys), (int,)))
+    return players_page_response(
+        Player.query.filter(*criteria), order, 'api.get_all_players',
+        filters_count_key(request.args) if criteria
+        else count_cache_key(), memory=memory, **kwargs)
+
+
+@bp.route('/players/batch', methods=['POST'])
+def post_players_batch():
+    """
+    Batch lookup of get_all_players for long lists of ids, which are
+    provided in the JSON request body as {"ids": [1, 2, 3]}, optionally
+    with the fields to return as {"fields": ["points", "assists"]}.
+    """
+    data = request.get_json(silent=True) or {}
+    if 'ids' not in data:
+        return bad_request('Must include ids field')
+    fields = data.get('fields')
+    if isinstance(fields, list):
+        fields = ','.join(str(field) for field in fields)
+    return players_batch_response(data['ids'], fields)
 
 
 @bp.route('/players/index/<string:startswith>', methods=['GET'])
-@cache.cached(timeout=60, query_string=True)
+@cache.cached(timeout=60, key_prefix=request_cache_key)
 def get_player_list_letter(startswith):
     """
     Queries database for all the players whose first name begins with the
-    'startswith' character. Returns paginated results as JSON response.
+    'startswith' character. Returns paginated results, sorted by name, as
+    JSON response; pages can also be read by cursor, as in get_all_players.
     """
     if not startswith[0].isalpha():
         return bad_request('Keyword startswith must be alpha character')
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 50)
-    data = Player.to_collection_dict(
-            Player.query.filter(
-            Player.player_name.startswith(startswith[0].upper())),
-            page, per_page, 'api.get_player_list_letter',
-            startswith=startswith[0])
-    return jsonify(data)
+    letter = startswith[0].upper()
+    store = player_store()
+    memory = None
+    if store is not None:
+        memory = (store, (store.name_keys, *store.name_range(letter),
+                          (str, int)))
+    return players_page_response(
+        Player.query.filter(Player.player_name.startswith(letter)),
+        [Player.player_name, Player.id], 'api.get_player_list_letter',
+        count_cache_key(startswith[0]), memory=memory,
+        startswith=startswith[0])
 
 
 @bp.route('/players/search/<string:player_name>', methods=['GET'])
-@cache.cached(timeout=60, query_string=True)
+@cache.cached(timeout=60, key_prefix=request_cache_key)
 def search_players(player_name):
     """
     Queries elasticsearch server for 'player_name' parameter. Returns list of
@@ -73,9 +433,39 @@ def search_players(player_name):
     """
     per_page = 50
     page = 1
+    try:
+        serializer = request_serializer()
+    except ValueError as e:
+        return bad_request(str(e))
+    query, total, res = Player.search(player_name, page, per_page)
     players = Player.search_to_dict(
-        Player.search(player_name, page, per_page))
-    return jsonify(players)
+        (player_rows(query, serializer), total, res), serialize=serializer)
+    if request_percentiles():
+        add_percentiles(players['items'])
+    return json_response(players)
+
+
+@bp.route('/store/check', methods=['GET'])
+@auth.login_required
+def check_player_store():
+    """
+    Requires user authentication (username:password) in order to access
+    function.
+
+    Compares this process' PlayerStore with the players table and returns
+    whether they are consistent, along with the ids of the players that
+    differ, as JSON response. Returns a 404 error if PLAYER_STORE is not
+    enabled.
+    """
+    store = player_store()
+    if store is None:
+        abort(404)
+    mismatched = store.check()
+    return jsonify({
+        'consistent': not mismatched,
+        'mismatched': mismatched[:100],
+        'total_mismatched': len(mismatched)
+    })
 
 
 @bp.route('/players/<int:id>', methods=['DELETE'])
@@ -97,6 +487,7 @@ def delete_player(id):
     data = player.to_dict()
     db.session.delete(player)
     db.session.commit()
+    patch_leaderboards(id)
     return jsonify(data)
 
 
@@ -124,6 +515,7 @@ def add_player():
     player.from_dict(data)
     db.session.add(player)
     db.session.commit()
+    patch_leaderboards(player.id, player)
     response = jsonify(player.to_dict())
     response.status_code = 201
     response.headers['Location'] = url_for('api.get_player_id', id=player.id)
@@ -152,4 +544,5 @@ def update_player(id):
     data = request.get_json() or {}
     player.from_dict(data)
     db.session.commit()
+    patch_leaderboards(id, player)
     return jsonify(player.to_dict())
@@ -0,0 +1,200 @@
+import hashlib
+import json
+from functools import lru_cache
+from urllib.parse import urlencode
+from flask import current_app, request, url_for
+from app import db, cache
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+from app.snapshots import current_version
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Fields of a player representation (see Player.to_dict()) that can be
+# requested with ?fields=, in to_dict() order, mapped to their column.
+# 'headshot' stands for the headshot link.
+INFO_FIELDS = {
+    'player_name': 'player_name',
+    'player_image': 'player_image',
+    'positions': 'position',
+    'first_nba_season': 'first_nba_season',
+    'last_nba_season': 'last_nba_season',
+}
+FIELDS = tuple(INFO_FIELDS) + SHOOTING_STATS + OTHER_STATS + ('headshot',)
+
+# Player columns read to serialize every field, in this order
+PLAYER_COLUMNS = ('id',) + tuple(INFO_FIELDS.values()) + SHOOTING_STATS + \
+    OTHER_STATS + ('headshot',)
+
+# Seconds a collection's total is cached for (see count_players)
+COUNT_CACHE_TIMEOUT = 300
+
+# Stands in for a URL argument while building a link template. A number,
+# so it also passes the int converter of routes like /players/<int:id>.
+_PLACEHOLDER = 2147483647
+
+
+def parse_fields(fields):
+    """
+    Return the fields listed in 'fields' (a comma separated string, e.g.
+    'points,assists') as a tuple in FIELDS order, or None for every field
+    if 'fields' is None or empty. Raises ValueError for an unknown field.
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = names.difference(FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields: ' + ', '.join(sorted(unknown)))
+    return tuple(field for field in FIELDS if field in names) or None
+
+
+class PlayerSerializer(object):
+    """
+    Serializer of the players' 'fields' (see parse_fields; None for all of
+    them), compiled once: 'columns' are the only Player columns to read,
+    and calling it on rows of these columns (see player_rows) returns the
+    players' Player.to_dict() representations trimmed to the fields, 'id'
+    and the self link, without building Player objects or calling url_for
+    per row.
+    """
+    def __init__(self, fields=None):
+        fields = FIELDS if fields is None else fields
+        self.info = tuple(field for field in INFO_FIELDS if field in fields)
+        self.shooting = tuple(
+            stat for stat in SHOOTING_STATS if stat in fields)
+        self.other = tuple(stat for stat in OTHER_STATS if stat in fields)
+        self.headshot = 'headshot' in fields
+        self.columns = ('id',) + tuple(
+            INFO_FIELDS[field] for field in self.info) + self.shooting + \
+            self.other + (('headshot',) if self.headshot else ())
+        # Slices of a row holding each group of fields, then the headshot.
+        # Rows may have more columns after these, which are ignored.
+        stop = 1
+        self._slices = []
+        for group in (self.info, self.shooting, self.other):
+            self._slices.append(slice(stop, stop + len(group)))
+            stop += len(group)
+        self._headshot = stop
+
+    def __call__(self, rows):
+        self_link = link_template('api.get_player_id', 'id')
+        headshot_link = link_template('api.get_headshot', 'name') \
+            if self.headshot else None
+        info, shooting, other = self.info, self.shooting, self.other
+        info_slice, shooting_slice, other_slice = self._slices
+        headshot = self._headshot
+        players = []
+        for row in rows:
+            data = {'id': row[0]}
+            data.update(zip(info, row[info_slice]))
+            if shooting:
+                data['shooting'] = dict(zip(shooting, row[shooting_slice]))
+            data.update(zip(other, row[other_slice]))
+            links = {'self': self_link.format(row[0])}
+            if headshot_link is not None:
+                links['headshot'] = headshot_link.format(row[headshot]) \
+                    if row[headshot] else None
+            data['_links'] = links
+            players.append(data)
+        return players
+
+
+@lru_cache(maxsize=256)
+def player_serializer(fields=None):
+    """Return the PlayerSerializer of 'fields', compiled once per field set."""
+    return PlayerSerializer(fields)
+
+
+def player_rows(query, serializer=None):
+    """
+    Return 'query' (a query of Player) selecting only the columns of
+    'serializer' (every field by default) as tuples instead of Player
+    objects, so no ORM object is built.
+    """
+    serializer = serializer or player_serializer()
+    return query.with_entities(
+        *[getattr(Player, column) for column in serializer.columns])
+
+
+def count_players(query, key=None):
+    """
+    Return the number of players matched by 'query' (a query of Player)
+    with a plain count(id), instead of the count of a subquery
+    wrapping it that Flask-SQLAlchemy's paginate() runs. If 'key' is given,
+    the count is cached under it for COUNT_CACHE_TIMEOUT seconds, so the
+    pages of a collection share it.
+    """
+    if key is not None:
+        total = cache.get(key)
+        if total is not None:
+            return total
+    total = query.with_entities(
+        db.func.count(Player.id)).order_by(None).scalar()
+    if key is not None:
+        cache.set(key, total, timeout=COUNT_CACHE_TIMEOUT)
+    return total
+
+
+def count_cache_key(startswith=None):
+    """
+    Return the cache key of the total of a player collection: all players,
+    or the players whose name starts with the letter 'startswith' if
+    given, under the version of the players table, so every write to it,
+    bulk ones included, makes the cached totals stale.
+    """
+    key = f'count:players:{current_version()}'
+    if startswith:
+        key += f':index:{startswith[0].upper()}'
+    return key
+
+
+def link_template(endpoint, argument, **kwargs):
+    """
+    Return the URL of 'endpoint' as a str.format template whose only field
+    is the value of 'argument', so url_for runs once for all the links of
+    a response.
+    """
+    url = url_for(endpoint, **{argument: _PLACEHOLDER}, **kwargs)
+    return url.replace('{', '{{').replace('}', '}}').replace(
+        str(_PLACEHOLDER), '{}')
+
+
+def serialize_players(rows):
+    """Serialize PLAYER_COLUMNS rows with every field (PlayerSerializer)."""
+    return player_serializer()(rows)
+
+
+def request_cache_key():
+    """
+    Cache key of a player read request: its path and sorted arguments, with
+    'fields' in canonical order, so requests for the same fields in any
+    order share a cache entry. Keys include the version of the players
+    table (see app.snapshots), so responses are not served from the cache
+    once players are written.
+    """
+    args = []
+    for name, value in sorted(request.args.items(multi=True)):
+        if name == 'fields':
+            try:
+                value = ','.join(parse_fields(value) or ())
+            except ValueError:
+                pass
+        args.append((name, value))
+    return f'view:{current_version()}:' + request.path + '?' + hashlib.md5(
+        urlencode(args).encode()).hexdigest()
+
+
+def dumps(data):
+    """Encode data as JSON bytes, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    """Faster stand-in for jsonify: the compact JSON response of data."""
+    return current_app.response_class(
+        dumps(data), status=status, mimetype='application/json')
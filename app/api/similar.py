@@ -0,0 +1,46 @@
+from flask import request
+from app import cache
+from app.api import bp
+from app.api.errors import bad_request, error_response
+from app.api.serializers import json_response, link_template, request_cache_key
+from app.models import Player
+from app.similarity import similarity_index
+
+
+# Most similar players returned by one request
+MAX_SIMILAR = 50
+
+
+@bp.route('/players/<int:id>/similar', methods=['GET'])
+@cache.cached(timeout=60, key_prefix=request_cache_key)
+def get_similar_players(id):
+    """
+    Returns the 'k' query parameter (10 by default, at most MAX_SIMILAR)
+    players whose stats are most similar to those of the player
+    corresponding to provided primary key (id) in URL, nearest first, as
+    JSON response (see app.similarity.SimilarityIndex). Returns a 404 error
+    if the player is not found.
+    """
+    k = request.args.get('k', 10, type=int)
+    if not 1 <= k <= MAX_SIMILAR:
+        return bad_request(f'k must be between 1 and {MAX_SIMILAR}')
+    try:
+        neighbours = similarity_index().neighbours(id, k)
+    except KeyError:
+        return error_response(404, 'Player not found')
+    ids = [id] + [neighbour for neighbour, _ in neighbours]
+    names = dict(Player.query.filter(Player.id.in_(ids)).with_entities(
+        Player.id, Player.player_name))
+    self_link = link_template('api.get_player_id', 'id')
+    return json_response({
+        'id': id,
+        'player_name': names.get(id),
+        'items': [{
+            'id': neighbour,
+            'player_name': names.get(neighbour),
+            'distance': round(distance, 4),
+            '_links': {'self': self_link.format(neighbour)}
+        } for neighbour, distance in neighbours],
+        '_meta': {'k': k},
+        '_links': {'self': self_link.format(id)}
+    })
@@ -0,0 +1,90 @@
+from collections import Counter
+from app.models import CrawlPage
+
+
+def is_index_url(url):
+    """Return True for a letter index page URL, e.g. '.../players/a/'."""
+    return url.endswith('/')
+
+
+def start_crawl(db, index_urls):
+    """
+    Replace the saved crawl state with the letter index pages 'index_urls',
+    all pending, and return them. Player pages are registered as the index
+    pages are read (see add_player_pages).
+    """
+    index_urls = list(dict.fromkeys(index_urls))
+    db.session.query(CrawlPage).delete()
+    db.session.bulk_insert_mappings(CrawlPage, [
+        {'url': url, 'status': 'pending', 'attempts': 0}
+        for url in index_urls])
+    db.session.commit()
+    return index_urls
+
+
+def resume_crawl(db, max_attempts=None):
+    """
+    Return the URLs of the saved crawl that are not done yet, as a tuple of
+    (index page URLs, player page URLs), or None if there is no saved crawl
+    to resume. With 'max_attempts', pages that already failed that many
+    times, given up on by the saved crawl, are left out.
+    """
+    if db.session.query(CrawlPage).first() is None:
+        return None
+    query = db.session.query(CrawlPage.url).filter(
+        CrawlPage.status != 'done')
+    if max_attempts is not None:
+        query = query.filter(CrawlPage.attempts < max_attempts)
+    urls = [url for url, in query.order_by(CrawlPage.url)]
+    return ([url for url in urls if is_index_url(url)],
+            [url for url in urls if not is_index_url(url)])
+
+
+def failed_attempts(db):
+    """
+    Return the failed attempts saved for the pages of the crawl that are
+    not done yet, as a Counter of URLs, so a resumed crawl carries on
+    counting them (see app.retry.RetryQueue) instead of starting over.
+    """
+    return Counter(dict(db.session.query(
+        CrawlPage.url, CrawlPage.attempts).filter(
+        CrawlPage.status == 'failed')))
+
+
+def add_player_pages(db, index_url, urls):
+    """
+    Register the player page URLs found on index page index_url as pending
+    and mark the index page done, in one transaction. Returns the URLs that
+    were not registered already.
+    """
+    urls = list(dict.fromkeys(urls))
+    existing = {url for url, in db.session.query(CrawlPage.url).filter(
+        CrawlPage.url.in_(urls))} if urls else set()
+    new_urls = [url for url in urls if url not in existing]
+    db.session.bulk_insert_mappings(CrawlPage, [
+        {'url': url, 'status': 'pending', 'attempts': 0}
+        for url in new_urls])
+    db.session.query(CrawlPage).filter(CrawlPage.url == index_url).update(
+        {CrawlPage.status: 'done'}, synchronize_session=False)
+    db.session.commit()
+    return new_urls
+
+
+def record_progress(db, done, failed):
+    """
+    Mark 'done' URLs as done and add one attempt per failure in 'failed', a
+    list of (url, exception) pairs. Called by the writer inside the batch's
+    transaction so the checkpoint always matches the rows written.
+    """
+    if done:
+        db.session.query(CrawlPage).filter(CrawlPage.url.in_(done)).update(
+            {CrawlPage.status: 'done'}, synchronize_session=False)
+    # A URL may fail more than once within a batch
+    counts = Counter(url for url, _ in failed)
+    errors = dict(failed)
+    for url, count in counts.items():
+        db.session.query(CrawlPage).filter(CrawlPage.url == url).update({
+            CrawlPage.status: 'failed',
+            CrawlPage.attempts: CrawlPage.attempts + count,
+            CrawlPage.last_error: repr(errors[url])[:200]
+        }, synchronize_session=False)
@@ -1,7 +1,37 @@
 import os
+import json
 import click
+import redis
+from flask import current_app
 from app import db
-from app.populate_players import populate_database
+from app.metrics import CrawlMetrics, format_progress
+from app.populate_players import (
+    populate_database, reparse_database, ENGINES)
+from app.image_store import image_store, mirror_headshots
+from app.leaders import rebuild_leaderboards
+from app.snapshots import invalidate_snapshots
+from app.throttle import HostRateLimiter
+from app.work_queue import RedisWorkQueue
+
+def run_with_summary(run, metrics, report):
+    """
+    Run 'run()', the work of a populate command recording into 'metrics'
+    (app.metrics.CrawlMetrics), then write the JSON summary of the run to
+    'report', or stdout if it is None. An error is printed to stderr and
+    rolled back, so stdout only ever holds the summary.
+    """
+    try:
+        run()
+    except Exception as e:
+        click.echo("An error occurred.", err=True)
+        click.echo(e, err=True)
+        db.session.rollback()
+    summary = json.dumps(metrics.summary(), indent=2)
+    if report is not None:
+        report.write(summary + '\n')
+    else:
+        click.echo(summary)
+
 
 def register(app):
     """Register shell script commands."""
@@ -11,11 +41,141 @@ def register(app):
         pass
 
     @populate.command()
-    def initiate():
-        """Populate database with db variable from app."""
-        try:
-            populate_database(db)
-        except Exception as e:
-            print("An error occurred.")
-            print(e)
-            db.session.rollback()
+    @click.option('--engine', type=click.Choice(ENGINES), default='selenium',
+                  help='Fetch pages with headless Chrome or plain HTTP.')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Players written per transaction.')
+    @click.option('--resume', is_flag=True,
+                  help='Continue the last crawl instead of starting over.')
+    @click.option('--workers', type=int, default=None,
+                  help='Concurrent page fetches to start with.')
+    @click.option('--max-workers', type=int, default=None,
+                  help='Upper bound for adaptive fetch concurrency.')
+    @click.option('--rate', type=float, default=None,
+                  help='Max requests per second to a host (0: no limit).')
+    @click.option('--refresh', is_flag=True,
+                  help='Only crawl active and changed players.')
+    @click.option('--season', type=int, default=None,
+                  help='Season (year it ends in) counted as active.')
+    @click.option('--report', type=click.File('w'), default=None,
+                  help='Write the JSON run summary to this file.')
+    def initiate(engine, batch_size, resume, workers, max_workers, rate,
+                 refresh, season, report):
+        """
+        Populate database with db variable from app. Progress is printed to
+        stderr and a JSON summary of the run to stdout (or --report).
+        """
+        metrics = CrawlMetrics()
+
+        def run():
+            populate_database(
+                db, engine=engine, batch_size=batch_size, resume=resume,
+                workers=workers, max_workers=max_workers, rate=rate,
+                metrics=metrics, progress=lambda m: click.echo(
+                    format_progress(m), err=True),
+                refresh=refresh, season=season)
+            rebuild_leaderboards()
+            invalidate_snapshots()
+
+        run_with_summary(run, metrics, report)
+
+    @populate.command()
+    @click.option('--seed', is_flag=True,
+                  help='Start a new crawl and queue its player pages.')
+    @click.option('--engine', type=click.Choice(ENGINES), default='http',
+                  help='Fetch pages with headless Chrome or plain HTTP.')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Players written per transaction.')
+    @click.option('--workers', type=int, default=None,
+                  help='Concurrent page fetches to start with.')
+    @click.option('--max-workers', type=int, default=None,
+                  help='Upper bound for adaptive fetch concurrency.')
+    @click.option('--rate', type=float, default=None,
+                  help='Max requests per second to a host (0: no limit).')
+    @click.option('--report', type=click.File('w'), default=None,
+                  help='Write the JSON run summary to this file.')
+    def worker(seed, engine, batch_size, workers, max_workers, rate, report):
+        """
+        Crawl players together with the other workers sharing the Redis
+        work queue at CRAWL_REDIS_URL. Start one worker with --seed first,
+        then any number of others, on any host, to share its pages.
+        """
+        metrics = CrawlMetrics()
+        work_queue = RedisWorkQueue(
+            redis.Redis.from_url(current_app.config['CRAWL_REDIS_URL'],
+                                 decode_responses=True),
+            lease_seconds=current_app.config['CRAWL_LEASE_SECONDS'])
+
+        def run():
+            populate_database(
+                db, engine=engine, batch_size=batch_size, workers=workers,
+                max_workers=max_workers, rate=rate, metrics=metrics,
+                progress=lambda m: click.echo(format_progress(m), err=True),
+                work_queue=work_queue, seed=seed)
+            rebuild_leaderboards()
+            invalidate_snapshots()
+
+        run_with_summary(run, metrics, report)
+
+    @populate.command()
+    @click.option('--batch-size', type=int, default=None,
+                  help='Players written per transaction.')
+    @click.option('--report', type=click.File('w'), default=None,
+                  help='Write the JSON run summary to this file.')
+    def reparse(batch_size, report):
+        """
+        Rebuild players from the page cache without fetching any page.
+        Progress is printed to stderr and a JSON summary of the run to
+        stdout (or --report).
+        """
+        metrics = CrawlMetrics()
+
+        def run():
+            reparse_database(
+                db, batch_size=batch_size, metrics=metrics,
+                progress=lambda m: click.echo(format_progress(m), err=True))
+            rebuild_leaderboards()
+            invalidate_snapshots()
+
+        run_with_summary(run, metrics, report)
+
+    @populate.command()
+    def leaders():
+        """
+        Rebuild the precomputed leaderboards of /api/leaders from the
+        players table. Populating the database rebuilds them too.
+        """
+        print(f"Rebuilt {rebuild_leaderboards()} leaderboards.")
+
+    @populate.command()
+    @click.option('--workers', type=int, default=None,
+                  help='Concurrent image downloads.')
+    @click.option('--rate', type=float, default=None,
+                  help='Max requests per second to a host (0: no limit).')
+    @click.option('--all', 'everything', is_flag=True,
+                  help='Download every headshot again, not only new ones.')
+    @click.option('--report', type=click.File('w'), default=None,
+                  help='Write the JSON run summary to this file.')
+    def headshots(workers, rate, everything, report):
+        """
+        Mirror player headshots into the image store (IMAGE_STORE_DIR) so
+        the API can serve them. A JSON summary of the run is printed to
+        stdout (or --report).
+        """
+        config = current_app.config
+        metrics = CrawlMetrics()
+
+        def run():
+            failed = mirror_headshots(
+                db, image_store(),
+                config['HEADSHOT_URL'], workers or config['HEADSHOT_WORKERS'],
+                HostRateLimiter(config['CRAWL_MAX_RATE']
+                                if rate is None else rate),
+                metrics, config['CRAWL_BATCH_SIZE'], everything)
+            if failed:
+                click.echo(f"Could not mirror {len(failed)} headshots:",
+                           err=True)
+            for url, error in failed:
+                click.echo(f"  {url}: {error!r}", err=True)
+
+        run_with_summary(run, metrics, report)
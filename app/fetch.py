@@ -0,0 +1,152 @@
+import re
+import requests
+from queue import Queue
+from time import monotonic
+from requests.adapters import HTTPAdapter
+
+
+# basketball-reference ships most stat tables (e.g. 'advanced') inside HTML
+# comments and un-comments them client side with javascript.
+COMMENTED_TABLE = re.compile(r'<!--(\s*<div[^>]*table_outer_container.*?)-->',
+                             re.DOTALL)
+
+
+def uncomment_tables(html):
+    """
+    Remove the HTML comment markers wrapped around stat tables so the page
+    source matches what a javascript enabled browser would render.
+    """
+    return COMMENTED_TABLE.sub(r'\1', html)
+
+
+def http_session(pool_size):
+    """
+    Create a requests Session whose connection pool holds 'pool_size'
+    keep-alive connections per host, so concurrent workers reuse sockets
+    instead of opening a new connection for every page.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'comparenba'
+    return session
+
+
+class HTTPWorker(object):
+    """
+    Plain HTTP replacement for a selenium webdriver.
+
+    Exposes the subset of the webdriver interface used by the scraper
+    (get(), page_source and quit()) so it can be handed to player_urls and
+    the fetch stage unchanged. Workers share one pooled session; each worker
+    is only ever used by one thread at a time.
+
+    get() can also make a conditional request: after a '304 Not Modified'
+    response, not_modified is True and page_source is None. The validators
+    of the last page fetched (its ETag and Last-Modified headers) are kept
+    in etag and last_modified.
+    """
+    def __init__(self, session, timeout=30):
+        self.session = session
+        self.timeout = timeout
+        self.page_source = None
+        self.not_modified = False
+        self.etag = None
+        self.last_modified = None
+
+    def get(self, url, etag=None, last_modified=None):
+        """
+        Request URL and store the un-commented page source. If the 'etag' or
+        'last_modified' validators of a previous fetch are given, the page
+        is only sent back if it changed since.
+        """
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        response = self.session.get(url, headers=headers,
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        self.not_modified = response.status_code == 304
+        self.page_source = None if self.not_modified else \
+            uncomment_tables(response.text)
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+    def quit(self):
+        """Nothing to tear down per worker; the session is shared."""
+        self.page_source = None
+
+
+class FetchPool(object):
+    """
+    Pool of page fetching workers (webdrivers or HTTPWorkers, keyed by
+    worker_id) shared by the crawl's fetch threads and index discovery.
+    fetch() checks a worker out for one page, once the adaptive concurrency
+    limit (app.throttle.AdaptiveLimiter) and the per-host rate ceiling
+    (app.throttle.HostRateLimiter) allow it. Fetch times are recorded in
+    metrics (app.metrics.CrawlMetrics). Fetched pages are written through
+    to 'cache' (app.page_cache.PageCache) if given.
+    """
+    def __init__(self, workers, limiter, rate_limiter, metrics, cache=None):
+        self.workers = workers
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.cache = cache
+        self._idle = Queue()
+        for worker_id in workers:
+            self._idle.put(worker_id)
+
+    def fetch(self, url, if_changed=False):
+        """
+        Return the page source of url. Raises the worker's exception if the
+        page failed to load.
+
+        With 'if_changed', None is returned instead if the page did not
+        change since it was cached: HTTPWorkers send the cached validators
+        so unchanged pages are not downloaded again, and any other page is
+        compared with the cached one by content hash.
+        """
+        cached = self.cache.entry(url) \
+            if if_changed and self.cache is not None else None
+        self.limiter.acquire()
+        worker_id = self._idle.get()
+        self.rate_limiter.wait(url)
+        start = monotonic()
+        ok = False
+        try:
+            worker = self.workers[worker_id]
+            validators = {}
+            if isinstance(worker, HTTPWorker):
+                if cached is not None:
+                    worker.get(url, cached.get('etag'),
+                               cached.get('last_modified'))
+                else:
+                    worker.get(url)
+                if worker.not_modified:
+                    ok = True
+                    return None
+                validators = {'etag': worker.etag,
+                              'last_modified': worker.last_modified}
+            else:
+                worker.get(url)
+            html = worker.page_source
+            ok = True
+        finally:
+            self._idle.put(worker_id)
+            latency = monotonic() - start
+            self.limiter.release(latency, ok)
+            self.metrics.add_time('fetch', latency)
+        if self.cache is not None:
+            digest = self.cache.put(url, html, **validators)
+            if cached is not None and cached['sha256'] == digest:
+                return None
+        return html
+
+    def quit(self):
+        """Tear down every worker."""
+        for worker in self.workers.values():
+            worker.quit()
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.fetch import http_session
+from app.models import Player
+from app.snapshots import invalidate_snapshots
+
+
+# Names of stored images: SHA-256 of the content and the original extension
+IMAGE_NAME = re.compile(r'^[0-9a-f]{64}\.(jpg|jpeg|png|gif|webp)$')
+
+
+class ImageStore(object):
+    """
+    Content-addressed store of player headshots. Images are saved under
+    objects/ and named after the SHA-256 of their content plus the upstream
+    file's extension (e.g. '3fa1...9c.jpg'), so a name always refers to the
+    same bytes and can be cached forever by clients.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+    def path(self, name):
+        """Return the file name of the stored image 'name'."""
+        return os.path.join(self.directory, 'objects', name[:2], name)
+
+    def put(self, data, extension):
+        """
+        Store the image bytes 'data' with 'extension' (e.g. '.jpg') and
+        return its name.
+        """
+        name = hashlib.sha256(data).hexdigest() + extension.lower()
+        path = self.path(name)
+        if not os.path.exists(path):
+            # Write to a temporary file first so the API never serves a
+            # partially written image
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return name
+
+    def read(self, name):
+        """Return the bytes of the stored image 'name'."""
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+
+def image_store():
+    """
+    Return the ImageStore of the app's IMAGE_STORE_DIR, created once and
+    kept on the app so serving an image does not set up its directory.
+    """
+    directory = current_app.config['IMAGE_STORE_DIR']
+    store = current_app.extensions.get('image_store')
+    if store is None or store.directory != directory:
+        store = current_app.extensions['image_store'] = ImageStore(directory)
+    return store
+
+
+def download_image(session, rate_limiter, url):
+    """Fetch the image at url and return its bytes."""
+    rate_limiter.wait(url)
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def mirror_headshots(db, store, base_url, workers, rate_limiter, metrics,
+                     batch_size=200, everything=False):
+    """
+    Download the headshot of every player that has an image (player_image,
+    the upstream file name under base_url) but no mirrored copy yet, or of
+    every player with 'everything', into 'store' (an ImageStore). Up to
+    'workers' images are downloaded at once through one pooled session and
+    'rate_limiter' (app.throttle.HostRateLimiter). Player.headshot is set
+    to the stored image's name, in batches of batch_size players.
+
+    Download times and the 'images_queued', 'images_written',
+    'images_unchanged' and 'failures' counters are recorded in metrics.
+    Returns the images that could not be downloaded as a list of
+    (url, exception).
+    """
+    query = db.session.query(Player.id, Player.player_image, Player.headshot)\
+        .filter(Player.player_image.isnot(None))
+    if not everything:
+        query = query.filter(Player.headshot.is_(None))
+    players = query.order_by(Player.id).all()
+    metrics.incr('images_queued', len(players))
+    session = http_session(pool_size=workers)
+
+    def mirror(player):
+        """Download and store one headshot; returns its name or exception."""
+        url = posixpath.join(base_url, player.player_image)
+        try:
+            with metrics.timer('fetch'):
+                data = download_image(session, rate_limiter, url)
+            return store.put(data, posixpath.splitext(player.player_image)[1])
+        except Exception as e:
+            return e
+
+    failed = []
+    updates = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for player, result in zip(players, executor.map(mirror, players)):
+            if isinstance(result, Exception):
+                failed.append((posixpath.join(
+                    base_url, player.player_image), result))
+                metrics.incr('failures')
+            elif result == player.headshot:
+                metrics.incr('images_unchanged')
+            else:
+                updates.append({'id': player.id, 'headshot': result})
+            if len(updates) >= batch_size:
+                write_headshots(db, updates, metrics)
+                updates = []
+    if updates:
+        write_headshots(db, updates, metrics)
+    session.close()
+    return failed
+
+
+def write_headshots(db, updates, metrics):
+    """
+    Set Player.headshot for a batch of {'id', 'headshot'} dicts. Bulk
+    updates bypass the session events that keep snapshots of the players
+    table current, so they are invalidated once the batch is committed.
+    """
+    with metrics.timer('write'):
+        db.session.bulk_update_mappings(Player, updates)
+        db.session.commit()
+    invalidate_snapshots()
+    metrics.incr('images_written', len(updates))
@@ -0,0 +1,157 @@
+from bisect import bisect_right
+from flask import current_app
+from app import db, cache
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+
+
+# Stats with a leaderboard
+LEADER_STATS = SHOOTING_STATS + OTHER_STATS
+
+# Attempts behind each percentage stat, for minimum attempts filters
+ATTEMPTS = {
+    'field_goal_pct': 'field_goal_attempted',
+    'three_pt_pct': 'three_pt_attempted',
+    'free_throw_pct': 'free_throw_attempted',
+    'true_stg_pct': 'field_goal_attempted',
+}
+
+
+def leaderboard_key(stat):
+    """Return the cache key of the leaderboard of 'stat'."""
+    return f'leaders:{stat}'
+
+
+def leader_columns(stat):
+    """
+    Return the columns of a leaderboard entry of 'stat': the player's id,
+    name and positions, the stat and its attempts (NULL if the stat is
+    not a percentage).
+    """
+    attempts = getattr(Player, ATTEMPTS[stat]) if stat in ATTEMPTS \
+        else db.null()
+    return [Player.id, Player.player_name, Player.position,
+            getattr(Player, stat), attempts]
+
+
+def leader_entry(player, stat):
+    """
+    Return the leaderboard entry of 'player' for 'stat', as built from
+    leader_columns, or None if the player has no value for it.
+    """
+    value = getattr(player, stat)
+    if value is None:
+        return None
+    attempts = getattr(player, ATTEMPTS[stat]) if stat in ATTEMPTS else None
+    return [player.id, player.player_name, player.position, value, attempts]
+
+
+def entry_rank_key(entry):
+    """Sort key of leaderboard entries: highest value first, then by id."""
+    return (-entry[3], entry[0])
+
+
+def leader_query(stat, position=None, min_attempts=None):
+    """
+    Return the query of the leaderboard entries of 'stat', highest value
+    first, of the players who play 'position' (e.g. 'PG') and took at
+    least 'min_attempts' attempts, if given.
+    """
+    column = getattr(Player, stat)
+    query = db.session.query(*leader_columns(stat)).filter(
+        column.isnot(None))
+    if position is not None:
+        # Positions are stored as a list, e.g. 'PG, SG'
+        query = query.filter((', ' + Player.position + ', ').like(
+            f'%, {position}, %'))
+    if min_attempts is not None:
+        query = query.filter(getattr(Player, ATTEMPTS[stat]) >= min_attempts)
+    return query.order_by(column.desc(), Player.id)
+
+
+def build_leaderboard(stat, depth=None):
+    """
+    Return the leaderboard of 'stat': the entries of its top 'depth'
+    players (LEADERBOARD_DEPTH by default), ranked, and whether they are
+    all the players with a value for it.
+    """
+    if depth is None:
+        depth = current_app.config['LEADERBOARD_DEPTH']
+    rows = leader_query(stat).limit(depth + 1).all()
+    return {'entries': [list(row) for row in rows[:depth]],
+            'complete': len(rows) <= depth}
+
+
+def rebuild_leaderboards(depth=None):
+    """
+    Rebuild and cache the leaderboard of every stat in LEADER_STATS, e.g.
+    after populating the database. Each is read with one indexed query
+    limited to its depth. Returns the number of leaderboards built.
+    """
+    cache.set_many({leaderboard_key(stat): build_leaderboard(stat, depth)
+                    for stat in LEADER_STATS}, timeout=0)
+    return len(LEADER_STATS)
+
+
+def leaderboard(stat):
+    """
+    Return the cached leaderboard of 'stat', built first if it is not
+    cached or if writes removed players from its top entries (see
+    patch_leaderboards), which leaves it short of LEADERBOARD_DEPTH.
+    """
+    board = cache.get(leaderboard_key(stat))
+    if board is None or (not board['complete'] and len(
+            board['entries']) < current_app.config['LEADERBOARD_DEPTH']):
+        board = build_leaderboard(stat)
+        cache.set(leaderboard_key(stat), board, timeout=0)
+    return board
+
+
+def patch_leaderboards(id, player=None):
+    """
+    Update the cached leaderboards after the player with primary key 'id'
+    was written, 'player' being its new state or None if it was deleted.
+    The player's entries are removed, then inserted in rank order where
+    they belong. An entry ranked after a truncated leaderboard's last one
+    is left out, as players beyond it are unknown.
+    """
+    depth = current_app.config['LEADERBOARD_DEPTH']
+    keys = [leaderboard_key(stat) for stat in LEADER_STATS]
+    changed = {}
+    for key, stat, board in zip(keys, LEADER_STATS, cache.get_many(*keys)):
+        if board is None:
+            continue
+        entries = [entry for entry in board['entries'] if entry[0] != id]
+        complete = board['complete']
+        entry = leader_entry(player, stat) if player is not None else None
+        if entry is not None:
+            ranks = [entry_rank_key(item) for item in entries]
+            rank_key = entry_rank_key(entry)
+            if complete or (ranks and rank_key < ranks[-1]):
+                entries.insert(bisect_right(ranks, rank_key), entry)
+            if len(entries) > depth:
+                del entries[depth:]
+                complete = False
+        if entries != board['entries'] or complete != board['complete']:
+            changed[key] = {'entries': entries, 'complete': complete}
+    if changed:
+        cache.set_many(changed, timeout=0)
+
+
+def leaders(stat, limit, position=None, min_attempts=None):
+    """
+    Return the top 'limit' leaderboard entries of 'stat' among the players
+    who play 'position' and took at least 'min_attempts' attempts, if
+    given. They are filtered from the cached leaderboard, in time linear in
+    its size, unless too few of its entries pass the filters; then the
+    database is queried instead.
+    """
+    board = leaderboard(stat)
+    entries = [
+        entry for entry in board['entries']
+        if (position is None or position in (entry[2] or '').split(', '))
+        and (min_attempts is None or
+             (entry[4] is not None and entry[4] >= min_attempts))]
+    if len(entries) < limit and not board['complete']:
+        entries = [list(row) for row in leader_query(
+            stat, position, min_attempts).limit(limit)]
+    return entries[:limit]
@@ -0,0 +1,92 @@
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+
+
+# Pipeline stages timed by populate_database, in pipeline order
+STAGES = ('discovery', 'fetch', 'parse', 'write', 'index')
+
+
+class CrawlMetrics(object):
+    """
+    Thread-safe timers and counters for one populate_database run.
+
+    Each stage in STAGES records how many times it ran, the total and the
+    longest time it took. Counters used by the crawl:
+    'pages_queued', 'pages_written', 'pages_unchanged', 'pages_skipped',
+    'failures', 'retries' and 'dead_letters'.
+    """
+    def __init__(self):
+        self.started = monotonic()
+        self.counters = Counter()
+        self.stages = {stage: [0, 0.0, 0.0] for stage in STAGES}
+        self._lock = Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a with statement as one run of 'stage'."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(stage, monotonic() - start)
+
+    def add_time(self, stage, seconds):
+        """Record one run of 'stage' that took 'seconds'."""
+        with self._lock:
+            timing = self.stages[stage]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def incr(self, counter, amount=1):
+        """Add 'amount' to 'counter'."""
+        with self._lock:
+            self.counters[counter] += amount
+
+    def progress(self):
+        """
+        Return (pages finished, pages queued, pages per second, seconds
+        left or None). Pages are finished when written, found unchanged or
+        given up on. The number queued keeps growing while index pages are
+        being read.
+        """
+        with self._lock:
+            done = self.counters['pages_written'] + \
+                self.counters['pages_unchanged'] + \
+                self.counters['dead_letters']
+            total = self.counters['pages_queued']
+        elapsed = monotonic() - self.started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else None
+        return done, total, rate, eta
+
+    def summary(self):
+        """Return a JSON serializable summary of the run."""
+        elapsed = monotonic() - self.started
+        with self._lock:
+            stages = {stage: {
+                'count': count,
+                'total_seconds': round(total, 3),
+                'mean_ms': round(total / count * 1000, 2) if count else None,
+                'max_ms': round(longest * 1000, 2)
+            } for stage, (count, total, longest) in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'pages_per_second': round(
+                counters.get('pages_written', 0) / elapsed, 3)
+                if elapsed else None,
+            'stages': stages,
+            'counters': counters
+        }
+
+
+def format_progress(metrics):
+    """Return a one line progress report, e.g. for the CLI."""
+    done, total, rate, eta = metrics.progress()
+    pct = done / total * 100 if total else 0
+    eta = '{:d}m{:02d}s'.format(*divmod(int(eta), 60)) \
+        if eta is not None else '?'
+    return f"{done}/{total} pages ({pct:.1f}%) {rate:.1f} pages/s ETA {eta}"
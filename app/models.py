@@ -1,6 +1,12 @@
+import base64
+import json
 from app import db
 from flask import url_for
-from app.search import add_to_index, remove_from_index, query_index
+from flask_sqlalchemy import Pagination
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from app.search import (
+    add_to_index, bulk_add_to_index, remove_from_index, query_index)
 from passlib.apps import custom_app_context as pwd_context
 
 
@@ -65,6 +71,17 @@ class SearchableMixin(object):
         for obj in cls.query:
             add_to_index(cls.__tablename__, obj)
 
+    @classmethod
+    def bulk_reindex(cls, *criterion):
+        """
+        Add the rows matching 'criterion' to the index in one bulk request.
+        Core bulk writes bypass the session commit events above, so callers
+        using them must refresh the index with this method.
+        """
+        fields = [getattr(cls, field) for field in cls.__searchable__]
+        rows = db.session.query(cls.id, *fields).filter(*criterion)
+        bulk_add_to_index(cls.__tablename__, [row._asdict() for row in rows])
+
 
 # Event handlers to make SQLAlchemy call the before_commit and after_commit
 # methods before and after a commit, respectively
@@ -78,17 +95,40 @@ class PaginatedAPIMixin(object):
     pagination logic.
     """
     @staticmethod
-    def to_collection_dict(query, page, per_page, endpoint, **kwargs):
+    def to_collection_dict(query, page, per_page, endpoint, serialize=None,
+                           total=None, **kwargs):
         """
         Produce a dictionary from a collection of resources.
         'query' is a Flask-SQLAlchemy query object.
         'page' represents the current page.
         'per_page' represents the number of results to return per page.
         'endpoint' is the API endpoint for a particular view function.
+        'serialize', if given, turns the page's items into their dictionary
+        representations instead of calling to_dict() on each of them.
+        'total', if given, is the number of items of the query, which is
+        then not counted again.
+        """
+        if total is None:
+            resources = query.paginate(page, per_page, False)
+        else:
+            offset = (max(page, 1) - 1) * max(per_page, 0)
+            resources = Pagination(query, page, per_page, total, query.limit(
+                max(per_page, 0)).offset(offset).all())
+        return PaginatedAPIMixin.page_dict(
+            serialize(resources.items) if serialize is not None
+            else [item.to_dict() for item in resources.items],
+            page, per_page, resources.total, endpoint, **kwargs)
+
+    @staticmethod
+    def page_dict(items, page, per_page, total, endpoint, **kwargs):
+        """
+        Produce the dictionary of a page of a collection whose dictionary
+        representations are 'items', out of 'total' items, as
+        to_collection_dict does for a query.
         """
-        resources = query.paginate(page, per_page, False)
+        resources = Pagination(None, page, per_page, total, items)
         data = {
-            'items': [item.to_dict() for item in resources.items],
+            'items': items,
             '_meta': {
                 'page': page,
                 'per_page': per_page,
@@ -107,18 +147,174 @@ class PaginatedAPIMixin(object):
         return data
 
     @staticmethod
-    def search_to_dict(query):
-        """Return results from an elasticsearch query object as a dict."""
+    def sort_keys(order):
+        """
+        Return the (column, descending) pairs of 'order', a list of columns
+        sorted in ascending order or of their desc(), e.g.
+        [Player.points.desc(), Player.id].
+        """
+        keys = []
+        for item in order:
+            if isinstance(item, UnaryExpression) and \
+                    item.modifier is operators.desc_op:
+                keys.append((item.element, True))
+            else:
+                keys.append((item, False))
+        return keys
+
+    @staticmethod
+    def order_clauses(order):
+        """
+        Return the ORDER BY clauses of 'order' (see sort_keys), which sort
+        NULLs of nullable columns last whatever the direction, so players
+        missing a stat come after the ranked ones on every database.
+        """
+        clauses = []
+        for column, descending in PaginatedAPIMixin.sort_keys(order):
+            clause = column.desc() if descending else column.asc()
+            clauses.append(clause.nullslast() if column.nullable else clause)
+        return clauses
+
+    @staticmethod
+    def encode_cursor(values):
+        """Return the opaque cursor token of a list of sort key values."""
+        return base64.urlsafe_b64encode(
+            json.dumps(values, separators=(',', ':')).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor, size):
+        """
+        Return the 'size' sort key values of a cursor token made by
+        encode_cursor. Raises ValueError if the token is not valid.
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError('Invalid cursor')
+        return values
+
+    @staticmethod
+    def to_cursor_dict(query, order, cursor, per_page, endpoint,
+                       serialize=None, total=None, **kwargs):
+        """
+        Produce a dictionary from a collection of resources using keyset
+        pagination, which reads a page with an indexed range scan however
+        deep it is, instead of OFFSET and a count per page.
+        'query' is a Flask-SQLAlchemy query object.
+        'order' is the list of columns the collection is sorted by, or of
+        their desc(), last of them unique (e.g. [Player.player_name,
+        Player.id]). NULLs are sorted last (see order_clauses).
+        'cursor' is the token returned as 'next_cursor' by the previous
+        page, or an empty string for the first page.
+        'per_page', 'endpoint', 'serialize' and 'total' are used as in
+        to_collection_dict; the total is only reported if given. The rows
+        given to 'serialize' end with the 'order' columns.
+        Raises ValueError if the cursor is not valid.
+        """
+        keys = PaginatedAPIMixin.sort_keys(order)
+        if cursor:
+            values = PaginatedAPIMixin.decode_cursor(cursor, len(keys))
+            for value, (column, _) in zip(values, keys):
+                # Reject values the database could not compare to column
+                expected = column.type.python_type
+                if expected is float:
+                    expected = (int, float)
+                if not isinstance(value, expected) and not (
+                        value is None and column.nullable):
+                    raise ValueError('Invalid cursor')
+            query = query.filter(
+                PaginatedAPIMixin.after_cursor(keys, values))
+        per_page = max(per_page, 0)
+        # The sort key is selected too, as 'query' may not include it
+        rows = query.add_columns(*[column for column, _ in keys]).order_by(
+            *PaginatedAPIMixin.order_clauses(order)).limit(per_page + 1).all()
+        next_cursor = PaginatedAPIMixin.encode_cursor(
+            list(rows[per_page - 1][-len(order):])) \
+            if len(rows) > per_page and per_page else None
+        rows = rows[:per_page]
+        return PaginatedAPIMixin.cursor_dict(
+            serialize(rows) if serialize is not None
+            else [row[0].to_dict() for row in rows],
+            cursor, next_cursor, per_page, total, endpoint, **kwargs)
+
+    @staticmethod
+    def cursor_dict(items, cursor, next_cursor, per_page, total, endpoint,
+                    **kwargs):
+        """
+        Produce the dictionary of a page of a collection whose dictionary
+        representations are 'items', read after 'cursor' and followed by
+        'next_cursor' (None on the last page), as to_cursor_dict does for a
+        query.
+        """
+        data = {
+            'items': items,
+            '_meta': {
+                'per_page': per_page,
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'total_items': total
+            },
+            '_links': {
+                'self': url_for(endpoint, cursor=cursor, per_page=per_page,
+                                **kwargs),
+                'next': url_for(endpoint, cursor=next_cursor,
+                                per_page=per_page, **kwargs)
+                    if next_cursor else None
+            }
+        }
+        return data
+
+    @staticmethod
+    def after_cursor(keys, values):
+        """
+        Return the criterion of the rows sorted after the sort key 'values'
+        of the (column, descending) 'keys', NULLs being sorted last: rows
+        equal on the first columns and after the value on the next one.
+        """
+        criteria = []
+        equal = []
+        for (column, descending), value in zip(keys, values):
+            if value is None:
+                # Only NULLs come after NULL, and they are equal to it
+                equal.append(column.is_(None))
+                continue
+            after = column < value if descending else column > value
+            if column.nullable:
+                after = db.or_(after, column.is_(None))
+            criteria.append(db.and_(*equal, after))
+            equal.append(column == value)
+        return db.or_(*criteria) if criteria else db.false()
+
+    @staticmethod
+    def search_to_dict(query, serialize=None):
+        """
+        Return results from an elasticsearch query object as a dict.
+        'serialize' is used as in to_collection_dict.
+        """
         # TODO Add _meta and _links
         resources = query[0]
         total = query[1]
         data = {
-            'items': [item.to_dict() for item in resources],
+            'items': serialize(resources) if serialize is not None
+                else [item.to_dict() for item in resources],
             'total': total
         }
         return data
 
 
+# Stat columns of a Player, as grouped by Player.to_dict()
+SHOOTING_STATS = (
+    'field_goal_made', 'field_goal_attempted', 'field_goal_pct',
+    'three_pt_made', 'three_pt_attempted', 'three_pt_pct',
+    'free_throw_made', 'free_throw_attempted', 'free_throw_pct',
+    'true_stg_pct', 'points')
+OTHER_STATS = (
+    'off_reb', 'def_reb', 'tot_reb', 'assists', 'steals', 'blocks',
+    'turnovers')
+
+
 class Player(SearchableMixin, PaginatedAPIMixin, db.Model):
     """
     NBA Player model.
@@ -132,28 +328,33 @@ class Player(SearchableMixin, PaginatedAPIMixin, db.Model):
     """
     __searchable__ = ['player_name']
     id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(20), index=True, unique=True, nullable=True)
     player_image = db.Column(db.String(50), nullable=True)
+    headshot = db.Column(db.String(70), nullable=True)
     player_name = db.Column(db.String(100), index=True)
     position = db.Column(db.String(100))
     first_nba_season = db.Column(db.SmallInteger, nullable=True)
+    last_nba_season = db.Column(db.SmallInteger, nullable=True)
     field_goal_made = db.Column(db.Float(31), nullable=True)
     field_goal_attempted = db.Column(db.Float(31), nullable=True)
-    field_goal_pct = db.Column(db.Float(21), nullable=True)
+    field_goal_pct = db.Column(db.Float(21), index=True, nullable=True)
     three_pt_made = db.Column(db.Float(31), nullable=True)
     three_pt_attempted = db.Column(db.Float(31), nullable=True)
-    three_pt_pct = db.Column(db.Float(21), nullable=True)
+    three_pt_pct = db.Column(db.Float(21), index=True, nullable=True)
     free_throw_made = db.Column(db.Float(31), nullable=True)
     free_throw_attempted = db.Column(db.Float(31), nullable=True)
-    free_throw_pct = db.Column(db.Float(21), nullable=True)
-    true_stg_pct = db.Column(db.Float(21), nullable=True)
-    points = db.Column(db.Float(21), nullable=True)
+    free_throw_pct = db.Column(db.Float(21), index=True, nullable=True)
+    true_stg_pct = db.Column(db.Float(21), index=True, nullable=True)
+    points = db.Column(db.Float(21), index=True, nullable=True)
     off_reb = db.Column(db.Float(21), nullable=True)
     def_reb = db.Column(db.Float(21), nullable=True)
-    tot_reb = db.Column(db.Float(21), nullable=True)
-    assists = db.Column(db.Float(21), nullable=True)
-    steals = db.Column(db.Float(21), nullable=True)
-    blocks = db.Column(db.Float(21), nullable=True)
+    tot_reb = db.Column(db.Float(21), index=True, nullable=True)
+    assists = db.Column(db.Float(21), index=True, nullable=True)
+    steals = db.Column(db.Float(21), index=True, nullable=True)
+    blocks = db.Column(db.Float(21), index=True, nullable=True)
     turnovers = db.Column(db.Float(21), nullable=True)
+    seasons = db.relationship('PlayerSeason', backref='player',
+                              lazy='dynamic', cascade='all, delete-orphan')
 
     def to_dict(self):
         """
@@ -166,28 +367,14 @@ class Player(SearchableMixin, PaginatedAPIMixin, db.Model):
             'player_image': self.player_image,
             'positions': self.position,
             'first_nba_season': self.first_nba_season,
+            'last_nba_season': self.last_nba_season,
             'shooting': {
-                'field_goal_made': self.field_goal_made,
-                'field_goal_attempted': self.field_goal_attempted,
-                'field_goal_pct': self.field_goal_pct,
-                'three_pt_made': self.three_pt_made,
-                'three_pt_attempted': self.three_pt_attempted,
-                'three_pt_pct': self.three_pt_pct,
-                'free_throw_made': self.free_throw_made,
-                'free_throw_attempted': self.free_throw_attempted,
-                'free_throw_pct': self.free_throw_pct,
-                'true_stg_pct': self.true_stg_pct,
-                'points': self.points
-            },
-            'off_reb': self.off_reb,
-            'def_reb': self.def_reb,
-            'tot_reb': self.tot_reb,
-            'assists': self.assists,
-            'steals': self.steals,
-            'blocks': self.blocks,
-            'turnovers': self.turnovers,
+                stat: getattr(self, stat) for stat in SHOOTING_STATS},
+            **{stat: getattr(self, stat) for stat in OTHER_STATS},
             '_links': {
-                'self': url_for('api.get_player_id', id=self.id)
+                'self': url_for('api.get_player_id', id=self.id),
+                'headshot': url_for('api.get_headshot', name=self.headshot)
+                    if self.headshot else None
             }
         }
         return data
@@ -206,6 +393,65 @@ class Player(SearchableMixin, PaginatedAPIMixin, db.Model):
         return '<Player: {}>'.format(self.player_name)
 
 
+class PlayerSeason(db.Model):
+    """
+    Per game stats of an NBA player for one season and team, from the
+    season rows of the player's page. 'season' is the year the season ended
+    in. A season split between teams has a row per team and a 'TOT' row.
+    """
+    __tablename__ = 'player_seasons'
+    __table_args__ = (
+        db.UniqueConstraint('player_id', 'season', 'team'),)
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey(
+        'player.id', ondelete='CASCADE'), index=True)
+    season = db.Column(db.SmallInteger, index=True)
+    team = db.Column(db.String(3))
+    league = db.Column(db.String(3), nullable=True)
+    age = db.Column(db.SmallInteger, nullable=True)
+    position = db.Column(db.String(20), nullable=True)
+    games = db.Column(db.SmallInteger, nullable=True)
+    field_goal_made = db.Column(db.Float(31), nullable=True)
+    field_goal_attempted = db.Column(db.Float(31), nullable=True)
+    field_goal_pct = db.Column(db.Float(21), nullable=True)
+    three_pt_made = db.Column(db.Float(31), nullable=True)
+    three_pt_attempted = db.Column(db.Float(31), nullable=True)
+    three_pt_pct = db.Column(db.Float(21), nullable=True)
+    free_throw_made = db.Column(db.Float(31), nullable=True)
+    free_throw_attempted = db.Column(db.Float(31), nullable=True)
+    free_throw_pct = db.Column(db.Float(21), nullable=True)
+    true_stg_pct = db.Column(db.Float(21), nullable=True)
+    points = db.Column(db.Float(21), nullable=True)
+    off_reb = db.Column(db.Float(21), nullable=True)
+    def_reb = db.Column(db.Float(21), nullable=True)
+    tot_reb = db.Column(db.Float(21), nullable=True)
+    assists = db.Column(db.Float(21), nullable=True)
+    steals = db.Column(db.Float(21), nullable=True)
+    blocks = db.Column(db.Float(21), nullable=True)
+    turnovers = db.Column(db.Float(21), nullable=True)
+
+    def __repr__(self):
+        """Represent a PlayerSeason instance using its season and team."""
+        return '<PlayerSeason: {} {}>'.format(self.season, self.team)
+
+
+class CrawlPage(db.Model):
+    """
+    Checkpoint state of a player page in the latest populate crawl, so an
+    interrupted crawl can be resumed. 'status' is one of 'pending', 'done'
+    or 'failed'; 'attempts' counts failed fetch/parse attempts.
+    """
+    __tablename__ = 'crawl_pages'
+    url = db.Column(db.String(200), primary_key=True)
+    status = db.Column(db.String(10), index=True, default='pending')
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(200), nullable=True)
+
+    def __repr__(self):
+        """Represent a CrawlPage instance using its URL and status."""
+        return '<CrawlPage: {} ({})>'.format(self.url, self.status)
+
+
 class User(db.Model):
     """
     Registered User model. Password functions to help authenticate user when
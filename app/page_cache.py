@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from threading import Lock
+from time import monotonic
+from app.util import parse_page
+
+
+class PageCache(object):
+    """
+    Compressed, content-addressed store of fetched page sources, so player
+    pages can be parsed again without fetching them.
+
+    Page sources are gzipped under objects/ and named after the SHA-256 of
+    their content, so a page that did not change between crawls is stored
+    once. Every put() appends (url, sha256, fetched_at) to the manifest,
+    index.jsonl, with the page's ETag and Last-Modified headers if known;
+    the last line for a URL is its current version.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = os.path.join(directory, 'index.jsonl')
+        self._lock = Lock()
+        self._entries = None
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+    def path(self, digest):
+        """Return the file name of the page source with hash 'digest'."""
+        return os.path.join(
+            self.directory, 'objects', digest[:2], digest + '.html.gz')
+
+    def put(self, url, html, etag=None, last_modified=None):
+        """
+        Store the page source (html) of url, with its ETag and Last-Modified
+        response headers if given, and return its hash.
+        """
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            # Write to a temporary file first so readers never see a
+            # partially written page
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(tmp, path)
+        entry = {'sha256': digest,
+                 'fetched_at': datetime.now(timezone.utc).isoformat()}
+        if etag is not None:
+            entry['etag'] = etag
+        if last_modified is not None:
+            entry['last_modified'] = last_modified
+        with self._lock:
+            with open(self.manifest, 'a') as f:
+                f.write(json.dumps(dict(entry, url=url)) + '\n')
+            if self._entries is not None:
+                self._entries[url] = entry
+        return digest
+
+    def read(self, digest):
+        """Return the page source with hash 'digest'."""
+        with open(self.path(digest), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+
+    def entries(self):
+        """
+        Return a dict mapping every cached URL to its current version, a
+        dict of 'sha256', 'fetched_at' and optionally 'etag' and
+        'last_modified'. The manifest is read once and then kept up to date
+        by put().
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if os.path.exists(self.manifest):
+                    with open(self.manifest) as f:
+                        for line in f:
+                            entry = json.loads(line)
+                            self._entries[entry.pop('url')] = entry
+            return dict(self._entries)
+
+    def entry(self, url):
+        """Return the current version of url (see entries()) or None."""
+        if self._entries is None:
+            self.entries()
+        return self._entries.get(url)
+
+    def get(self, url):
+        """Return the current page source of url, or None if not cached."""
+        entry = self.entry(url)
+        return self.read(entry['sha256']) if entry else None
+
+
+def reparse_page(directory, url, digest):
+    """
+    Parse the cached version 'digest' of player page url in a parser
+    process. Returns (row, seconds taken), or (exception, seconds taken) if
+    the page could not be read or parsed.
+    """
+    start = monotonic()
+    try:
+        row = parse_page(url, PageCache(directory).read(digest))
+    except Exception as e:
+        row = e
+    return row, monotonic() - start
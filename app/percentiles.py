@@ -0,0 +1,96 @@
+import numpy as np
+from app import db
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+from app.snapshots import player_snapshot
+
+
+# Stats with league percentiles
+PERCENTILE_STATS = SHOOTING_STATS + OTHER_STATS
+
+
+class LeagueDistribution(object):
+    """
+    Sorted arrays of the values of every stat in PERCENTILE_STATS across
+    all players, NULLs left out, so the percentile and rank of any value
+    is a binary search instead of a count query per stat.
+    """
+    def __init__(self, rows):
+        # None becomes NaN in a float array
+        values = np.array(rows, dtype=float).reshape(
+            -1, len(PERCENTILE_STATS))
+        self.sorted = {}
+        for stat, column in zip(PERCENTILE_STATS, values.T):
+            self.sorted[stat] = np.sort(column[~np.isnan(column)])
+
+    @classmethod
+    def load(cls):
+        """Return the distribution of the players in the database."""
+        return cls(db.session.query(*[
+            getattr(Player, stat) for stat in PERCENTILE_STATS]).all())
+
+    def rank(self, stat, values):
+        """
+        Return the percentiles, ranks and number of ranked players of the
+        array 'values' of 'stat'. The percentile of a value is the share
+        of players below it, counting half of those equal to it; its rank
+        is 1 plus the number of players above it. NaNs get NaN percentiles
+        and ranks of 0.
+        """
+        ordered = self.sorted[stat]
+        values = np.asarray(values, dtype=float)
+        below = np.searchsorted(ordered, values, side='left')
+        at_or_below = np.searchsorted(ordered, values, side='right')
+        count = len(ordered)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            percentiles = 100 * (below + at_or_below) / (2 * count)
+        missing = np.isnan(values)
+        percentiles[missing] = np.nan
+        ranks = np.where(missing, 0, count - at_or_below + 1)
+        return percentiles, ranks, count
+
+
+def league_distribution():
+    """
+    Return the LeagueDistribution of the players table, loaded once per
+    process and write (see player_snapshot).
+    """
+    return player_snapshot('percentiles', LeagueDistribution.load)
+
+
+def stat_value(item, stat):
+    """Return the value of 'stat' in a Player.to_dict() representation."""
+    if stat in SHOOTING_STATS:
+        return item.get('shooting', {}).get(stat)
+    return item.get(stat)
+
+
+def add_percentiles(items):
+    """
+    Add the league percentile and rank of their stats to the player
+    representations 'items' (as returned by Player.to_dict(), possibly
+    trimmed to some fields), under 'percentiles', grouped like the stats.
+    The items are ranked one stat at a time, all of them at once.
+    """
+    distribution = league_distribution()
+    for item in items:
+        item['percentiles'] = {}
+    for stat in PERCENTILE_STATS:
+        present = [item for item in items if stat in item or
+                   stat in item.get('shooting', ())]
+        if not present:
+            continue
+        values = [stat_value(item, stat) for item in present]
+        percentiles, ranks, count = distribution.rank(
+            stat, [np.nan if value is None else value for value in values])
+        for item, value, percentile, rank in zip(
+                present, values, percentiles.tolist(), ranks.tolist()):
+            data = None if value is None or not count else {
+                'percentile': round(percentile, 1),
+                'rank': rank,
+                'of': count
+            }
+            if stat in SHOOTING_STATS:
+                item['percentiles'].setdefault('shooting', {})[stat] = data
+            else:
+                item['percentiles'][stat] = data
+    return items
@@ -0,0 +1,192 @@
+from bisect import bisect_left, insort
+from threading import RLock
+import numpy as np
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import Player
+from app.snapshots import current_version, player_snapshot
+
+
+# Columns held by the store: every column of the players table
+STORE_COLUMNS = tuple(Player.__table__.columns.keys())
+
+# Float columns are held in NumPy arrays, NULLs as NaN, and the others in
+# lists
+FLOAT_COLUMNS = tuple(
+    column for column in STORE_COLUMNS
+    if Player.__table__.columns[column].type.python_type is float)
+
+
+class PlayerStore(object):
+    """
+    In-process, columnar copy of the players table: a row per player, each
+    column in a NumPy array (float columns) or a list (the others), with
+    an index of rows by id, an index of ids by name, and the sort keys of
+    the players by id and by (name, id) for pages.
+
+    Rows of deleted players are left in place, unreachable from the
+    indexes, and rows are appended to arrays with spare capacity, so
+    writes (see apply) never copy the store.
+    """
+    def __init__(self, rows=()):
+        self.lock = RLock()
+        rows = list(rows)
+        self.size = len(rows)
+        capacity = max(self.size, 16)
+        values = list(zip(*rows)) if rows else [()] * len(STORE_COLUMNS)
+        self.columns = {}
+        for column, column_values in zip(STORE_COLUMNS, values):
+            if column in FLOAT_COLUMNS:
+                array = np.full(capacity, np.nan)
+                array[:self.size] = np.array(column_values, dtype=float)
+                self.columns[column] = array
+            else:
+                self.columns[column] = list(column_values)
+        self.rows = {}
+        self.names = {}
+        for row, (id, name) in enumerate(zip(
+                self.columns['id'], self.columns['player_name'])):
+            self.rows[id] = row
+            self.names.setdefault(name, []).append(id)
+        for ids in self.names.values():
+            ids.sort()
+        self.id_keys = sorted((id,) for id in self.rows)
+        self.name_keys = sorted((name, id) for name, ids in self.names.items()
+                                if name is not None for id in ids)
+
+    @classmethod
+    def load(cls):
+        """Return the store of the players in the database."""
+        return cls(cls.load_rows())
+
+    @staticmethod
+    def load_rows():
+        """Return the rows of the players table with STORE_COLUMNS."""
+        return db.session.query(*[
+            getattr(Player, column) for column in STORE_COLUMNS]).all()
+
+    def find(self, id):
+        """Return 'id' if a player has this primary key, else None."""
+        return id if id in self.rows else None
+
+    def find_name(self, name):
+        """Return the lowest id of the players named 'name', or None."""
+        ids = self.names.get(name)
+        return ids[0] if ids else None
+
+    def name_range(self, prefix):
+        """
+        Return the range of name_keys of the players whose name starts
+        with 'prefix'.
+        """
+        with self.lock:
+            return (bisect_left(self.name_keys, (prefix,)),
+                    bisect_left(self.name_keys, (prefix + '\U0010ffff',)))
+
+    def values(self, ids, columns):
+        """
+        Return the rows of the players 'ids' (which must be in the store)
+        with the values of 'columns', NULLs as None, like a query selecting
+        these columns.
+        """
+        with self.lock:
+            rows = [self.rows[id] for id in ids]
+            values = []
+            for column in columns:
+                data = self.columns[column]
+                if column in FLOAT_COLUMNS:
+                    values.append([None if value != value else value
+                                   for value in data[rows].tolist()])
+                else:
+                    values.append([data[row] for row in rows])
+        return list(zip(*values)) if values else [() for _ in rows]
+
+    def apply(self, changes):
+        """
+        Apply player 'changes', a dict mapping player ids to the values of
+        their columns, or to None for deleted players.
+        """
+        with self.lock:
+            for id, values in changes.items():
+                self._remove(id)
+                if values is not None:
+                    self._add(values)
+
+    def _remove(self, id):
+        row = self.rows.pop(id, None)
+        if row is None:
+            return
+        name = self.columns['player_name'][row]
+        self.names[name].remove(id)
+        if not self.names[name]:
+            del self.names[name]
+        del self.id_keys[bisect_left(self.id_keys, (id,))]
+        if name is not None:
+            del self.name_keys[bisect_left(self.name_keys, (name, id))]
+
+    def _add(self, values):
+        row = self.size
+        self.size += 1
+        for column in STORE_COLUMNS:
+            data = self.columns[column]
+            if column in FLOAT_COLUMNS:
+                if row == len(data):
+                    grown = np.full(2 * len(data), np.nan)
+                    grown[:row] = data
+                    data = self.columns[column] = grown
+                value = values[column]
+                data[row] = np.nan if value is None else value
+            else:
+                data.append(values[column])
+        id, name = values['id'], values['player_name']
+        self.rows[id] = row
+        insort(self.names.setdefault(name, []), id)
+        insort(self.id_keys, (id,))
+        if name is not None:
+            insort(self.name_keys, (name, id))
+
+    def check(self):
+        """
+        Compare the store with the players table and return the ids of the
+        players whose row differs, is missing from it or is left over.
+        """
+        with self.lock:
+            ids = sorted(self.rows)
+            stored = dict(zip(ids, self.values(ids, STORE_COLUMNS)))
+        mismatched = []
+        for row in PlayerStore.load_rows():
+            if stored.pop(row[0], None) != tuple(row):
+                mismatched.append(row[0])
+        return sorted(mismatched + list(stored))
+
+
+def player_store():
+    """
+    Return the PlayerStore of the players table if PLAYER_STORE is enabled,
+    else None. The store is kept current by the commit events of
+    app.snapshots, and loaded again after writes of other processes and
+    bulk writes, which invalidate_snapshots.
+    """
+    if not current_app.config['PLAYER_STORE']:
+        return None
+    return player_snapshot('store', PlayerStore.load)
+
+
+def init_player_store(app):
+    """
+    Load the store of 'app' at startup if PLAYER_STORE is enabled. It is
+    loaded on first use instead if the players table cannot be read yet,
+    e.g. before the database is migrated.
+    """
+    if not app.config['PLAYER_STORE']:
+        return
+    with app.app_context():
+        try:
+            version = current_version()
+            app.extensions.setdefault('player_snapshots', {})['store'] = (
+                version, PlayerStore.load())
+        except SQLAlchemyError:
+            app.logger.warning('Player store not loaded at startup')
+        finally:
+            db.session.remove()
@@ -1,61 +1,334 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from queue import Queue
-from threading import Thread
+from threading import Event, Thread
+from functools import partial
 from time import sleep
 from app import db
 from flask import current_app
-from app.util import player_urls, selenium_task, selenium_queue_listener
+from string import ascii_lowercase
+from app.fetch import FetchPool, HTTPWorker, http_session
+from app.util import (
+    index_urls, discover_player_urls, selenium_queue_listener,
+    parse_queue_listener)
+from app.writer import player_writer
+from app.checkpoint import (
+    failed_attempts, is_index_url, start_crawl, resume_crawl)
+from app.page_cache import PageCache, reparse_page
+from app.refresh import current_season, refresh_selection
+from app.retry import RetryQueue
+from app.work_queue import LeasedQueue, LeasedRetryQueue
+from app.throttle import AdaptiveLimiter, HostRateLimiter
+from app.metrics import CrawlMetrics
 from selenium.webdriver.chrome.options import Options
 from selenium import webdriver
 
 
-def populate_database(db):
+# Engines accepted by populate_database (and 'flask populate initiate')
+ENGINES = ('selenium', 'http')
+
+
+def create_workers(engine, worker_ids):
+    """
+    Return a dict mapping each worker_id to a page fetching worker.
+
+    'selenium' starts one headless Chrome per worker. 'http' creates plain
+    HTTP workers sharing a single keep-alive connection pool, which needs no
+    browser and is only bounded by network concurrency.
+    """
+    if engine == 'http':
+        session = http_session(pool_size=len(worker_ids))
+        return {i: HTTPWorker(session) for i in worker_ids}
+    chromeOptions = Options()
+    chromeOptions.add_argument('--headless')
+    return {i: webdriver.Chrome(options=chromeOptions) for i in worker_ids}
+
+
+def report_progress(progress, metrics, finished, interval):
+    """Call progress(metrics) every 'interval' seconds until 'finished'."""
+    while not finished.wait(interval):
+        progress(metrics)
+
+
+def populate_database(db, engine='selenium', batch_size=None, resume=False,
+                      workers=None, max_workers=None, rate=None,
+                      letters=ascii_lowercase, metrics=None, progress=None,
+                      refresh=False, season=None, work_queue=None,
+                      seed=True):
     """
     Use multithreading to search through multiple player websites concurrently
     and commit NBA players to Players table.
 
-    Using ChromeDriver for Chrome version 78.
+    The crawl is a pipeline of stages joined by bounded queues
+    (CRAWL_QUEUE_DEPTH): the letter index pages of 'letters' are read
+    concurrently and stream player URLs onto the work queue as they are
+    parsed, fetch threads put raw page source on html_queue, a pool of
+    CRAWL_PARSE_PROCESSES processes turns it into row dicts on row_queue,
+    and a single writer thread persists them.
+
+    'engine' selects how pages are fetched: 'selenium' (ChromeDriver for
+    Chrome version 78) or 'http' (see create_workers). Parsed players are
+    upserted by a single writer thread in batches of 'batch_size' rows
+    (CRAWL_BATCH_SIZE by default), so re-running updates existing players.
+
+    Crawl progress is checkpointed in the crawl_pages table with every batch.
+    With 'resume', only the pages of the saved crawl that are not done yet
+    are fetched; a new crawl is started if there is none to resume. Failed
+    attempts carry over, so pages already given up on are not fetched again.
+
+    Pages that fail are retried with exponential backoff up to
+    CRAWL_MAX_ATTEMPTS times. Pages given up on are reported at the end and
+    returned as a list of (url, attempts, exception).
+
+    Fetching starts with 'workers' concurrent fetches (CRAWL_WORKERS) and is
+    grown or shrunk between 1 and 'max_workers' from observed latency and
+    error rate (see AdaptiveLimiter). 'max_workers' defaults to
+    CRAWL_MAX_WORKERS for the http engine and to 'workers' for selenium,
+    since every worker is a browser started up front. 'rate' caps requests
+    per second to a host (CRAWL_MAX_RATE, 0 for no cap).
+
+    Stage timings and counters are recorded in 'metrics' (a CrawlMetrics,
+    created if not given). If 'progress' is given, it is called with the
+    metrics every CRAWL_PROGRESS_INTERVAL seconds while the crawl runs.
+
+    Every fetched page is also stored in the page cache (PAGE_CACHE_DIR), so
+    players can be rebuilt with reparse_database without crawling again.
+    Only players whose parsed values changed are written.
+
+    With 'refresh', the crawl is incremental: players active in 'season'
+    (the current one by default) are crawled first, retired players whose
+    career is already stored are skipped (see refresh_selection), and
+    pages unchanged since they were cached are not parsed again. Only the
+    'season' rows of players with earlier seasons stored are rewritten,
+    and their career columns recomputed from their stored seasons.
+
+    With 'work_queue' (an app.work_queue.RedisWorkQueue), the crawl is
+    distributed: any number of populate processes, on any hosts, lease
+    player pages from the shared queue and write them to the same database.
+    Only the process started with 'seed' starts a new crawl and reads the
+    index pages; the others crawl the pages it queues. Every process
+    returns once all pages are written or given up on. The crawl_pages
+    checkpoint is not used: a worker that dies loses only its leases, which
+    other workers take over once they expire, and 'resume' has no effect.
+    Pages are only completed once written, so the writer also writes
+    partial batches after CRAWL_FLUSH_SECONDS without new rows.
     """
-    # Retrieve all players' URLs to parse and append 'STOP' to end of list
-    # to ensure queue is threadsafe.
-    selenium_data = player_urls()
-    selenium_data.append('STOP')
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'")
+    app = current_app._get_current_object()
+    if batch_size is None:
+        batch_size = app.config['CRAWL_BATCH_SIZE']
+    if workers is None:
+        workers = app.config['CRAWL_WORKERS']
+    if max_workers is None:
+        max_workers = app.config['CRAWL_MAX_WORKERS'] \
+            if engine == 'http' else workers
+    max_workers = max(workers, max_workers)
+    if rate is None:
+        rate = app.config['CRAWL_MAX_RATE']
+    if metrics is None:
+        metrics = CrawlMetrics()
+    if season is None:
+        season = current_season()
 
-    selenium_data_queue = Queue()
-    worker_queue = Queue()
+    html_queue = Queue(maxsize=app.config['CRAWL_QUEUE_DEPTH'])
+    row_queue = Queue(maxsize=app.config['CRAWL_QUEUE_DEPTH'])
+    write_errors = []
+    retry_args = (app.config['CRAWL_MAX_ATTEMPTS'],
+                  app.config['CRAWL_RETRY_DELAY'],
+                  app.config['CRAWL_MAX_RETRY_DELAY'], metrics)
+    if work_queue is None:
+        selenium_data_queue = Queue()
+        retry_queue = RetryQueue(selenium_data_queue, *retry_args)
+    else:
+        selenium_data_queue = LeasedQueue(work_queue)
+        retry_queue = LeasedRetryQueue(work_queue, *retry_args)
 
-    # Create multiple instances of webdrivers and assign to them a worker_id
-    num_threads = 4
-    worker_ids = list(range(num_threads))
-    chromeOptions = Options()
-    chromeOptions.add_argument('--headless')
-    selenium_workers = {
-        i: webdriver.Chrome(options=chromeOptions) for i in worker_ids
-    }
+    # Create multiple instances of webdrivers and assign to them a worker_id.
+    # Only as many as the adaptive limit allows fetch at the same time.
+    worker_ids = list(range(max_workers))
+    fetch_pool = FetchPool(
+        create_workers(engine, worker_ids),
+        AdaptiveLimiter(workers, 1, max_workers), HostRateLimiter(rate),
+        metrics, PageCache(app.config['PAGE_CACHE_DIR']))
+
+    # Pages still to crawl: all letter index pages for a new crawl, or the
+    # index and player pages not done yet in the saved one if resuming. In
+    # a distributed crawl, the seeding process reads the index pages and
+    # the player pages are taken from the work queue.
+    register = None
+    if work_queue is not None:
+        index_pages, selenium_data = [], []
+        register = lambda index_url, urls: work_queue.add(urls)
+        if seed:
+            work_queue.reset()
+            work_queue.start_seeding()
+            index_pages = index_urls(app.config['BBALL_REF_URL'], letters)
+    else:
+        saved = resume_crawl(db, app.config['CRAWL_MAX_ATTEMPTS']) \
+            if resume else None
+        if saved is not None:
+            retry_queue.attempts.update(failed_attempts(db))
+        else:
+            saved = (start_crawl(db, index_urls(
+                app.config['BBALL_REF_URL'], letters)), [])
+        index_pages, selenium_data = saved
+    metrics.incr('pages_queued', len(selenium_data))
+
+    # Start the writer thread that persists rows parsed by the listeners
+    writer_thread = Thread(target=player_writer, args=(
+        row_queue, db, app, batch_size, write_errors, metrics,
+        work_queue is None, season if refresh else None, work_queue,
+        None if work_queue is None else app.config['CRAWL_FLUSH_SECONDS']))
+    writer_thread.daemon = True
+    writer_thread.start()
 
-    for worker_id in worker_ids:
-        worker_queue.put(worker_id)
+    # Start the parse stage: one thread feeding a pool of parser processes.
+    # Parsers are spawned rather than forked: forking while the other
+    # stages' threads hold locks can deadlock the child processes.
+    parse_processes = app.config['CRAWL_PARSE_PROCESSES']
+    executor = ProcessPoolExecutor(
+        max_workers=parse_processes, mp_context=get_context('spawn'))
+    parse_thread = Thread(target=parse_queue_listener, args=(
+        html_queue, executor, parse_processes * 2, selenium_data_queue,
+        row_queue, retry_queue, metrics))
+    parse_thread.daemon = True
+    parse_thread.start()
 
     # Instantiate threads with selenium_queue_listener target function and
     # start the threads
     selenium_threads = [Thread(
-            target=selenium_queue_listener, args=(selenium_workers,
-            selenium_data_queue,worker_queue, db,
-            current_app._get_current_object())) for _ in worker_ids]
+            target=selenium_queue_listener, args=(fetch_pool,
+            selenium_data_queue, html_queue, row_queue, retry_queue, app,
+            refresh))
+            for _ in worker_ids]
     for p in selenium_threads:
         p.daemon = True
         p.start()
 
+    # Report progress periodically until the crawl is finished
+    finished = Event()
+    if progress is not None:
+        interval = app.config['CRAWL_PROGRESS_INTERVAL']
+        progress_thread = Thread(target=report_progress, args=(
+            progress, metrics, finished, interval))
+        progress_thread.daemon = True
+        progress_thread.start()
+
     # Place all the URLs of pages to parse in shared data queue so all
     # threads have access
     for d in selenium_data:
         selenium_data_queue.put(d)
 
-    # Wait for queue listener threads to complete
+    # Read the index pages, queueing player pages as they are found
+    try:
+        discover_player_urls(
+            fetch_pool, index_pages, selenium_data_queue, retry_queue,
+            metrics, db, app, partial(refresh_selection, db, season=season)
+            if refresh else None, register)
+    finally:
+        if work_queue is not None and seed:
+            work_queue.stop_seeding()
+
+    # Wait until every URL is parsed or given up on (including pending
+    # retries), then send 'STOP' to kill the listener threads
+    selenium_data_queue.join()
+    retry_queue.close()
+    selenium_data_queue.put('STOP')
     for p in selenium_threads:
         p.join()
 
-    # Tear down web workers
-    for b in selenium_workers.values():
-        b.quit()
+    # Tear down web workers and parser processes
+    fetch_pool.quit()
+    html_queue.put('STOP')
+    parse_thread.join()
+    executor.shutdown()
+
+    # Flush the remaining rows and wait for the writer to finish
+    row_queue.put('STOP')
+    writer_thread.join()
+    finished.set()
+    if progress is not None:
+        progress(metrics)
+    if write_errors:
+        raise write_errors[0]
+
+    if retry_queue.dead_letters:
+        print(f"Gave up on {len(retry_queue.dead_letters)} pages:",
+              file=sys.stderr)
+        for url, attempts, error in retry_queue.dead_letters:
+            print(f"  {url} ({attempts} attempts): {error!r}",
+                  file=sys.stderr)
+    return retry_queue.dead_letters
+
+
+def reparse_database(db, batch_size=None, metrics=None, progress=None):
+    """
+    Rebuild the players table from the page cache (PAGE_CACHE_DIR) instead
+    of crawling: the current cached version of every player page is parsed
+    by a pool of CRAWL_PARSE_PROCESSES processes and upserted in batches of
+    'batch_size' rows (CRAWL_BATCH_SIZE by default). The crawl checkpoint is
+    left untouched. Use it after fixing the parser or adding a column.
+
+    'metrics' and 'progress' are used as in populate_database. Pages that
+    could not be parsed are reported at the end and returned as a list of
+    (url, exception).
+    """
+    app = current_app._get_current_object()
+    if batch_size is None:
+        batch_size = app.config['CRAWL_BATCH_SIZE']
+    if metrics is None:
+        metrics = CrawlMetrics()
+    cache = PageCache(app.config['PAGE_CACHE_DIR'])
+    pages = [(url, entry['sha256']) for url, entry in
+             cache.entries().items() if not is_index_url(url)]
+    metrics.incr('pages_queued', len(pages))
+
+    row_queue = Queue(maxsize=app.config['CRAWL_QUEUE_DEPTH'])
+    write_errors = []
+    writer_thread = Thread(target=player_writer, args=(
+        row_queue, db, app, batch_size, write_errors, metrics, False))
+    writer_thread.daemon = True
+    writer_thread.start()
+
+    finished = Event()
+    if progress is not None:
+        interval = app.config['CRAWL_PROGRESS_INTERVAL']
+        progress_thread = Thread(target=report_progress, args=(
+            progress, metrics, finished, interval))
+        progress_thread.daemon = True
+        progress_thread.start()
+
+    # Parser processes read the pages from the cache themselves, so only
+    # the URL and hash of each page are sent to them
+    failed = []
+    parse_processes = app.config['CRAWL_PARSE_PROCESSES']
+    with ProcessPoolExecutor(max_workers=parse_processes,
+                             mp_context=get_context('spawn')) as executor:
+        results = executor.map(
+            reparse_page, [cache.directory] * len(pages),
+            [url for url, _ in pages], [digest for _, digest in pages],
+            chunksize=16)
+        for (url, _), (row, seconds) in zip(pages, results):
+            metrics.add_time('parse', seconds)
+            if isinstance(row, Exception):
+                failed.append((url, row))
+                metrics.incr('dead_letters')
+            else:
+                row_queue.put((url, row))
+
+    row_queue.put('STOP')
+    writer_thread.join()
+    finished.set()
+    if progress is not None:
+        progress(metrics)
+    if write_errors:
+        raise write_errors[0]
 
-    db.session.commit()
+    if failed:
+        print(f"Could not parse {len(failed)} cached pages:",
+              file=sys.stderr)
+        for url, error in failed:
+            print(f"  {url}: {error!r}", file=sys.stderr)
+    return failed
@@ -0,0 +1,37 @@
+from datetime import date
+from app.models import Player
+from app.util import player_slug
+
+
+def current_season(today=None):
+    """
+    Return the season running on 'today' (default: today) as the year it
+    ends in, e.g. 2021 for the 2020-21 season. Seasons start in October;
+    during the off-season the season that just ended is returned.
+    """
+    today = today or date.today()
+    return today.year + 1 if today.month >= 10 else today.year
+
+
+def refresh_selection(db, rows, season):
+    """
+    Choose which players listed on a letter index page an incremental
+    refresh crawls, and in which order. 'rows' are (player page URL, last
+    season) pairs as returned by app.util.player_index_rows.
+
+    Active players, whose last season is 'season' or later, come first.
+    They are followed by players not stored yet, or whose stored last
+    season differs from the index. Retired players already stored with the
+    same last season are skipped, since their career lines cannot change.
+    """
+    slugs = [player_slug(url) for url, _ in rows]
+    stored = dict(db.session.query(Player.slug, Player.last_nba_season)
+                  .filter(Player.slug.in_(slugs))) if slugs else {}
+    active, stale = [], []
+    for url, last_season in rows:
+        if last_season is not None and last_season >= season:
+            active.append(url)
+        elif last_season is None or \
+                stored.get(player_slug(url), 0) != last_season:
+            stale.append(url)
+    return active + stale
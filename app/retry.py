@@ -0,0 +1,87 @@
+import heapq
+import random
+from collections import Counter
+from threading import Condition, Thread
+from time import monotonic
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Return the number of seconds to wait before retrying after 'attempt'
+    failures: exponential backoff capped at max_delay, with equal jitter so
+    URLs failing together are not all retried at the same time.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryQueue(object):
+    """
+    Delay queue putting failed URLs back on the work queue (data_queue)
+    after a backoff, until they have failed max_attempts times; they are
+    then kept in dead_letters as (url, attempts, exception) and dropped.
+
+    The RetryQueue takes over the failed URL's data_queue task: it calls
+    data_queue.task_done() only once the URL is back on data_queue or given
+    up, so data_queue.join() waits for retries to finish. Failures, retries
+    and dead letters are counted in metrics (app.metrics.CrawlMetrics).
+    """
+    def __init__(self, data_queue, max_attempts, base_delay, max_delay,
+                 metrics):
+        self.data_queue = data_queue
+        self.metrics = metrics
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = Counter()
+        self.dead_letters = []
+        self._delayed = []
+        self._closed = False
+        self._condition = Condition()
+        self._thread = Thread(target=self._release)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def retry(self, url, error):
+        """
+        Count a failed attempt of url and schedule it again, or give up on
+        it if it reached max_attempts. Returns True if it was scheduled.
+        """
+        self.metrics.incr('failures')
+        with self._condition:
+            self.attempts[url] += 1
+            attempt = self.attempts[url]
+            if attempt >= self.max_attempts:
+                self.dead_letters.append((url, attempt, error))
+                self.metrics.incr('dead_letters')
+                self.data_queue.task_done()
+                return False
+            self.metrics.incr('retries')
+            ready = monotonic() + backoff_delay(
+                attempt, self.base_delay, self.max_delay)
+            heapq.heappush(self._delayed, (ready, url))
+            self._condition.notify()
+            return True
+
+    def close(self):
+        """Stop releasing URLs and wait for the release thread to exit."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _release(self):
+        """Put each delayed URL back on data_queue once its delay is over."""
+        while True:
+            with self._condition:
+                while not self._closed and (
+                        not self._delayed or
+                        self._delayed[0][0] > monotonic()):
+                    timeout = self._delayed[0][0] - monotonic() \
+                        if self._delayed else None
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+                _, url = heapq.heappop(self._delayed)
+            self.data_queue.put(url)
+            self.data_queue.task_done()
@@ -1,4 +1,5 @@
 from flask import current_app
+from elasticsearch.helpers import bulk
 from elasticsearch_dsl import Search
 
 
@@ -12,6 +13,21 @@ def add_to_index(index, model):
     current_app.elasticsearch.index(index=index, id=model.id, body=payload)
 
 
+def bulk_add_to_index(index, docs):
+    """
+    Add many NBA player names to elasticsearch index in one request. Each
+    doc is a dict holding the model's id and its searchable fields.
+    """
+    if not current_app.elasticsearch or not docs:
+        return
+    actions = [{
+        '_index': index,
+        '_id': doc['id'],
+        '_source': {k: v for k, v in doc.items() if k != 'id'}
+    } for doc in docs]
+    bulk(current_app.elasticsearch, actions)
+
+
 def remove_from_index(index, model):
     """Remove NBA player name from elasticsearch index."""
     if not current_app.elasticsearch:
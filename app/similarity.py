@@ -0,0 +1,116 @@
+import numpy as np
+from app import db
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+from app.snapshots import player_snapshot
+
+
+# Stats players are compared on
+SIMILARITY_STATS = SHOOTING_STATS + OTHER_STATS
+
+
+class SimilarityIndex(object):
+    """
+    Nearest neighbour index of players by their stats. Each stat is
+    standardised to zero mean and unit variance across the players who
+    have it, into a float32 matrix with a row per player and missing stats
+    set to 0. The stats a player has are given by their pattern: players
+    of an era miss the same stats, so there are few distinct patterns.
+
+    The distance between two players is the Euclidean distance of their
+    standardised stats over the stats both of them have, scaled up to the
+    number of stats of the player searched from, so players missing
+    stats are neither favoured nor penalised. Expanding the square of
+    each difference, the distances to every player take one
+    matrix-vector product over the stats, plus products over the
+    patterns, with no per-player loop.
+    """
+    def __init__(self, ids, values):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        values = np.asarray(values, dtype=float).reshape(
+            len(self.ids), len(SIMILARITY_STATS))
+        known = ~np.isnan(values)
+        filled = np.where(known, values, 0.0)
+        counts = np.maximum(known.sum(axis=0), 1)
+        mean = filled.sum(axis=0) / counts
+        std = np.sqrt((np.where(known, values - mean, 0.0) ** 2).sum(
+            axis=0) / counts)
+        std[std == 0] = 1
+        # Column major, so a stat's column is contiguous
+        self.z = np.asfortranarray(
+            np.where(known, (filled - mean) / std, 0.0), dtype=np.float32)
+        self.norms = (self.z * self.z).sum(axis=1)
+        codes = known @ (1 << np.arange(len(SIMILARITY_STATS)))
+        codes, self.pattern = np.unique(codes, return_inverse=True)
+        self.pattern = self.pattern.reshape(-1)
+        self.patterns = ((codes[:, None] >> np.arange(
+            len(SIMILARITY_STATS))) & 1).astype(np.float32)
+
+    @classmethod
+    def load(cls):
+        """Return the index of the players in the database."""
+        rows = db.session.query(Player.id, *[
+            getattr(Player, stat) for stat in SIMILARITY_STATS]).order_by(
+            Player.id).all()
+        return cls([row[0] for row in rows], [row[1:] for row in rows])
+
+    def row(self, id):
+        """Return the row of the player with primary key 'id', or None."""
+        # ids are sorted, as loaded by Player.id
+        row = np.searchsorted(self.ids, id)
+        if row < len(self.ids) and self.ids[row] == id:
+            return row
+        return None
+
+    def scores(self, row):
+        """
+        Return the squared distances of every player to the player in
+        'row', inf for players sharing fewer than half of its stats, and
+        itself.
+        """
+        query = self.z[row]
+        mask = self.patterns[self.pattern[row]]
+        stats = mask.sum()
+        # Squared norms of the players over the query's stats
+        if stats == len(mask):
+            squared = self.norms.copy()
+        else:
+            squared = self.norms - (self.z[:, mask == 0] ** 2).sum(axis=1)
+        # With the query's missing stats at 0, these terms complete the sum
+        # of (z - query)^2 over the stats shared with each player
+        squared -= 2 * (self.z @ query)
+        squared += (self.patterns @ (query * query))[self.pattern]
+        shared = (self.patterns @ mask)[self.pattern]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.maximum(squared, 0) * stats / shared
+        scores[(shared < stats / 2) | (shared == 0)] = np.inf
+        scores[row] = np.inf
+        return scores
+
+    def neighbours(self, id, k):
+        """
+        Return the ids of the 'k' players most similar to the player with
+        primary key 'id', nearest first, with their distances. Raises
+        KeyError if the player is not in the index.
+        """
+        row = self.row(id)
+        if row is None:
+            raise KeyError(id)
+        if k <= 0 or not self.patterns[self.pattern[row]].any():
+            return []
+        scores = self.scores(row)
+        k = min(k, len(scores))
+        candidates = np.argpartition(scores, k - 1)[:k]
+        candidates = candidates[np.isfinite(scores[candidates])]
+        # Nearest first, ties broken by id
+        candidates = candidates[np.lexsort(
+            (self.ids[candidates], scores[candidates]))]
+        return list(zip(self.ids[candidates].tolist(),
+                        np.sqrt(scores[candidates]).tolist()))
+
+
+def similarity_index():
+    """
+    Return the SimilarityIndex of the players table, loaded once per
+    process and write (see player_snapshot).
+    """
+    return player_snapshot('similarity', SimilarityIndex.load)
@@ -0,0 +1,100 @@
+import random
+from flask import current_app, has_app_context
+from app import db, cache
+from app.models import Player
+
+
+# Cache key of the version of the players table, a counter incremented by
+# every write (see invalidate_snapshots)
+VERSION_KEY = 'players:version'
+
+# Key of the player changes of a session's transaction in session.info
+CHANGES = 'player_changes'
+
+
+def current_version():
+    """
+    Return the version of the players table. A missing counter starts at a
+    random value, so versions seen before the cache was cleared are not
+    mistaken for current ones.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, random.getrandbits(48), timeout=0)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_snapshots():
+    """
+    Mark the snapshots of the players table held by every process (see
+    player_snapshot) out of date after a write to it, so they are loaded
+    again when next used. Returns the new version.
+    """
+    current_version()
+    # Flask-Caching only exposes the backend's atomic increment
+    return cache.cache.inc(VERSION_KEY)
+
+
+def player_snapshot(name, load):
+    """
+    Return the snapshot 'name' of the players table, the result of
+    'load()'. It is loaded once per process and write: snapshots are kept
+    on the app until the version in the cache changes, so reading one
+    costs a single cache lookup.
+    """
+    version = current_version()
+    snapshots = current_app.extensions.setdefault('player_snapshots', {})
+    loaded = snapshots.get(name)
+    if loaded is None or loaded[0] != version:
+        loaded = (version, load())
+        snapshots[name] = loaded
+    return loaded[1]
+
+
+def record_player_changes(session, flush_context):
+    """
+    Respond to SQLAlchemy event triggered after a flush: save the column
+    values of the players added or modified, and the ids of those deleted,
+    for after_commit. Values are read here, as primary keys are assigned
+    by then and no SQL can be emitted after the commit.
+    """
+    changes = session.info.setdefault(CHANGES, {})
+    columns = Player.__table__.columns.keys()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Player):
+            changes[obj.id] = {
+                column: getattr(obj, column) for column in columns}
+    for obj in session.deleted:
+        if isinstance(obj, Player):
+            changes[obj.id] = None
+
+
+def apply_player_changes(session):
+    """
+    Respond to SQLAlchemy event triggered after a commit: if players were
+    written, make a new version of the players table. Snapshots with an
+    apply(changes) method that were current until this write are patched
+    with the changes saved by record_player_changes and stay current; any
+    other snapshot is loaded again when next used.
+    """
+    changes = session.info.pop(CHANGES, None)
+    if not changes or not has_app_context():
+        return
+    version = invalidate_snapshots()
+    snapshots = current_app.extensions.get('player_snapshots', {})
+    for name, (loaded, snapshot) in list(snapshots.items()):
+        # The counter moved by one only if no other process wrote since
+        if loaded == version - 1 and hasattr(snapshot, 'apply'):
+            snapshot.apply(changes)
+            snapshots[name] = (version, snapshot)
+
+
+def discard_player_changes(session):
+    """Forget the player changes of a transaction that was rolled back."""
+    session.info.pop(CHANGES, None)
+
+
+db.event.listen(db.session, 'after_flush', record_player_changes)
+db.event.listen(db.session, 'after_commit', apply_player_changes)
+db.event.listen(db.session, 'after_rollback', discard_player_changes)
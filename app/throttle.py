@@ -0,0 +1,85 @@
+from threading import Condition, Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+
+class AdaptiveLimiter(object):
+    """
+    Resizable limit on the number of fetches running at once, adjusted
+    AIMD-style after every 'window' fetches:
+
+    - if the window's error rate is above max_error_rate, or its mean
+      latency is more than latency_factor times the best window mean seen
+      so far, the limit is halved (multiplicative decrease);
+    - otherwise the limit grows by one (additive increase).
+
+    The limit always stays between minimum and maximum.
+    """
+    def __init__(self, initial, minimum, maximum, max_error_rate=0.1,
+                 latency_factor=2.0, window=20):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_error_rate = max_error_rate
+        self.latency_factor = latency_factor
+        self.window = window
+        self.active = 0
+        self.best_latency = None
+        self._latencies = []
+        self._errors = 0
+        self._condition = Condition()
+
+    def acquire(self):
+        """Block until a fetch may start under the current limit."""
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+
+    def release(self, latency, ok):
+        """Record a finished fetch's latency (seconds) and outcome."""
+        with self._condition:
+            self.active -= 1
+            self._latencies.append(latency)
+            if not ok:
+                self._errors += 1
+            if len(self._latencies) >= self.window:
+                self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        """Apply the AIMD rule to the window just completed."""
+        mean = sum(self._latencies) / len(self._latencies)
+        error_rate = self._errors / len(self._latencies)
+        if self.best_latency is None or mean < self.best_latency:
+            self.best_latency = mean
+        if error_rate > self.max_error_rate or \
+                mean > self.best_latency * self.latency_factor:
+            self.limit = max(self.minimum, self.limit // 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+        self._latencies = []
+        self._errors = 0
+
+
+class HostRateLimiter(object):
+    """
+    Spaces out requests to the same host so no host receives more than
+    'rate' requests per second. A rate of 0 (or None) disables the limit.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = {}
+        self._lock = Lock()
+
+    def wait(self, url):
+        """Block until a request to url's host is allowed."""
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            sleep(start - now)
@@ -1,215 +1,328 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from functools import partial
 from string import ascii_lowercase
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from time import monotonic, sleep
+import re
+import lxml.html
+from flask import current_app
 from app import db
-from app.models import Player
+from app.checkpoint import add_player_pages
+from app.retry import backoff_delay
 
-def player_urls():
+def index_urls(bball_ref_url, letters=ascii_lowercase):
+    """Return the URLs of the players' letter index pages."""
+    return [bball_ref_url + "/players/" + letter + "/" for letter in letters]
+
+
+def player_index_rows(html, bball_ref_url):
+    """
+    Return (player page URL, last season) for every player listed on a
+    letter index page (html). The last season is the year it ended in, e.g.
+    2020 for 2019-20, or None if it is not listed.
+    """
+    page = lxml.html.fromstring(html)
+    rows = []
+    for th in page.xpath('//th[@data-stat="player" and @scope="row"]'):
+        href = th.xpath('descendant::a[1]/@href')
+        if not href:
+            continue
+        year = th.getparent().xpath('td[@data-stat="year_max"]/text()')
+        rows.append((bball_ref_url + href[0],
+                     int(year[0]) if year and year[0].isdigit() else None))
+    return rows
+
+
+def parse_player_index(html, bball_ref_url):
+    """Return the player page URLs listed on a letter index page (html)."""
+    return [url for url, _ in player_index_rows(html, bball_ref_url)]
+
+
+def player_urls(driver=None, bball_ref_url=None, letters=ascii_lowercase):
     """
-    Retrieve all the NBA players' page URLs and return list.
+    Retrieve all the NBA players' page URLs and return list, reading the
+    letter index pages one after the other. populate_database streams them
+    with discover_player_urls instead.
 
     Using Selenium webdriver to make requests to website and scrape pages
-    using javascript to load content.
+    using javascript to load content. Any object with the same get() and
+    page_source interface (e.g. app.fetch.HTTPWorker) may be passed in as
+    'driver' instead.
 
     Using ChromeDriver for Chrome version 78.
     """
-    chromeOptions = Options()
-    chromeOptions.add_argument('--headless')
-    driver = webdriver.Chrome(options=chromeOptions)
+    if driver is None:
+        chromeOptions = Options()
+        chromeOptions.add_argument('--headless')
+        driver = webdriver.Chrome(options=chromeOptions)
 
-    bball_ref_url = "https://www.basketball-reference.com"
-    base_url = "https://www.basketball-reference.com/players/"
+    if bball_ref_url is None:
+        bball_ref_url = current_app.config['BBALL_REF_URL']
 
-    letters = ascii_lowercase
     urls_to_search = []
-    for letter in letters:
-        url = base_url + letter + "/"
-        players = driver.get(url)
-        players_soup = BeautifulSoup(driver.page_source, 'html.parser')
-        names = players_soup.findAll(
-            'th', attrs={'data-stat':'player', 'scope':'row'})
-        for name in names:
-            player_url = bball_ref_url + name.find('a')['href']
-            urls_to_search.append(player_url)
+    for url in index_urls(bball_ref_url, letters):
+        driver.get(url)
+        urls_to_search.extend(
+            parse_player_index(driver.page_source, bball_ref_url))
 
     return urls_to_search
 
 
-def selenium_task(worker, data):
+def discover_player_urls(
+        fetch_pool, index_pages, data_queue, retry_queue, metrics, db, app,
+        select=None, register=None):
     """
-    Using selenium webdriver (worker), make a request to URL (data) and
-    parse player information. Return Player object created from this
-    information.
+    URL producer of populate_database. Fetch the letter index pages
+    (index_pages) concurrently through fetch_pool and, as soon as each one
+    is parsed, register its player pages in the crawl checkpoint and put
+    the new ones on data_queue, so player pages are fetched while discovery
+    is still running. Index pages are retried with backoff like player
+    pages and given up on after retry_queue.max_attempts. Returns the
+    number of player pages queued. Each index page's time, failures and
+    the pages queued are recorded in metrics.
+
+    If 'select' is given, it is called with the (URL, last season) rows of
+    each index page (see player_index_rows) and returns the player pages to
+    crawl, in order; the others are counted as skipped.
+
+    Player pages are registered with 'register(index_url, urls)', which
+    returns the ones not registered yet; by default they are added to the
+    crawl checkpoint (app.checkpoint.add_player_pages).
     """
-    try:
-        worker.get(data)
+    bball_ref_url = app.config['BBALL_REF_URL']
+
+    def discover(index_url):
+        """Read one index page and queue its player pages."""
+        with app.app_context(), metrics.timer('discovery'):
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    rows = player_index_rows(
+                        fetch_pool.fetch(index_url), bball_ref_url)
+                    break
+                except Exception as e:
+                    metrics.incr('failures')
+                    if attempt >= retry_queue.max_attempts:
+                        retry_queue.dead_letters.append(
+                            (index_url, attempt, e))
+                        return 0
+                    metrics.incr('retries')
+                    sleep(backoff_delay(attempt, retry_queue.base_delay,
+                                        retry_queue.max_delay))
+            urls = [url for url, _ in rows]
+            if select is not None:
+                urls = select(rows)
+                metrics.incr('pages_skipped', len(rows) - len(urls))
+            if register is None:
+                new_urls = add_player_pages(db, index_url, urls)
+            else:
+                new_urls = register(index_url, urls)
+            db.session.remove()
+            metrics.incr('pages_queued', len(new_urls))
+            for url in new_urls:
+                data_queue.put(url)
+            return len(new_urls)
 
-        player_page_soup = BeautifulSoup(
-            worker.page_source, 'html.parser')
-        player_name = player_page_soup.find(
-            'h1', attrs={'itemprop':'name'}).text
-        try:
-            debut = float(
-                player_page_soup.find(
-                string="NBA Debut: ").find_parent('p').text[-5:][:4])
-        except:
-            debut = None
+    if not index_pages:
+        return 0
+    with ThreadPoolExecutor(max_workers=len(index_pages)) as executor:
+        return sum(executor.map(discover, index_pages))
 
-        try:
-            career_stats = player_page_soup.findAll(
-                'table', attrs={'id':'per_game'})[0].find('tfoot')
-        except:
-            career_stats = None
 
-        try:
-            fg_made = float(
-                career_stats.find(attrs={'data-stat':'fg_per_g'}).text)
-        except:
-            fg_made = None
+# Season labels of stat table rows, e.g. '2019-20' or '1999-00'
+SEASON = re.compile(r'^(\d{4})-\d{2}$')
 
-        try:
-            fg_attempt = float(
-                career_stats.find(attrs={'data-stat':'fga_per_g'}).text)
-        except:
-            fg_attempt = None
-
-        try:
-            fg_pct = float(
-                career_stats.find(attrs={'data-stat':'fg_pct'}).text)
-        except:
-            fg_pct = None
 
+def season_end_year(season):
+    """
+    Return the year a season label (e.g. '2019-20') ended in: 2020. Raises
+    ValueError for anything else, e.g. the 'Career' label.
+    """
+    match = SEASON.match(season)
+    if match is None:
+        raise ValueError(f"Not a season: '{season}'")
+    return int(match.group(1)) + 1
+
+
+# Career stats are read from the first (career) row of a table's tfoot.
+# Each entry maps the cell's data-stat attribute to (Player column, converter).
+PER_GAME_FIELDS = {
+    'fg_per_g': ('field_goal_made', float),
+    'fga_per_g': ('field_goal_attempted', float),
+    'fg_pct': ('field_goal_pct', float),
+    'fg3_per_g': ('three_pt_made', float),
+    'fg3a_per_g': ('three_pt_attempted', float),
+    'fg3_pct': ('three_pt_pct', float),
+    'ft_per_g': ('free_throw_made', float),
+    'fta_per_g': ('free_throw_attempted', float),
+    'ft_pct': ('free_throw_pct', float),
+    'pts_per_g': ('points', float),
+    'orb_per_g': ('off_reb', float),
+    'drb_per_g': ('def_reb', float),
+    'trb_per_g': ('tot_reb', float),
+    'ast_per_g': ('assists', float),
+    'stl_per_g': ('steals', float),
+    'blk_per_g': ('blocks', float),
+    'tov_per_g': ('turnovers', float),
+}
+ADVANCED_FIELDS = {
+    'ts_pct': ('true_stg_pct', float),
+}
+# Season rows of the per_game and advanced tables' tbody, read into
+# PlayerSeason columns. A season split between teams has a row per team
+# and a 'TOT' row.
+SEASON_FIELDS = dict(PER_GAME_FIELDS, **{
+    'season': ('season', season_end_year),
+    'age': ('age', int),
+    'team_id': ('team', str),
+    'lg_id': ('league', str),
+    'pos': ('position', str),
+    'g': ('games', int),
+})
+ADVANCED_SEASON_FIELDS = dict(ADVANCED_FIELDS, **{
+    'season': ('season', season_end_year),
+    'team_id': ('team', str),
+})
+
+
+def row_stats(tr, fields):
+    """
+    Convert a stat table row (tr) to a dict of columns in one pass over its
+    cells, using the 'fields' map. Columns whose cell is missing or empty
+    are None.
+    """
+    row = {column: None for column, _ in fields.values()}
+    for cell in tr:
+        field = fields.get(cell.get('data-stat'))
+        if field is None:
+            continue
+        column, convert = field
+        text = cell.text_content()
+        if not text:
+            continue
         try:
-            three_made = float(
-                career_stats.find(attrs={'data-stat':'fg3_per_g'}).text)
-        except:
-            three_made = None
+            row[column] = convert(text)
+        except ValueError:
+            pass
+    return row
 
-        try:
-            three_attempt = float(
-                career_stats.find(attrs={'data-stat':'fg3a_per_g'}).text)
-        except:
-            three_attempt = None
 
-        try:
-            three_pct = float(
-                career_stats.find(attrs={'data-stat':'fg3_pct'}).text)
-        except:
-            three_pct = None
+def footer_stats(table, fields):
+    """
+    Convert the career row of a stat table's footer to a dict of Player
+    columns, using the 'fields' map (see row_stats).
+    """
+    career = table.find('tfoot/tr') if table is not None else None
+    if career is None:
+        return {column: None for column, _ in fields.values()}
+    return row_stats(career, fields)
 
-        try:
-            ft_made = float(
-                career_stats.find(attrs={'data-stat':'ft_per_g'}).text)
-        except:
-            ft_made = None
 
-        try:
-            ft_attempt = float(
-                career_stats.find(attrs={'data-stat':'fta_per_g'}).text)
-        except:
-            ft_attempt = None
+def season_stats(per_game, advanced):
+    """
+    Return a dict of PlayerSeason column values for every season row of the
+    per_game table, in one pass over its tbody, with the true shooting
+    percentage of the matching advanced table row. Rows that are not a
+    season (e.g. repeated headers) are skipped.
+    """
+    true_shooting = {}
+    if advanced is not None:
+        for tr in advanced.iterfind('tbody/tr'):
+            row = row_stats(tr, ADVANCED_SEASON_FIELDS)
+            true_shooting[row['season'], row['team']] = row['true_stg_pct']
+    seasons = []
+    for tr in per_game.iterfind('tbody/tr'):
+        row = row_stats(tr, SEASON_FIELDS)
+        if row['season'] is None:
+            continue
+        row['true_stg_pct'] = true_shooting.get((row['season'], row['team']))
+        seasons.append(row)
+    return seasons
+
+
+def parse_player_page(html):
+    """
+    Parse a player's page source (html) with lxml and return a dict of
+    Player column values, with the player's season rows (see season_stats)
+    under 'seasons'. Only the bio block and the per_game and advanced tables
+    are read. Raises ValueError if the page has no per game table, which
+    usually means it did not load completely.
+    """
+    page = lxml.html.fromstring(html)
+    per_game = page.find('.//table[@id="per_game"]')
+    if per_game is None or per_game.find('tbody') is None:
+        raise ValueError('Per game table not found')
 
-        try:
-            ft_pct = float(
-                career_stats.find(attrs={'data-stat':'ft_pct'}).text)
-        except:
-            ft_pct = None
+    row = {'player_name':
+           page.xpath('//h1[@itemprop="name"]')[0].text_content()}
 
-        try:
-            tot_pts = float(
-                career_stats.find(attrs={'data-stat':'pts_per_g'}).text)
-        except:
-            tot_pts = None
+    debut = page.xpath('//text()[.="NBA Debut: "]/ancestor::p[1]')
+    try:
+        row['first_nba_season'] = int(debut[0].text_content().strip()[-4:])
+    except (IndexError, ValueError):
+        row['first_nba_season'] = None
 
-        try:
-            o_reb = float(
-                career_stats.find(attrs={'data-stat':'orb_per_g'}).text)
-        except:
-            o_reb = None
+    img = page.xpath('//img[@itemscope="image"]/@src')
+    row['player_image'] = img[0].split('/')[-1] if img else None
 
-        try:
-            d_reb = float(
-                career_stats.find(attrs={'data-stat':'drb_per_g'}).text)
-        except:
-            d_reb = None
+    advanced = page.find('.//table[@id="advanced"]')
+    seasons = season_stats(per_game, advanced)
+    row['seasons'] = seasons
+    row['last_nba_season'] = seasons[-1]['season'] if seasons else None
+    # Keep positions in the order the player first played them
+    row['position'] = ', '.join(dict.fromkeys(
+        season['position'] for season in seasons if season['position']))
 
-        try:
-            tot_reb = float(
-                career_stats.find(attrs={'data-stat':'trb_per_g'}).text)
-        except:
-            tot_reb = None
+    row.update(footer_stats(per_game, PER_GAME_FIELDS))
+    row.update(footer_stats(advanced, ADVANCED_FIELDS))
+    return row
 
-        try:
-            ass = float(
-                career_stats.find(attrs={'data-stat':'ast_per_g'}).text)
-        except:
-            ass = None
 
-        try:
-            stls = float(
-                career_stats.find(attrs={'data-stat':'stl_per_g'}).text)
-        except:
-            stls = None
+def player_slug(url):
+    """
+    Return the stable basketball-reference id of a player page URL, e.g.
+    'jamesle01' for '.../players/j/jamesle01.html'.
+    """
+    return url.rsplit('/', 1)[-1].split('.')[0]
 
-        try:
-            blks = float(
-                career_stats.find(attrs={'data-stat':'blk_per_g'}).text)
-        except:
-            blks = None
 
-        try:
-            tov = float(
-                career_stats.find(attrs={'data-stat':'tov_per_g'}).text)
-        except:
-            tov = None
+def parse_page(url, html):
+    """
+    Parse the page source (html) of player page URL and return a dict of
+    Player column values, keyed by the page's slug. Runs in the parser
+    processes of populate_database, so it must stay a picklable top-level
+    function.
+    """
+    row = parse_player_page(html)
+    row['slug'] = player_slug(url)
+    return row
 
-        try:
-            ts_pct = float(
-                player_page_soup.findAll(
-                'table', attrs={'id':'advanced'})[0].find('tfoot').find(
-                attrs={'data-stat':'ts_pct'}).text)
-        except:
-            ts_pct = None
 
-        try:
-            img = player_page_soup.find(
-                'img', attrs={'itemscope':'image'})
-            file_name = img['src'].split('/')[-1]
-        except:
-            file_name = None
-
-        pos_set = set()
-        position_list = player_page_soup.findAll(
-            'table', attrs={'id':'per_game'})[0].find(
-            'tbody').findAll(attrs={'data-stat':'pos'})
-        for pos in position_list:
-            if pos is not None:
-                pos_set.add(pos.text)
-
-        positions = ', '.join(pos_set)
-
-        player = Player(
-            player_name=player_name, player_image=file_name,
-            position=positions, first_nba_season=debut,
-            field_goal_made=fg_made, field_goal_attempted=fg_attempt,
-            field_goal_pct=fg_pct, three_pt_made=three_made,
-            three_pt_attempted=three_attempt, three_pt_pct=three_pct,
-            free_throw_made=ft_made, free_throw_attempted=ft_attempt,
-            free_throw_pct=ft_pct, true_stg_pct=ts_pct, points=tot_pts,
-            off_reb=o_reb, def_reb=d_reb, tot_reb=tot_reb, assists=ass,
-            steals=stls, blocks=blks, turnovers=tov)
-        return player
-    except Exception as e:
-        # If page failed to load, return URL in order to add back to URL queue
-        # and reattempt to load page
-        return e, data
+def timed_parse_page(url, html):
+    """
+    Run parse_page in a parser process and return (row, seconds taken), so
+    parse time excludes time spent waiting in the process pool.
+    """
+    start = monotonic()
+    row = parse_page(url, html)
+    return row, monotonic() - start
 
 
 def selenium_queue_listener(
-        selenium_workers, data_queue, worker_queue, db, app):
+        fetch_pool, data_queue, html_queue, row_queue, retry_queue, app,
+        refresh=False):
     """
-    Run selenium threads until you have added all NBA players to database.
+    Fetch stage of populate_database. Run selenium threads until 'STOP' is
+    received, fetching each URL through fetch_pool (app.fetch.FetchPool)
+    and putting the (url, page source) pair on html_queue for the parse
+    stage. Fetch failures are reported on row_queue to the writer stage
+    (app.writer), which records the crawl checkpoint, and handed to
+    retry_queue (app.retry.RetryQueue), which completes their data_queue
+    task. With 'refresh', pages that did not change since they were last
+    fetched are not parsed: (url, None) goes straight to the writer.
     """
     with app.app_context():
         while True:
@@ -222,19 +335,59 @@ def selenium_queue_listener(
             # Line below for testing purposes
             #    else: print(f"Got the item {current_data} on the data queue")
 
-            # Get a webdriver instance from queue using associated worker_id.
-            # Use worker to visit URL and create Player object using
-            # selenium_task. Return worker to queue when finished.
-            worker_id = worker_queue.get()
-            worker = selenium_workers[worker_id]
-            player = selenium_task(worker, current_data)
-            worker_queue.put(worker_id)
-
-            # If Player returned from selenium_task, add player to session.
-            # Otherwise, add URL back to queue since the page failed to load.
-            if type(player) is Player:
-                db.session.add(player)
-            else:
-                data_queue.put(current_data)
-        db.session.commit()
+            # Visit URL with a webdriver instance from the pool and hand the
+            # page to the parsers; blocks while html_queue is full.
+            # Otherwise, report the failure to the writer and schedule the
+            # URL for a retry since the page failed to load.
+            try:
+                html = fetch_pool.fetch(current_data, if_changed=refresh)
+            except Exception as e:
+                row_queue.put((current_data, e))
+                retry_queue.retry(current_data, e)
+                continue
+            if html is None:
+                row_queue.put((current_data, None))
+                data_queue.task_done()
+                continue
+            html_queue.put((current_data, html))
     return
+
+
+def parse_queue_listener(
+        html_queue, executor, max_in_flight, data_queue, row_queue,
+        retry_queue, metrics):
+    """
+    Parse stage of populate_database. Submit pages from html_queue to the
+    process pool (executor) until 'STOP' is received, with at most
+    max_in_flight pages submitted at once. Parsed rows and parse failures
+    go to row_queue; failures are also handed to retry_queue. Parse times
+    are recorded in metrics.
+    """
+    in_flight = BoundedSemaphore(max_in_flight)
+
+    def parsed(url, future):
+        """Route a finished parse to the writer and complete its task."""
+        in_flight.release()
+        try:
+            row, seconds = future.result()
+            metrics.add_time('parse', seconds)
+            row_queue.put((url, row))
+            data_queue.task_done()
+        except Exception as e:
+            row_queue.put((url, e))
+            retry_queue.retry(url, e)
+
+    while True:
+        item = html_queue.get()
+        if item == 'STOP':
+            break
+        url, html = item
+        in_flight.acquire()
+        try:
+            future = executor.submit(timed_parse_page, url, html)
+        except Exception as e:
+            in_flight.release()
+            row_queue.put((url, e))
+            retry_queue.retry(url, e)
+            continue
+        future.add_done_callback(partial(parsed, url))
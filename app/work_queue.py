@@ -0,0 +1,228 @@
+import os
+import socket
+from threading import Event, Thread
+from time import sleep, time
+from app.retry import backoff_delay
+
+
+class RedisWorkQueue(object):
+    """
+    Crawl work queue shared through Redis by populate workers on any number
+    of hosts. All keys start with 'crawl:<name>:'.
+
+    - queue: sorted set of the URLs not finished yet, scored by the time
+      they may next be leased.
+    - lease:<url>: held by the worker crawling url, with an expiry of
+      lease_seconds. A URL whose worker died is leased again once it
+      expires.
+    - done: set of the URLs written. complete() is idempotent, so a URL
+      crawled twice (e.g. after a slow worker's lease expired) is simply
+      upserted twice.
+    - attempts, dead: hashes of failed attempts per URL and of the URLs
+      given up on, with their last error.
+    - seeding: set while player URLs are being discovered, renewed by the
+      seeding worker until it is done.
+
+    'redis' is a client created with decode_responses=True.
+    """
+    def __init__(self, redis, name='crawl', lease_seconds=300, window=256):
+        self.redis = redis
+        self.prefix = f'crawl:{name}:'
+        self.lease_seconds = lease_seconds
+        self.window = window
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._seeding = None
+
+    def key(self, name):
+        """Return the Redis key of 'name' for this crawl."""
+        return self.prefix + name
+
+    def reset(self):
+        """
+        Forget the crawl: queued, leased, done and given up URLs. A URL is
+        only leased while it is queued, so the leases to release are those
+        of the queued URLs.
+        """
+        queued = self.redis.zrangebyscore(self.key('queue'), '-inf', '+inf')
+        self.redis.delete(*[self.key(name) for name in (
+            'queue', 'done', 'attempts', 'dead', 'seeding')],
+            *[self.key('lease:' + url) for url in queued])
+
+    def add(self, urls):
+        """
+        Queue the URLs not queued or done yet and return them. Several
+        workers may add the same URLs; each is only queued once.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return []
+        pipe = self.redis.pipeline()
+        for url in urls:
+            pipe.sismember(self.key('done'), url)
+        done = pipe.execute()
+        now = time()
+        pipe = self.redis.pipeline()
+        for url, is_done in zip(urls, done):
+            if not is_done:
+                pipe.zadd(self.key('queue'), {url: now}, nx=True)
+        added = iter(pipe.execute())
+        return [url for url, is_done in zip(urls, done)
+                if not is_done and next(added)]
+
+    def lease(self):
+        """
+        Lease the next available URL for lease_seconds and return it, or
+        None if every queued URL is leased or waiting for a retry.
+        """
+        now = time()
+        for url in self.redis.zrangebyscore(
+                self.key('queue'), '-inf', now, start=0, num=self.window):
+            if self.redis.set(self.key('lease:' + url), self.worker_id,
+                              nx=True, px=int(self.lease_seconds * 1000)):
+                # Move it out of the available URLs until the lease expires
+                self.redis.zadd(self.key('queue'),
+                                {url: now + self.lease_seconds}, xx=True)
+                return url
+        return None
+
+    def complete(self, urls):
+        """Mark URLs as written and release their leases."""
+        pipe = self.redis.pipeline()
+        for url in urls:
+            pipe.zrem(self.key('queue'), url)
+            pipe.sadd(self.key('done'), url)
+            pipe.delete(self.key('lease:' + url))
+        pipe.execute()
+
+    def fail(self, url, error, max_attempts, base_delay, max_delay):
+        """
+        Count a failed attempt of url and release its lease. It becomes
+        available again after a backoff delay, or is given up on once it
+        failed max_attempts times. Returns True if it will be retried.
+        """
+        attempt = self.redis.hincrby(self.key('attempts'), url, 1)
+        pipe = self.redis.pipeline()
+        if attempt >= max_attempts:
+            pipe.zrem(self.key('queue'), url)
+            pipe.hset(self.key('dead'), url, repr(error)[:200])
+        else:
+            pipe.zadd(self.key('queue'), {url: time() + backoff_delay(
+                attempt, base_delay, max_delay)}, xx=True)
+        pipe.delete(self.key('lease:' + url))
+        pipe.execute()
+        return attempt < max_attempts
+
+    def remaining(self):
+        """Return the number of URLs not written or given up on yet."""
+        return self.redis.zcard(self.key('queue'))
+
+    def dead_letters(self):
+        """Return the URLs given up on as (url, attempts, last error)."""
+        dead = self.redis.hgetall(self.key('dead'))
+        attempts = self.redis.hgetall(self.key('attempts'))
+        return [(url, int(attempts.get(url, 0)), error)
+                for url, error in sorted(dead.items())]
+
+    def start_seeding(self):
+        """
+        Flag that player URLs are being discovered (see seeding()) until
+        stop_seeding(). A background thread renews the flag every third of
+        lease_seconds, however long discovery takes.
+        """
+        self._set_seeding()
+        stopped = Event()
+        thread = Thread(target=self._renew_seeding, args=(stopped,))
+        thread.daemon = True
+        thread.start()
+        self._seeding = (stopped, thread)
+
+    def _set_seeding(self):
+        self.redis.set(self.key('seeding'), self.worker_id,
+                       px=int(self.lease_seconds * 1000))
+
+    def _renew_seeding(self, stopped):
+        while not stopped.wait(self.lease_seconds / 3):
+            self._set_seeding()
+
+    def stop_seeding(self):
+        """Stop renewing and clear the flag set by start_seeding()."""
+        if self._seeding is not None:
+            stopped, thread = self._seeding
+            stopped.set()
+            # A renewal in progress must not set the flag again
+            thread.join()
+            self._seeding = None
+        self.redis.delete(self.key('seeding'))
+
+    def seeding(self):
+        """
+        Return True while a worker is discovering player URLs. The flag
+        expires after lease_seconds if that worker died, as it is no longer
+        renewed.
+        """
+        return bool(self.redis.exists(self.key('seeding')))
+
+
+class LeasedQueue(object):
+    """
+    Stand-in for populate_database's work queue (queue.Queue) backed by a
+    RedisWorkQueue. get() leases the next URL, waiting 'poll' seconds
+    between attempts. join() returns once no URL is left on any host. URLs
+    are completed by the writer once written, so task_done() does nothing.
+    """
+    def __init__(self, work_queue, poll=0.5):
+        self.work_queue = work_queue
+        self.poll = poll
+        self._stopped = False
+
+    def put(self, item):
+        """Queue a URL, or stop the fetch threads for 'STOP'."""
+        if item == 'STOP':
+            self._stopped = True
+        else:
+            self.work_queue.add([item])
+
+    def get(self):
+        """Return a leased URL, or 'STOP' once stopped."""
+        while not self._stopped:
+            url = self.work_queue.lease()
+            if url is not None:
+                return url
+            sleep(self.poll)
+        return 'STOP'
+
+    def task_done(self):
+        pass
+
+    def join(self):
+        """Wait until every URL of the crawl is written or given up on."""
+        while self.work_queue.seeding() or self.work_queue.remaining():
+            sleep(self.poll)
+
+
+class LeasedRetryQueue(object):
+    """
+    Stand-in for app.retry.RetryQueue backed by a RedisWorkQueue: failed
+    URLs are delayed and given up on in Redis, so any worker may retry
+    them. Failures, retries and dead letters are counted in metrics.
+    """
+    def __init__(self, work_queue, max_attempts, base_delay, max_delay,
+                 metrics):
+        self.work_queue = work_queue
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.dead_letters = []
+
+    def retry(self, url, error):
+        """Count a failed attempt of url; returns True if it is retried."""
+        self.metrics.incr('failures')
+        retried = self.work_queue.fail(
+            url, error, self.max_attempts, self.base_delay, self.max_delay)
+        self.metrics.incr('retries' if retried else 'dead_letters')
+        return retried
+
+    def close(self):
+        """Collect the URLs given up on by every worker."""
+        self.dead_letters.extend(self.work_queue.dead_letters())
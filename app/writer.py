@@ -0,0 +1,256 @@
+import math
+from queue import Empty
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from app.models import Player, PlayerSeason
+from app.checkpoint import record_progress
+from app.metrics import CrawlMetrics
+from app.snapshots import invalidate_snapshots
+
+
+def upsert_players(db, rows):
+    """
+    Insert or update a batch of parsed player rows (dicts of Player column
+    values) keyed on their slug, using core bulk statements rather than the
+    ORM unit of work.
+
+    PostgreSQL uses a single INSERT ... ON CONFLICT (slug) DO UPDATE. Other
+    databases look up existing slugs first and bulk insert/update the rest.
+    """
+    # Keep only the last row seen for a slug within the batch
+    rows = list({row['slug']: row for row in rows}.values())
+    table = Player.__table__
+    if db.engine.dialect.name == 'postgresql':
+        stmt = postgresql.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.slug],
+            set_={name: stmt.excluded[name] for name in rows[0]
+                  if name not in ('id', 'slug')})
+        db.session.execute(stmt, rows)
+        return
+
+    existing = dict(db.session.query(Player.slug, Player.id).filter(
+        Player.slug.in_([row['slug'] for row in rows])))
+    db.session.bulk_update_mappings(Player, [
+        dict(row, id=existing[row['slug']])
+        for row in rows if row['slug'] in existing])
+    # render_nulls keeps rows with missing stats in one executemany
+    db.session.bulk_insert_mappings(Player, [
+        row for row in rows if row['slug'] not in existing],
+        render_nulls=True)
+
+
+def same_value(old, new):
+    """
+    Compare a stored column value with a parsed one. Floats are compared
+    with a relative tolerance since most stat columns are stored in single
+    precision.
+    """
+    if isinstance(old, float) and isinstance(new, float):
+        return math.isclose(old, new, rel_tol=1e-6)
+    return old == new
+
+
+def player_columns(row):
+    """Return a parsed player row without its season rows."""
+    return {column: value for column, value in row.items()
+            if column != 'seasons'}
+
+
+def season_key(row):
+    """Return the (season, team) a season row is stored under."""
+    return row['season'], row['team']
+
+
+def changed_rows(db, rows, season=None):
+    """
+    Return the parsed player rows that would change the players table: new
+    players, players with at least one column value different from the
+    stored one, players with a different number of stored seasons, and
+    players whose stored season rows, from 'season' on if given, differ
+    from the parsed ones (e.g. a current season with one more game).
+    """
+    rows = list({row['slug']: row for row in rows}.values())
+    table = Player.__table__
+    slugs = [row['slug'] for row in rows]
+    stored = {player['slug']: player for player in db.session.execute(
+        select([table]).where(table.c.slug.in_(slugs)))}
+    seasons = dict(db.session.query(Player.slug, func.count(PlayerSeason.id))
+                   .join(PlayerSeason).filter(Player.slug.in_(slugs))
+                   .group_by(Player.slug))
+    season_table = PlayerSeason.__table__
+    query = select([table.c.slug, season_table]).select_from(
+        season_table.join(table)).where(table.c.slug.in_(slugs))
+    if season is not None:
+        query = query.where(season_table.c.season >= season)
+    stored_seasons = {}
+    for stored_season in db.session.execute(query):
+        stored_seasons.setdefault(stored_season['slug'], {})[
+            season_key(stored_season)] = stored_season
+
+    def seasons_changed(row):
+        """Whether the stored season rows differ from the parsed ones."""
+        if seasons.get(row['slug'], 0) != len(row['seasons']):
+            return True
+        old = stored_seasons.get(row['slug'], {})
+        new = [parsed for parsed in row['seasons']
+               if season is None or parsed['season'] >= season]
+        return len(new) != len(old) or not all(
+            season_key(parsed) in old and all(
+                same_value(old[season_key(parsed)][column], value)
+                for column, value in parsed.items())
+            for parsed in new)
+
+    return [row for row in rows if row['slug'] not in stored or not all(
+        same_value(stored[row['slug']][column], value)
+        for column, value in player_columns(row).items()) or (
+        'seasons' in row and seasons_changed(row))]
+
+
+def write_seasons(db, rows, season=None):
+    """
+    Store the season rows parsed with each player row (its 'seasons'),
+    replacing the player's stored seasons.
+
+    With 'season', players who already have seasons stored from before it
+    only get their seasons from 'season' on replaced, so an in-season
+    refresh rewrites a row or two per player instead of all. Their career
+    columns are the career line parsed from the page's footer, written with
+    the player row: those are exact, while recomputing them from stored
+    per game averages, rounded to one decimal, is not.
+    """
+    rows = [row for row in rows if 'seasons' in row]
+    if not rows:
+        return
+    ids = dict(db.session.query(Player.slug, Player.id).filter(
+        Player.slug.in_([row['slug'] for row in rows])))
+    partial = set()
+    if season is not None:
+        partial = {player_id for player_id, in db.session.query(
+            PlayerSeason.player_id).filter(
+            PlayerSeason.player_id.in_(list(ids.values())),
+            PlayerSeason.season < season).distinct()}
+    full = [player_id for player_id in ids.values()
+            if player_id not in partial]
+
+    if full:
+        db.session.query(PlayerSeason).filter(
+            PlayerSeason.player_id.in_(full)).delete(
+            synchronize_session=False)
+    if partial:
+        db.session.query(PlayerSeason).filter(
+            PlayerSeason.player_id.in_(list(partial)),
+            PlayerSeason.season >= season).delete(
+            synchronize_session=False)
+    # Core executemany insert: thousands of rows per batch on a full crawl
+    inserted = [dict(row, player_id=ids[player['slug']])
+                for player in rows for row in player['seasons']
+                if ids[player['slug']] not in partial or
+                row['season'] >= season]
+    if inserted:
+        db.session.execute(PlayerSeason.__table__.insert(), inserted)
+
+
+def write_batch(db, results, metrics, checkpoint=True, season=None,
+                work_queue=None):
+    """
+    Write one batch of (url, result) pairs in a single transaction: upsert
+    the parsed rows that changed something, record the crawl checkpoint
+    for every URL (unless 'checkpoint' is False), then refresh the search
+    index for the written players. 'result' is either a parsed row, None
+    for a page that did not change since the last crawl, or the exception
+    raised while fetching/parsing the URL. Write and index times and the
+    pages written and unchanged are recorded in metrics. Season rows are
+    written by write_seasons, with 'season'. In a distributed crawl, the
+    URLs are completed in 'work_queue' (app.work_queue.RedisWorkQueue) once
+    the batch is committed. Snapshots of the players table (see
+    app.snapshots) are invalidated once players are written.
+    """
+    rows = [result for _, result in results if isinstance(result, dict)]
+    with metrics.timer('write'):
+        rows_changed = changed_rows(db, rows, season) if rows else []
+        if rows_changed:
+            upsert_players(db, [player_columns(row) for row in rows_changed])
+            write_seasons(db, rows_changed, season)
+        if checkpoint:
+            record_progress(
+                db, [url for url, result in results
+                     if not isinstance(result, Exception)],
+                [(url, result) for url, result in results
+                 if isinstance(result, Exception)])
+        db.session.commit()
+    if rows_changed:
+        # Bulk upserts bypass the session events that keep snapshots of the
+        # players table current
+        invalidate_snapshots()
+    if work_queue is not None:
+        work_queue.complete([url for url, result in results
+                             if not isinstance(result, Exception)])
+    not_modified = sum(1 for _, result in results if result is None)
+    metrics.incr('pages_written', len(rows_changed))
+    metrics.incr('pages_unchanged',
+                 not_modified + len(rows) - len(rows_changed))
+    if rows_changed:
+        with metrics.timer('index'):
+            Player.bulk_reindex(
+                Player.slug.in_([row['slug'] for row in rows_changed]))
+
+
+def fail_batch(work_queue, results, error, config, metrics):
+    """
+    Count a failed attempt, in 'work_queue', of the URLs of a batch of
+    (url, result) pairs that could not be written, so they are retried and
+    given up on after CRAWL_MAX_ATTEMPTS instead of being leased forever.
+    URLs whose result is an exception were already failed when it was
+    raised. Failures, retries and dead letters are counted in metrics.
+    """
+    for url, result in results:
+        if isinstance(result, Exception):
+            continue
+        metrics.incr('failures')
+        retried = work_queue.fail(
+            url, error, config['CRAWL_MAX_ATTEMPTS'],
+            config['CRAWL_RETRY_DELAY'], config['CRAWL_MAX_RETRY_DELAY'])
+        metrics.incr('retries' if retried else 'dead_letters')
+
+
+def player_writer(row_queue, db, app, batch_size, errors, metrics=None,
+                  checkpoint=True, season=None, work_queue=None,
+                  flush_after=None):
+    """
+    Writer stage of populate_database. Take (url, result) pairs off
+    row_queue and write them in batches of batch_size until 'STOP' is
+    received, then write whatever is left. A batch that fails to write is
+    rolled back and its exception appended to 'errors'; with 'work_queue',
+    its URLs are also failed there (see fail_batch). Write times and
+    counts are recorded in 'metrics' (app.metrics.CrawlMetrics), a new one
+    if not given. 'checkpoint', 'season' and 'work_queue' are passed on to
+    write_batch. If 'flush_after' is given, a partial batch is also written
+    once no pair arrived for that many seconds.
+    """
+    if metrics is None:
+        metrics = CrawlMetrics()
+    with app.app_context():
+        batch = []
+        while True:
+            try:
+                item = row_queue.get(timeout=flush_after)
+            except Empty:
+                item = None
+            if item not in ('STOP', None):
+                batch.append(item)
+            if batch and (item in ('STOP', None) or
+                          len(batch) >= batch_size):
+                try:
+                    write_batch(db, batch, metrics, checkpoint, season,
+                                work_queue)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+                    if work_queue is not None:
+                        fail_batch(work_queue, batch, e, app.config,
+                                   metrics)
+                batch = []
+            if item == 'STOP':
+                break
+        db.session.remove()
@@ -0,0 +1,230 @@
+"""
+Micro-benchmark of player page stat extraction.
+
+Compares the original selenium_task extraction (html.parser over the whole
+page, one find() per stat) with app.util.parse_player_page (lxml, reading
+only the tables we need in one pass over each footer row) on the saved player
+pages in test/fixtures/site, and checks both produce the same row.
+
+Run from the repository root:
+    python -m benchmarks.bench_extract [rounds]
+"""
+import glob
+import os
+import sys
+import timeit
+from bs4 import BeautifulSoup
+from app.fetch import uncomment_tables
+from app.util import parse_player_page
+
+
+PAGES = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                     'test', 'fixtures', 'site', 'players', '*', '*.html')
+
+
+def legacy_extract(page_source):
+    """
+    Extraction as done by the former selenium_task: html.parser over the
+    whole page and one find() per stat. Returns a dict of Player columns.
+    """
+    player_page_soup = BeautifulSoup(page_source, 'html.parser')
+    player_name = player_page_soup.find(
+        'h1', attrs={'itemprop':'name'}).text
+    try:
+        debut = float(
+            player_page_soup.find(
+            string="NBA Debut: ").find_parent('p').text[-5:][:4])
+    except:
+        debut = None
+
+    try:
+        career_stats = player_page_soup.findAll(
+            'table', attrs={'id':'per_game'})[0].find('tfoot')
+    except:
+        career_stats = None
+
+    try:
+        fg_made = float(
+            career_stats.find(attrs={'data-stat':'fg_per_g'}).text)
+    except:
+        fg_made = None
+
+    try:
+        fg_attempt = float(
+            career_stats.find(attrs={'data-stat':'fga_per_g'}).text)
+    except:
+        fg_attempt = None
+
+    try:
+        fg_pct = float(
+            career_stats.find(attrs={'data-stat':'fg_pct'}).text)
+    except:
+        fg_pct = None
+
+    try:
+        three_made = float(
+            career_stats.find(attrs={'data-stat':'fg3_per_g'}).text)
+    except:
+        three_made = None
+
+    try:
+        three_attempt = float(
+            career_stats.find(attrs={'data-stat':'fg3a_per_g'}).text)
+    except:
+        three_attempt = None
+
+    try:
+        three_pct = float(
+            career_stats.find(attrs={'data-stat':'fg3_pct'}).text)
+    except:
+        three_pct = None
+
+    try:
+        ft_made = float(
+            career_stats.find(attrs={'data-stat':'ft_per_g'}).text)
+    except:
+        ft_made = None
+
+    try:
+        ft_attempt = float(
+            career_stats.find(attrs={'data-stat':'fta_per_g'}).text)
+    except:
+        ft_attempt = None
+
+    try:
+        ft_pct = float(
+            career_stats.find(attrs={'data-stat':'ft_pct'}).text)
+    except:
+        ft_pct = None
+
+    try:
+        tot_pts = float(
+            career_stats.find(attrs={'data-stat':'pts_per_g'}).text)
+    except:
+        tot_pts = None
+
+    try:
+        o_reb = float(
+            career_stats.find(attrs={'data-stat':'orb_per_g'}).text)
+    except:
+        o_reb = None
+
+    try:
+        d_reb = float(
+            career_stats.find(attrs={'data-stat':'drb_per_g'}).text)
+    except:
+        d_reb = None
+
+    try:
+        tot_reb = float(
+            career_stats.find(attrs={'data-stat':'trb_per_g'}).text)
+    except:
+        tot_reb = None
+
+    try:
+        ass = float(
+            career_stats.find(attrs={'data-stat':'ast_per_g'}).text)
+    except:
+        ass = None
+
+    try:
+        stls = float(
+            career_stats.find(attrs={'data-stat':'stl_per_g'}).text)
+    except:
+        stls = None
+
+    try:
+        blks = float(
+            career_stats.find(attrs={'data-stat':'blk_per_g'}).text)
+    except:
+        blks = None
+
+    try:
+        tov = float(
+            career_stats.find(attrs={'data-stat':'tov_per_g'}).text)
+    except:
+        tov = None
+
+    try:
+        ts_pct = float(
+            player_page_soup.findAll(
+            'table', attrs={'id':'advanced'})[0].find('tfoot').find(
+            attrs={'data-stat':'ts_pct'}).text)
+    except:
+        ts_pct = None
+
+    try:
+        img = player_page_soup.find(
+            'img', attrs={'itemscope':'image'})
+        file_name = img['src'].split('/')[-1]
+    except:
+        file_name = None
+
+    pos_set = set()
+    position_list = player_page_soup.findAll(
+        'table', attrs={'id':'per_game'})[0].find(
+        'tbody').findAll(attrs={'data-stat':'pos'})
+    for pos in position_list:
+        if pos is not None:
+            pos_set.add(pos.text)
+
+    positions = ', '.join(pos_set)
+
+    return dict(
+        player_name=player_name, player_image=file_name,
+        position=positions, first_nba_season=debut,
+        field_goal_made=fg_made, field_goal_attempted=fg_attempt,
+        field_goal_pct=fg_pct, three_pt_made=three_made,
+        three_pt_attempted=three_attempt, three_pt_pct=three_pct,
+        free_throw_made=ft_made, free_throw_attempted=ft_attempt,
+        free_throw_pct=ft_pct, true_stg_pct=ts_pct, points=tot_pts,
+        off_reb=o_reb, def_reb=d_reb, tot_reb=tot_reb, assists=ass,
+        steals=stls, blocks=blks, turnovers=tov)
+
+
+def same_row(old, new):
+    """
+    Compare rows column by column. Positions are compared as sets since the
+    original extraction joined them in set iteration order.
+    """
+    for column, value in old.items():
+        if column == 'position':
+            if set(value.split(', ')) != set(new[column].split(', ')):
+                return False
+        elif value != new[column]:
+            return False
+    return True
+
+
+def load_pages():
+    """Return the saved player pages as a browser would render them."""
+    pages = []
+    for path in sorted(glob.glob(PAGES)):
+        if os.path.basename(path) == 'index.html':
+            continue
+        with open(path) as f:
+            pages.append((path, uncomment_tables(f.read())))
+    return pages
+
+
+def main(rounds=5):
+    pages = load_pages()
+    for path, html in pages:
+        if not same_row(legacy_extract(html), parse_player_page(html)):
+            print(f'MISMATCH {path}')
+            return 1
+
+    html = [page for _, page in pages]
+    old = min(timeit.repeat(
+        lambda: [legacy_extract(h) for h in html], number=1, repeat=rounds))
+    new = min(timeit.repeat(
+        lambda: [parse_player_page(h) for h in html], number=1, repeat=rounds))
+    print(f'{len(html)} pages, outputs equal')
+    print(f'original : {old / len(html) * 1000:8.2f} ms/page')
+    print(f'new      : {new / len(html) * 1000:8.2f} ms/page')
+    print(f'speedup  : {old / new:8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,248 @@
+"""
+End to end benchmark of the crawl, without touching basketball-reference.
+
+Builds a corpus from the recorded index and player pages in
+test/fixtures/site (each player page is served under 'copies' different
+player URLs, so the crawl has enough pages to measure), serves it from a
+local HTTP stand-in and runs populate_database with the http engine against
+a throwaway SQLite database. Reports pages/sec, parse ms/page, rows/sec
+written and peak RSS, and compares them with the stored baseline
+(benchmarks/baseline.json). Exits with status 1 if a number is more than
+'tolerance' worse than the baseline.
+
+The baseline is only meaningful on the machine it was recorded on; record a
+new one with --save-baseline before comparing branches.
+
+Run from the repository root:
+    python -m benchmarks.bench_ingest [--copies N] [--rounds N]
+                                      [--workers N] [--tolerance F]
+                                      [--save-baseline]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+from threading import Event, Thread
+from config import Config
+from test.support.stand_in_server import FIXTURE_SITE, serve_site
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Player rows of a letter index page
+PLAYER_ROW = re.compile(r'<tr ><th scope="row".*?</tr>', re.DOTALL)
+
+# Reported numbers and whether higher is better
+RESULTS = {
+    'pages_per_second': True,
+    'parse_ms_per_page': False,
+    'rows_per_second': True,
+    'peak_rss_mb': False,
+    'peak_parser_rss_mb': False,
+}
+
+
+def build_corpus(directory, copies):
+    """
+    Copy the fixture site to 'directory', serving every player page under
+    'copies' player URLs (the original and e.g. 'jamesle01x1.html'), and
+    list them all on the letter index pages. Returns the number of player
+    pages in the corpus.
+    """
+    shutil.copytree(FIXTURE_SITE, directory)
+    players = os.path.join(directory, 'players')
+    pages = 0
+    for letter in sorted(os.listdir(players)):
+        index = os.path.join(players, letter, 'index.html')
+        with open(index) as f:
+            html = f.read()
+        for name in os.listdir(os.path.dirname(index)):
+            if name == 'index.html':
+                continue
+            slug = name[:-len('.html')]
+            for copy in range(1, copies):
+                shutil.copyfile(
+                    os.path.join(players, letter, name),
+                    os.path.join(players, letter, f'{slug}x{copy}.html'))
+        rows = PLAYER_ROW.findall(html)
+        pages += len(rows) * copies
+
+        def copy_rows(match):
+            row = match.group(0)
+            return row + ''.join(
+                row.replace('.html"', f'x{copy}.html"')
+                for copy in range(1, copies))
+        with open(index, 'w') as f:
+            f.write(PLAYER_ROW.sub(copy_rows, html))
+    return pages
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def sample_parser_rss(peaks, finished, interval=0.2):
+    """
+    Record the peak RSS in MB of each parser process in 'peaks' (keyed by
+    pid) until 'finished' is set. RUSAGE_CHILDREN cannot be used: it counts
+    the memory of this process in each child forked to start a parser. Only
+    works where /proc is available (Linux).
+    """
+    while not finished.wait(interval):
+        for child in multiprocessing.active_children():
+            try:
+                with open(f'/proc/{child.pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            peaks[child.pid] = int(line.split()[1]) / 2 ** 10
+            except OSError:
+                pass
+
+
+def run_crawl(site_url, workdir, workers):
+    """
+    Run populate_database over the corpus served at site_url into a new
+    SQLite database in workdir. Returns the run's CrawlMetrics summary.
+    """
+    from app import create_app, db
+    from app.metrics import CrawlMetrics
+    from app.models import Player
+    from app.populate_players import populate_database
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(
+            workdir, 'bench.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        ELASTICSEARCH_URL = None
+        CACHE = {'CACHE_TYPE': 'simple'}
+        BBALL_REF_URL = site_url
+        PAGE_CACHE_DIR = os.path.join(workdir, 'page_cache')
+        CRAWL_RETRY_DELAY = 0.1
+        CRAWL_MAX_RETRY_DELAY = 1
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        metrics = CrawlMetrics()
+        parser_peaks = {}
+        finished = Event()
+        sampler = Thread(target=sample_parser_rss,
+                         args=(parser_peaks, finished))
+        sampler.daemon = True
+        sampler.start()
+        try:
+            dead_letters = populate_database(
+                db, engine='http', workers=workers, metrics=metrics)
+        finally:
+            finished.set()
+            sampler.join()
+        if dead_letters:
+            raise RuntimeError(f'{len(dead_letters)} pages failed')
+        written = Player.query.count()
+        db.session.remove()
+        db.engine.dispose()
+    summary = metrics.summary()
+    summary['players'] = written
+    summary['parser_rss_mb'] = max(parser_peaks.values(), default=None)
+    return summary
+
+
+def measure(summary):
+    """Return the benchmark numbers (see RESULTS) of one crawl summary."""
+    write = summary['stages']['write']
+    written = summary['counters'].get('pages_written', 0)
+    return {
+        'pages_per_second': summary['pages_per_second'],
+        'parse_ms_per_page': summary['stages']['parse']['mean_ms'],
+        'rows_per_second': round(written / write['total_seconds'], 1)
+            if write['total_seconds'] else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_parser_rss_mb': round(summary['parser_rss_mb'], 1)
+            if summary['parser_rss_mb'] else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the names of the results more than 'tolerance' (a fraction)
+    worse than the baseline.
+    """
+    regressions = []
+    for name, higher_is_better in RESULTS.items():
+        value, expected = results.get(name), baseline.get(name)
+        if value is None or not expected:
+            continue
+        if higher_is_better:
+            worse = value < expected * (1 - tolerance)
+        else:
+            worse = value > expected * (1 + tolerance)
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the crawl against recorded pages.')
+    parser.add_argument('--copies', type=int, default=40,
+                        help='player URLs per recorded player page')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='crawls to run; the median is reported')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent fetches')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fraction worse than the baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f'store the results in {BASELINE}')
+    args = parser.parse_args(argv)
+
+    rounds = []
+    with tempfile.TemporaryDirectory() as workdir:
+        site = os.path.join(workdir, 'site')
+        pages = build_corpus(site, args.copies)
+        with serve_site(site) as site_url:
+            for _ in range(args.rounds):
+                summary = run_crawl(site_url, workdir, args.workers)
+                if summary['players'] != pages:
+                    print(f"Wrote {summary['players']} of {pages} players")
+                    return 1
+                rounds.append(measure(summary))
+
+    results = {name: statistics.median(r[name] for r in rounds)
+               if None not in (r[name] for r in rounds) else None
+               for name in RESULTS}
+    results['pages'] = pages
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    print(f'{pages} pages, {args.rounds} rounds, {args.workers} workers')
+    for name in RESULTS:
+        expected = baseline.get(name)
+        print(f'{name:20}: {results[name]:10}  (baseline {expected})')
+
+    if args.save_baseline:
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline to {BASELINE}')
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for name in regressions:
+        print(f'REGRESSION {name}: {results[name]} vs {baseline[name]}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of player collection serialization.
+
+Compares the original /api/players/ page serialization (Player objects
+hydrated by the ORM, Player.to_dict() and url_for per item, jsonify) with
+app.api.serializers (column tuples, link templates, a plain count(id) for
+the total, orjson) on 50-item pages of a throwaway SQLite database, and
+checks both produce the same pages.
+
+Run from the repository root:
+    python -m benchmarks.bench_serialize [rounds] [players]
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+from flask import jsonify
+from config import Config
+
+
+PER_PAGE = 50
+
+
+def fill_players(db, players):
+    """Insert 'players' players with every column set."""
+    from app.api.serializers import PLAYER_COLUMNS
+    from app.models import Player
+    db.session.bulk_insert_mappings(Player, [dict(
+        {column: i % 50 + 0.5 for column in PLAYER_COLUMNS},
+        id=i, player_name=f'Player {i}', player_image=f'player{i}.jpg',
+        position='Guard', first_nba_season=1990, last_nba_season=2000,
+        headshot=f'{i:064x}.jpg')
+        for i in range(1, players + 1)])
+    db.session.commit()
+
+
+def original_page(page):
+    """Serialize one page as /api/players/ originally did."""
+    from app.models import Player
+    return jsonify(Player.to_collection_dict(
+        Player.query, page, PER_PAGE, 'api.get_all_players'))
+
+
+def fast_page(page):
+    """Serialize one page with the compiled player serializer."""
+    from app.api.serializers import (
+        count_players, json_response, player_rows, serialize_players)
+    from app.models import Player
+    return json_response(Player.to_collection_dict(
+        player_rows(Player.query), page, PER_PAGE, 'api.get_all_players',
+        serialize=serialize_players, total=count_players(Player.query)))
+
+
+def main(rounds=5, players=2000):
+    from app import create_app, db
+
+    with tempfile.TemporaryDirectory() as workdir:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(
+                workdir, 'bench.db')
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+            ELASTICSEARCH_URL = None
+            CACHE = {'CACHE_TYPE': 'simple'}
+
+        app = create_app(BenchmarkConfig)
+        with app.test_request_context():
+            db.create_all()
+            fill_players(db, players)
+            pages = range(1, players // PER_PAGE + 1)
+            for page in pages:
+                if json.loads(original_page(page).get_data()) != \
+                        json.loads(fast_page(page).get_data()):
+                    print(f'MISMATCH page {page}')
+                    return 1
+
+            old = min(timeit.repeat(
+                lambda: [original_page(page) for page in pages],
+                number=1, repeat=rounds))
+            new = min(timeit.repeat(
+                lambda: [fast_page(page) for page in pages],
+                number=1, repeat=rounds))
+            db.session.remove()
+            db.engine.dispose()
+
+    print(f'{len(pages)} pages of {PER_PAGE} players, outputs equal')
+    print(f'original : {old / len(pages) * 1000:8.2f} ms/page')
+    print(f'new      : {new / len(pages) * 1000:8.2f} ms/page')
+    print(f'speedup  : {old / new:8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
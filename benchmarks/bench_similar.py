@@ -0,0 +1,91 @@
+"""
+Micro-benchmark of the similar players search.
+
+Builds app.similarity.SimilarityIndex over synthetic players, whose stats
+are missing like those of real players (by era: no three pointers before
+1980, no steals, blocks, turnovers or split rebounds before 1974, plus a
+few stray gaps), and times its k-NN queries against a direct masked
+computation of the same distances over the standardised stats, checking
+both find the same players.
+
+Run from the repository root:
+    python -m benchmarks.bench_similar [queries] [k] [sizes...]
+"""
+import sys
+import time
+import timeit
+import numpy as np
+
+
+def synthetic_stats(players, seed=0):
+    """Return the ids and stats of 'players' synthetic players."""
+    from app.similarity import SIMILARITY_STATS
+    rng = np.random.default_rng(seed)
+    scale = rng.uniform(0.5, 25, len(SIMILARITY_STATS))
+    values = rng.gamma(2.0, 1.0, (players, len(SIMILARITY_STATS))) * scale
+    era = rng.random(players)
+    columns = [SIMILARITY_STATS.index(stat) for stat in (
+        'three_pt_made', 'three_pt_attempted', 'three_pt_pct')]
+    values[np.ix_(era < 0.25, columns)] = np.nan
+    columns = [SIMILARITY_STATS.index(stat) for stat in (
+        'off_reb', 'def_reb', 'steals', 'blocks', 'turnovers')]
+    values[np.ix_(era < 0.15, columns)] = np.nan
+    values[rng.random(values.shape) < 0.01] = np.nan
+    return np.arange(1, players + 1), values
+
+
+def standardise(values):
+    """Return 'values' standardised per stat, NaN where missing."""
+    return (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+
+
+def direct_neighbours(ids, z, row, k):
+    """
+    k-NN of the player in 'row' of the standardised stats 'z', computed
+    directly with the same distance as SimilarityIndex.
+    """
+    known = ~np.isnan(z)
+    shared = known & known[row]
+    stats = known[row].sum()
+    squared = np.where(shared, (z - z[row]) ** 2, 0).sum(axis=1)
+    count = shared.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distances = np.sqrt(squared * stats / count)
+    distances[(count < stats / 2) | (count == 0)] = np.inf
+    distances[row] = np.inf
+    nearest = np.argsort(distances, kind='stable')[:k]
+    return ids[nearest[np.isfinite(distances[nearest])]].tolist()
+
+
+def main(queries=20, k=10, *sizes):
+    from app.similarity import SimilarityIndex
+
+    for players in sizes or (5000, 500000):
+        ids, values = synthetic_stats(players)
+        start = time.perf_counter()
+        index = SimilarityIndex(ids, values)
+        build = time.perf_counter() - start
+        z = standardise(values)
+        sample = np.random.default_rng(1).choice(ids, queries).tolist()
+        for id in sample:
+            found = [neighbour for neighbour, _ in index.neighbours(id, k)]
+            if found != direct_neighbours(ids, z, id - 1, k):
+                print(f'MISMATCH {players} players, id {id}')
+                return 1
+
+        new = min(timeit.repeat(
+            lambda: [index.neighbours(id, k) for id in sample],
+            number=1, repeat=3)) / queries
+        old = min(timeit.repeat(
+            lambda: [direct_neighbours(ids, z, id - 1, k) for id in sample],
+            number=1, repeat=3)) / queries
+        print(f'{players} players, k={k}, neighbours equal')
+        print(f'  index build : {build * 1000:8.1f} ms')
+        print(f'  direct      : {old * 1000:8.2f} ms/query')
+        print(f'  index       : {new * 1000:8.2f} ms/query')
+        print(f'  speedup     : {old / new:8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
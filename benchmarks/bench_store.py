@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of player reads served from app.player_store.
+
+Fills a SQLite database with synthetic players, then times the
+player, letter index and cursor page endpoints with PLAYER_STORE disabled
+(queries per request) and enabled (reads from the in-process store),
+checking both return the same responses. Every request URL is unique, so
+no response is served from the cache and every request reads the
+players.
+
+Run from the repository root:
+    python -m benchmarks.bench_store [requests] [players]
+"""
+import itertools
+import os
+import random
+import string
+import sys
+import tempfile
+import timeit
+from config import Config
+
+
+def fill(db, Player, players, seed=0):
+    """Add 'players' synthetic players to the database."""
+    rng = random.Random(seed)
+    db.session.bulk_insert_mappings(Player, [{
+        'player_name': rng.choice(string.ascii_uppercase) + ''.join(
+            rng.choices(string.ascii_lowercase, k=8)),
+        'position': rng.choice(['PG', 'SG', 'SF', 'PF', 'C']),
+        'points': round(rng.uniform(0, 30), 1),
+        'assists': round(rng.uniform(0, 10), 1),
+        'field_goal_pct': None if rng.random() < 0.1 else rng.random()
+    } for _ in range(players)])
+    db.session.commit()
+
+
+def main(requests=500, players=20000):
+    from app import create_app, db
+    from app.models import Player
+    from app.player_store import player_store
+
+    with tempfile.TemporaryDirectory() as workdir:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(
+                workdir, 'bench.db')
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+            ELASTICSEARCH_URL = None
+            CACHE = {'CACHE_TYPE': 'simple'}
+            PLAYER_STORE = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            fill(db, Player, players)
+            client = app.test_client()
+            rng = random.Random(1)
+            urls = [rng.choice([
+                f'/api/players/{rng.randint(1, players)}',
+                f'/api/players/index/{rng.choice(string.ascii_lowercase)}'
+                f'?page={rng.randint(1, 20)}',
+                '/api/players/?cursor=&per_page=25'
+            ]) for _ in range(requests)]
+
+            runs = itertools.count()
+
+            def run():
+                # An argument the endpoints ignore keeps responses out of
+                # the cache; clearing it would also reload the store
+                run = next(runs)
+                return [client.get('{}{}run={}-{}'.format(
+                    url, '&' if '?' in url else '?', run, i)).get_data()
+                    for i, url in enumerate(urls)]
+
+            app.config['PLAYER_STORE'] = False
+            expected = run()
+            app.config['PLAYER_STORE'] = True
+            player_store()
+            if run() != expected:
+                print('MISMATCH between the store and the database')
+                return 1
+            if player_store().check():
+                print('MISMATCH between the store and the players table')
+                return 1
+
+            app.config['PLAYER_STORE'] = False
+            old = min(timeit.repeat(run, number=1, repeat=3)) / requests
+            app.config['PLAYER_STORE'] = True
+            new = min(timeit.repeat(run, number=1, repeat=3)) / requests
+    print(f'{players} players, {requests} requests, responses equal')
+    print(f'  database : {old * 1000:8.3f} ms/request')
+    print(f'  store    : {new * 1000:8.3f} ms/request')
+    print(f'  speedup  : {old / new:8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
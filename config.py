@@ -59,8 +59,41 @@ class Config(object):
     """
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Send executemany() inserts (e.g. player seasons) to PostgreSQL as
+    # multi-row INSERT ... VALUES statements instead of one per row
+    SQLALCHEMY_ENGINE_OPTIONS = {'executemany_mode': 'values'}
     ELASTICSEARCH_URL = os.environ.get('ELASTICSEARCH_URL') or None
     POSTS_PER_PAGE = 25
+    BBALL_REF_URL = os.environ.get('BBALL_REF_URL') or \
+        'https://www.basketball-reference.com'
+    CRAWL_BATCH_SIZE = int(os.environ.get('CRAWL_BATCH_SIZE') or 200)
+    CRAWL_MAX_ATTEMPTS = int(os.environ.get('CRAWL_MAX_ATTEMPTS') or 4)
+    CRAWL_RETRY_DELAY = float(os.environ.get('CRAWL_RETRY_DELAY') or 2)
+    CRAWL_MAX_RETRY_DELAY = float(os.environ.get('CRAWL_MAX_RETRY_DELAY') or 60)
+    CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS') or 4)
+    CRAWL_MAX_WORKERS = int(os.environ.get('CRAWL_MAX_WORKERS') or 16)
+    CRAWL_MAX_RATE = float(os.environ.get('CRAWL_MAX_RATE') or 0)
+    CRAWL_PROGRESS_INTERVAL = float(
+        os.environ.get('CRAWL_PROGRESS_INTERVAL') or 5)
+    CRAWL_QUEUE_DEPTH = int(os.environ.get('CRAWL_QUEUE_DEPTH') or 64)
+    CRAWL_PARSE_PROCESSES = int(
+        os.environ.get('CRAWL_PARSE_PROCESSES') or os.cpu_count() or 1)
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR') or 'page_cache'
+    # Mirrored player headshots, downloaded from HEADSHOT_URL/<player_image>
+    IMAGE_STORE_DIR = os.environ.get('IMAGE_STORE_DIR') or 'image_store'
+    HEADSHOT_URL = os.environ.get('HEADSHOT_URL') or \
+        'https://d2cwpp38twqe55.cloudfront.net/req/201911051/images/players'
+    HEADSHOT_WORKERS = int(os.environ.get('HEADSHOT_WORKERS') or 8)
+    # Redis server sharing the work queue of 'flask populate worker'
+    CRAWL_REDIS_URL = os.environ.get('CRAWL_REDIS_URL') or \
+        os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379'
+    CRAWL_LEASE_SECONDS = float(os.environ.get('CRAWL_LEASE_SECONDS') or 300)
+    CRAWL_FLUSH_SECONDS = float(os.environ.get('CRAWL_FLUSH_SECONDS') or 2)
+    # Players kept in the precomputed leaderboard of each stat
+    LEADERBOARD_DEPTH = int(os.environ.get('LEADERBOARD_DEPTH') or 250)
+    # Serve player reads from an in-process copy of the players table
+    PLAYER_STORE = (os.environ.get('PLAYER_STORE') or '').lower() in (
+        '1', 'true', 'yes')
     CACHE = {
         'CACHE_TYPE': 'redis',
         'CACHE_REDIS_HOST': os.environ.get('CACHE_REDIS_HOST') or 'localhost',
@@ -0,0 +1,137 @@
+from threading import RLock
+from time import time
+
+
+class StandInRedis(object):
+    """
+    In-process stand-in for the redis.Redis client (created with
+    decode_responses=True), implementing only the commands used by
+    app.work_queue.RedisWorkQueue. Commands are atomic, like on a Redis
+    server, so threads sharing one StandInRedis behave like workers sharing
+    a server. Key expiry (set with px) is checked on access.
+    """
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = RLock()
+
+    def _get(self, key, default=None):
+        """Return the value of key, dropping it first if it expired."""
+        if key in self._expires and self._expires[key] <= time():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return self._data.get(key, default)
+
+    def set(self, key, value, nx=False, px=None):
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self._data[key] = str(value)
+            self._expires.pop(key, None)
+            if px is not None:
+                self._expires[key] = time() + px / 1000
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = sum(1 for key in keys if self._get(key) is not None)
+            for key in keys:
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return deleted
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._get(key) is not None)
+
+    def zadd(self, key, mapping, nx=False, xx=False):
+        with self._lock:
+            zset = self._data.setdefault(key, {})
+            added = 0
+            for member, score in mapping.items():
+                if (nx and member in zset) or (xx and member not in zset):
+                    continue
+                added += member not in zset
+                zset[member] = float(score)
+            if not zset:
+                del self._data[key]
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._get(key, {})
+            removed = sum(1 for member in members
+                          if zset.pop(member, None) is not None)
+            if not zset:
+                self._data.pop(key, None)
+            return removed
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._get(key, {}))
+
+    def zrangebyscore(self, key, min, max, start=None, num=None):
+        with self._lock:
+            low, high = float(min), float(max)
+            members = [member for member, score in sorted(
+                self._get(key, {}).items(), key=lambda item: item[1])
+                if low <= score <= high]
+            if start is not None:
+                members = members[start:start + num]
+            return members
+
+    def sadd(self, key, *members):
+        with self._lock:
+            members_set = self._data.setdefault(key, set())
+            added = len(set(members) - members_set)
+            members_set.update(members)
+            return added
+
+    def sismember(self, key, member):
+        with self._lock:
+            return member in self._get(key, set())
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            fields = self._data.setdefault(key, {})
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+            return int(fields[field])
+
+    def hset(self, key, field, value):
+        with self._lock:
+            fields = self._data.setdefault(key, {})
+            added = field not in fields
+            fields[field] = str(value)
+            return int(added)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key, {}))
+
+    def pipeline(self):
+        return StandInPipeline(self)
+
+
+class StandInPipeline(object):
+    """
+    Pipeline of a StandInRedis: commands are queued and run together, as
+    one transaction, by execute(), which returns their results in order.
+    """
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            results = [command(*args, **kwargs)
+                       for command, args, kwargs in self._commands]
+        self._commands = []
+        return results
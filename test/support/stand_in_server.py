@@ -0,0 +1,44 @@
+import os
+import pytest
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+
+FIXTURE_SITE = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'fixtures', 'site')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serve fixture pages without logging every request to stderr."""
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_site(directory=FIXTURE_SITE):
+    """
+    Serve the pages in 'directory' from a local HTTP server on a free port
+    and yield its base URL, to stand in for basketball-reference.
+    """
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stand_in_server():
+    """
+    Serve the recorded basketball-reference pages in test/fixtures/site from
+    a local HTTP server and yield its base URL.
+    """
+    with serve_site() as base_url:
+        yield base_url
@@ -0,0 +1,67 @@
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import create_app, db
+from app.api import compare
+from app.api.compare import compare_cache_key, compare_rows, compare_stat
+from app.models import Player, SHOOTING_STATS, OTHER_STATS
+from config import TestingConfig
+
+
+def test_compare_stat():
+    """Test the leader, differences and ratios of one stat."""
+    assert compare_stat([1, 2, 3], [20.0, 25.0, None]) == {
+        'values': [20.0, 25.0, None],
+        'leader': 2,
+        'differences': [-5.0, 0.0, None],
+        'ratios': [0.8, 1.0, None],
+    }
+    assert compare_stat([1, 2], [3.0, 2.0], lower_is_better=True)[
+        'leader'] == 2
+    assert compare_stat([1, 2], [3.0, 3.0])['leader'] is None
+    assert compare_stat([1, 2], [None, None])['leader'] is None
+
+
+def test_compare_rows():
+    """Test stats are compared and grouped like Player.to_dict()."""
+    stats = SHOOTING_STATS + OTHER_STATS
+    rows = [(1, *[1.0] * len(stats)), (2, *[2.0] * len(stats))]
+    compared = compare_rows(rows)
+
+    assert list(compared['shooting']) == list(SHOOTING_STATS)
+    assert compared['shooting']['points']['leader'] == 2
+    assert compared['turnovers']['leader'] == 1
+    assert compared['assists']['ratios'] == [0.5, 1.0]
+
+
+def test_compare_cache_key(monkeypatch):
+    """Test 'A vs B' and 'B vs A' share a cache key."""
+    monkeypatch.setattr(compare, 'current_version', lambda: 1)
+    test_app = create_app(TestingConfig)
+    with test_app.test_request_context('/api/players/compare?ids=7,3'):
+        key = compare_cache_key()
+    with test_app.test_request_context('/api/players/compare?ids=3,7,3'):
+        assert compare_cache_key() == key == 'compare:1:3,7'
+
+
+def test_compare_players(app):
+    """Test players are compared side by side in id order."""
+    app = app(TestingConfig)
+    jordan = Player(player_name='Michael Jordan', points=30.1, turnovers=2.7)
+    james = Player(player_name='LeBron James', points=27.1, turnovers=3.5)
+    db.session.add_all([jordan, james])
+    db.session.commit()
+    client = app.test_client()
+
+    data = client.get(
+        f'/api/players/compare?ids={james.id},{jordan.id},0').get_json()
+    assert [player['id'] for player in data['players']] == sorted(
+        [jordan.id, james.id])
+    assert data['stats']['shooting']['points']['leader'] == jordan.id
+    assert data['stats']['turnovers']['leader'] == jordan.id
+    assert data['missing'] == [0]
+
+    assert client.get(
+        f'/api/players/compare?ids={jordan.id}').status_code == 400
+    assert client.get(
+        f'/api/players/compare?ids={jordan.id},0').status_code == 404
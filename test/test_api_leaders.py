@@ -0,0 +1,65 @@
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db, cache
+from app.leaders import leaders, patch_leaderboards, rebuild_leaderboards
+from app.models import Player
+from config import TestingConfig
+
+
+def add_guards():
+    """Add players with points and three point shooting."""
+    players = [
+        Player(player_name='Stephen Curry', position='PG', points=24.8,
+               three_pt_pct=0.428, three_pt_attempted=9.3),
+        Player(player_name='Michael Jordan', position='SG, SF', points=30.1,
+               three_pt_pct=0.327, three_pt_attempted=1.7),
+        Player(player_name='Magic Johnson', position='PG', points=19.5,
+               three_pt_pct=0.303, three_pt_attempted=1.4),
+        Player(player_name='Ben Wallace', position='C')]
+    db.session.add_all(players)
+    db.session.commit()
+    return players
+
+
+def test_get_leaders(app):
+    """Test leaders are ranked and filtered by position and attempts."""
+    app = app(TestingConfig)
+    cache.clear()
+    curry, jordan, magic, _ = add_guards()
+    rebuild_leaderboards()
+    client = app.test_client()
+
+    data = client.get('/api/leaders/points').get_json()
+    assert [(item['rank'], item['id']) for item in data['items']] == [
+        (1, jordan.id), (2, curry.id), (3, magic.id)]
+    data = client.get('/api/leaders/points?position=PG&limit=1').get_json()
+    assert [item['id'] for item in data['items']] == [curry.id]
+    data = client.get(
+        '/api/leaders/three_pt_pct?min_attempts=1.5').get_json()
+    assert [item['id'] for item in data['items']] == [curry.id, jordan.id]
+    assert data['items'][0]['attempts'] == 9.3
+
+    assert client.get('/api/leaders/salary').status_code == 404
+    assert client.get('/api/leaders/points?min_attempts=1').status_code == 400
+
+
+def test_patch_leaderboards(app):
+    """Test written players are moved in the cached leaderboards."""
+    app = app(TestingConfig)
+    cache.clear()
+    app.config['LEADERBOARD_DEPTH'] = 2
+    curry, jordan, magic, wallace = add_guards()
+    rebuild_leaderboards()
+
+    wallace.points = 27.0
+    db.session.commit()
+    patch_leaderboards(wallace.id, wallace)
+    assert [entry[0] for entry in leaders('points', 2)] == [
+        jordan.id, wallace.id]
+
+    db.session.delete(jordan)
+    db.session.commit()
+    patch_leaderboards(jordan.id)
+    assert [entry[0] for entry in leaders('points', 2)] == [
+        wallace.id, curry.id]
@@ -0,0 +1,219 @@
+import pytest
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db, cache
+from werkzeug.datastructures import MultiDict
+from flask import request
+from app.api.players import (
+    filters_count_key, parse_filters, parse_player_ids, parse_sort,
+    player_cache_key)
+from app.metrics import CrawlMetrics
+from app.models import Player
+from app.writer import write_batch
+from config import TestingConfig
+
+
+def add_players(*names):
+    """Add players named 'names' and return their ids."""
+    players = [Player(player_name=name) for name in names]
+    db.session.add_all(players)
+    db.session.commit()
+    return [player.id for player in players]
+
+
+def test_parse_player_ids():
+    """Test ids are parsed in order without duplicates."""
+    assert parse_player_ids('3,1, 2,3,') == [3, 1, 2]
+    assert parse_player_ids([2, '1']) == [2, 1]
+    with pytest.raises(ValueError):
+        parse_player_ids('1,two')
+    with pytest.raises(ValueError):
+        parse_player_ids(list(range(101)))
+
+
+def test_get_players_batch(app):
+    """Test players are returned in the requested order with missing ids."""
+    app = app(TestingConfig)
+    cache.clear()
+    jordan, james = add_players('Michael Jordan', 'LeBron James')
+    client = app.test_client()
+
+    data = client.get(f'/api/players?ids={james},0,{jordan}').get_json()
+    assert [item['id'] for item in data['items']] == [james, jordan]
+    assert data['missing'] == [0]
+    assert cache.get(player_cache_key(james))['player_name'] == \
+        'LeBron James'
+
+    response = client.get('/api/players?ids=1,a')
+    assert response.status_code == 400
+
+
+def test_players_batch_after_write(app):
+    """Test every cached field set of a player is dropped by a write."""
+    app = app(TestingConfig)
+    cache.clear()
+    james, = add_players('LeBron James')
+    client = app.test_client()
+
+    def names():
+        return [client.get(f'/api/players/{james}?fields=player_name')
+                .get_json()['player_name'],
+                client.get(f'/api/players?ids={james}&fields=player_name')
+                .get_json()['items'][0]['player_name'],
+                client.post('/api/players/batch', json={
+                    'ids': [james], 'fields': ['player_name']})
+                .get_json()['items'][0]['player_name']]
+    assert names() == ['LeBron James'] * 3
+
+    Player.query.get(james).player_name = 'King James'
+    db.session.commit()
+    assert names() == ['King James'] * 3
+
+
+def test_player_totals_after_bulk_write(app):
+    """Test cached totals are not served once players are bulk written."""
+    app = app(TestingConfig)
+    cache.clear()
+    add_players('Michael Jordan')
+    client = app.test_client()
+    assert client.get('/api/players/').get_json()['_meta'][
+        'total_items'] == 1
+    assert client.get('/api/players/index/m').get_json()['_meta'][
+        'total_items'] == 1
+
+    write_batch(db, [
+        (f'/players/{slug[0]}/{slug}.html',
+         {'slug': slug, 'player_name': name})
+        for slug, name in [('johnsma02', 'Magic Johnson'),
+                           ('jamesle01', 'LeBron James')]],
+        CrawlMetrics(), checkpoint=False)
+
+    assert client.get('/api/players/').get_json()['_meta'][
+        'total_items'] == 3
+    assert client.get('/api/players/index/m').get_json()['_meta'][
+        'total_items'] == 2
+
+
+def test_post_players_batch(app):
+    """Test ids can be posted in the request body."""
+    app = app(TestingConfig)
+    cache.clear()
+    ids = add_players('Michael Jordan', 'LeBron James', 'Magic Johnson')
+    client = app.test_client()
+
+    data = client.post('/api/players/batch',
+                       json={'ids': ids[::-1]}).get_json()
+    assert [item['player_name'] for item in data['items']] == [
+        'Magic Johnson', 'LeBron James', 'Michael Jordan']
+    assert data['missing'] == []
+    assert client.post('/api/players/batch', json={}).status_code == 400
+
+
+def test_cursor_round_trip():
+    """Test cursor tokens decode to the values they were made from."""
+    cursor = Player.encode_cursor(['LeBron James', 3])
+    assert Player.decode_cursor(cursor, 2) == ['LeBron James', 3]
+    with pytest.raises(ValueError):
+        Player.decode_cursor(cursor, 1)
+    with pytest.raises(ValueError):
+        Player.decode_cursor('not a cursor', 2)
+
+
+def test_get_players_by_cursor(app):
+    """Test cursor pages walk the players by name without repeats."""
+    app = app(TestingConfig)
+    cache.clear()
+    add_players('Magic Johnson', 'Moses Malone', 'Michael Jordan',
+                'Moses Malone', 'LeBron James')
+    client = app.test_client()
+
+    names = []
+    data = client.get('/api/players/index/m?cursor=&per_page=2').get_json()
+    assert data['_meta']['total_items'] == 4
+    while True:
+        names += [item['player_name'] for item in data['items']]
+        if data['_links']['next'] is None:
+            break
+        data = client.get(data['_links']['next']).get_json()
+    assert names == ['Magic Johnson', 'Michael Jordan', 'Moses Malone',
+                     'Moses Malone']
+
+    assert client.get('/api/players/?cursor=WyJhIl0=').status_code == 400
+
+
+def test_get_players_fields(app):
+    """Test only the requested fields are returned."""
+    app = app(TestingConfig)
+    cache.clear()
+    add_players('Michael Jordan', 'LeBron James')
+    client = app.test_client()
+
+    data = client.get('/api/players/index/l?cursor=&fields=points').get_json()
+    assert data['items'][0]['shooting'] == {'points': None}
+    assert 'player_name' not in data['items'][0]
+    data = client.get('/api/players/?fields=player_name').get_json()
+    assert [sorted(item) for item in data['items']] == [
+        ['_links', 'id', 'player_name']] * 2
+    assert 'fields=player_name' in data['_links']['self']
+    assert client.get('/api/players/?fields=salary').status_code == 400
+
+
+def test_parse_sort():
+    """Test sort fields are parsed in order and end with the id."""
+    order = Player.sort_keys(parse_sort('-points, assists,-points'))
+    assert [(column.key, descending) for column, descending in order] == [
+        ('points', True), ('assists', False), ('id', False)]
+    assert Player.sort_keys(parse_sort('')) == [(Player.id, False)]
+    with pytest.raises(ValueError):
+        parse_sort('salary')
+
+
+def test_parse_filters():
+    """Test range filters are only accepted on numeric columns."""
+    criteria = parse_filters(MultiDict(
+        [('min_points', '20'), ('max_turnovers', '3'), ('page', '2')]))
+    assert [str(criterion) for criterion in criteria] == [
+        'player.points >= :points_1', 'player.turnovers <= :turnovers_1']
+    for args in ({'min_salary': '1'}, {'min_player_name': 'A'},
+                 {'min_points': 'many'}, {'max_points': 'inf'}):
+        with pytest.raises(ValueError):
+            parse_filters(MultiDict(args))
+
+
+def test_get_players_sorted_and_filtered(app):
+    """Test players are sorted by stat, missing stats last, and filtered."""
+    app = app(TestingConfig)
+    cache.clear()
+    players = [Player(player_name='Michael Jordan', points=30.1),
+               Player(player_name='Bill Russell'),
+               Player(player_name='LeBron James', points=27.1),
+               Player(player_name='Ben Wallace', points=5.7)]
+    db.session.add_all(players)
+    db.session.commit()
+    client = app.test_client()
+
+    names = []
+    data = client.get('/api/players/?sort=-points&cursor=&per_page=1'
+                      ).get_json()
+    while True:
+        names += [item['player_name'] for item in data['items']]
+        if data['_links']['next'] is None:
+            break
+        data = client.get(data['_links']['next']).get_json()
+    assert names == ['Michael Jordan', 'LeBron James', 'Ben Wallace',
+                     'Bill Russell']
+
+    data = client.get('/api/players/?min_points=20&sort=points').get_json()
+    assert [item['player_name'] for item in data['items']] == [
+        'LeBron James', 'Michael Jordan']
+    assert data['_meta']['total_items'] == 2
+    assert 'min_points=20' in data['_links']['self']
+    # The total is cached for the same filters however they are written
+    with app.test_request_context('/api/players/?min_points=20.0'):
+        assert cache.get(filters_count_key(request.args)) == 2
+    db.session.add(Player(player_name='Kobe Bryant', points=25.0))
+    db.session.commit()
+    data = client.get('/api/players/?min_points=20&sort=points').get_json()
+    assert data['_meta']['total_items'] == 3
+    assert client.get('/api/players/?sort=salary').status_code == 400
@@ -0,0 +1,29 @@
+import os
+from benchmarks.bench_ingest import build_corpus, compare
+from app.util import parse_player_index
+
+
+def test_build_corpus(tmpdir):
+    """Test every player page is served and listed under 'copies' URLs."""
+    site = os.path.join(str(tmpdir), 'site')
+    pages = build_corpus(site, 3)
+
+    assert pages == 18
+    with open(os.path.join(site, 'players', 'j', 'index.html')) as f:
+        urls = parse_player_index(f.read(), '')
+    assert len(urls) == 9
+    assert '/players/j/jamesle01x2.html' in urls
+    for url in urls:
+        assert os.path.exists(site + url)
+
+
+def test_compare():
+    """Test results are compared in the direction that is better."""
+    baseline = {'pages_per_second': 100, 'parse_ms_per_page': 10,
+                'peak_rss_mb': 100}
+    results = {'pages_per_second': 70, 'parse_ms_per_page': 11,
+               'peak_rss_mb': 130}
+
+    assert compare(results, baseline, 0.2) == [
+        'pages_per_second', 'peak_rss_mb']
+    assert compare(results, {}, 0.2) == []
@@ -0,0 +1,72 @@
+from queue import Queue
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db
+from app.models import CrawlPage
+from app.checkpoint import (
+    start_crawl, resume_crawl, add_player_pages, failed_attempts,
+    record_progress)
+from app.metrics import CrawlMetrics
+from app.retry import RetryQueue
+from config import TestingConfig
+
+
+def test_resume_without_crawl(app):
+    """Test there is nothing to resume before a crawl is started."""
+    app = app(TestingConfig)
+
+    assert resume_crawl(db) is None
+
+
+def test_add_player_pages(app):
+    """Test player pages are registered once and the index page is done."""
+    app = app(TestingConfig)
+
+    start_crawl(db, ['/players/a/', '/players/b/'])
+    assert add_player_pages(db, '/players/a/', ['/a1.html', '/a2.html']) == \
+        ['/a1.html', '/a2.html']
+    assert add_player_pages(db, '/players/a/', ['/a1.html', '/a3.html']) == \
+        ['/a3.html']
+
+    assert resume_crawl(db) == (
+        ['/players/b/'], ['/a1.html', '/a2.html', '/a3.html'])
+
+
+def test_resume_skips_done_pages(app):
+    """Test only pages not done yet are resumed, with attempts recorded."""
+    app = app(TestingConfig)
+
+    start_crawl(db, ['/players/a/'])
+    add_player_pages(db, '/players/a/', ['/a.html', '/b.html', '/c.html'])
+    record_progress(db, ['/a.html'], [('/b.html', ValueError('timeout')),
+                                      ('/b.html', ValueError('timeout'))])
+    db.session.commit()
+
+    assert resume_crawl(db) == ([], ['/b.html', '/c.html'])
+    failed = db.session.query(CrawlPage).get('/b.html')
+    assert failed.status == 'failed'
+    assert failed.attempts == 2
+
+
+def test_resume_carries_attempts_over(app):
+    """
+    Test a resumed crawl keeps counting failed attempts and leaves out the
+    pages already given up on.
+    """
+    app = app(TestingConfig)
+
+    start_crawl(db, ['/players/a/'])
+    add_player_pages(db, '/players/a/', ['/a.html', '/b.html', '/c.html'])
+    record_progress(db, [], [('/a.html', ValueError('timeout'))] * 4 +
+                    [('/b.html', ValueError('timeout'))])
+    db.session.commit()
+
+    assert resume_crawl(db, max_attempts=4) == ([], ['/b.html', '/c.html'])
+    assert failed_attempts(db) == {'/a.html': 4, '/b.html': 1}
+
+    retry_queue = RetryQueue(Queue(), 4, 0.01, 0.01, CrawlMetrics())
+    retry_queue.attempts.update(failed_attempts(db))
+    assert retry_queue.retry('/b.html', ValueError('timeout'))
+    retry_queue.close()
+    assert retry_queue.attempts['/b.html'] == 2
@@ -0,0 +1,91 @@
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.stand_in_server import stand_in_server
+from app.fetch import FetchPool, HTTPWorker, http_session, uncomment_tables
+from app.metrics import CrawlMetrics
+from app.page_cache import PageCache
+from app.throttle import AdaptiveLimiter, HostRateLimiter
+from app.util import player_urls, parse_page, parse_player_index
+
+
+def test_uncomment_tables():
+    """Test commented stat tables are exposed and other comments kept."""
+    html = ('<!-- site comment --><div id="all_advanced"><!--\n'
+            '<div class="table_outer_container"><table id="advanced">'
+            '</table></div>\n--></div>')
+    result = uncomment_tables(html)
+    assert '<!-- site comment -->' in result
+    assert '<!--\n<div class="table_outer_container">' not in result
+    assert '<table id="advanced">' in result
+
+
+def test_http_worker_get(stand_in_server):
+    """Test HTTPWorker loads a page and un-comments its tables."""
+    worker = HTTPWorker(http_session(pool_size=1))
+    worker.get(stand_in_server + '/players/j/jamesle01.html')
+
+    assert 'LeBron James' in worker.page_source
+    assert '<!--\n<div class="table_outer_container">' not in \
+        worker.page_source
+
+
+def test_http_player_urls(stand_in_server):
+    """Test player URLs are collected from the letter index pages."""
+    worker = HTTPWorker(http_session(pool_size=1))
+    urls = player_urls(worker, stand_in_server, letters='aj')
+
+    assert len(urls) == 6
+    assert stand_in_server + '/players/j/jamesle01.html' in urls
+
+
+def test_parse_player_index(stand_in_server):
+    """Test an empty letter index page yields no player URLs."""
+    worker = HTTPWorker(http_session(pool_size=1))
+    worker.get(stand_in_server + '/players/x/')
+
+    assert parse_player_index(worker.page_source, stand_in_server) == []
+
+
+def test_http_parse_page(stand_in_server):
+    """Test parse_page parses a player page fetched over HTTP."""
+    worker = HTTPWorker(http_session(pool_size=1))
+    url = stand_in_server + '/players/j/jamesle01.html'
+    worker.get(url)
+    row = parse_page(url, worker.page_source)
+
+    assert row['slug'] == 'jamesle01'
+    assert row['player_name'] == 'LeBron James'
+    assert row['first_nba_season'] == 2003
+    assert row['player_image'] == 'jamesle01.jpg'
+    assert row['points'] is not None
+    # true shooting is only found in the commented 'advanced' table
+    assert row['true_stg_pct'] is not None
+
+
+def test_http_worker_not_modified(stand_in_server):
+    """Test a conditional request for an unchanged page gets no content."""
+    worker = HTTPWorker(http_session(1))
+    url = stand_in_server + '/players/j/jamesle01.html'
+    worker.get(url)
+    assert worker.last_modified is not None
+
+    worker.get(url, last_modified=worker.last_modified)
+    assert worker.not_modified
+    assert worker.page_source is None
+
+
+def test_fetch_if_changed(stand_in_server, tmpdir):
+    """Test only pages changed since they were cached are returned."""
+    cache = PageCache(str(tmpdir))
+    fetch_pool = FetchPool(
+        {0: HTTPWorker(http_session(1))}, AdaptiveLimiter(1, 1, 1),
+        HostRateLimiter(0), CrawlMetrics(), cache)
+    url = stand_in_server + '/players/j/jamesle01.html'
+
+    assert fetch_pool.fetch(url, if_changed=True) is not None
+    assert fetch_pool.fetch(url, if_changed=True) is None
+    # Without validators the page is compared by content hash
+    cache.put(url, cache.get(url))
+    assert fetch_pool.fetch(url, if_changed=True) is None
+    cache.put(url, '<html>older version</html>')
+    assert fetch_pool.fetch(url, if_changed=True) is not None
@@ -0,0 +1,121 @@
+import os
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from test.support.stand_in_server import serve_site
+from app import create_app, db, cache
+from app.image_store import (
+    ImageStore, download_image, image_store, mirror_headshots)
+from app.fetch import http_session
+from app.metrics import CrawlMetrics
+from app.models import Player
+from app.player_store import player_store
+from app.throttle import HostRateLimiter
+from config import TestingConfig
+
+
+JPEG = b'\xff\xd8\xff\xe0 headshot'
+
+
+def serve_images(directory, images):
+    """Write 'images' (file name: bytes) to directory and serve them."""
+    for name, data in images.items():
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+    return serve_site(directory)
+
+
+def test_image_store_put(tmpdir):
+    """Test images are named after their content and stored once."""
+    store = ImageStore(str(tmpdir))
+    name = store.put(JPEG, '.JPG')
+
+    assert name.endswith('.jpg') and len(name) == 64 + len('.jpg')
+    assert store.put(JPEG, '.jpg') == name
+    assert store.put(b'other', '.jpg') != name
+    assert store.read(name) == JPEG
+
+
+def test_download_image(tmpdir):
+    """Test images are fetched from the stand-in image server."""
+    with serve_images(str(tmpdir), {'jamesle01.jpg': JPEG}) as url:
+        data = download_image(
+            http_session(1), HostRateLimiter(0), url + '/jamesle01.jpg')
+    assert data == JPEG
+
+
+def test_get_headshot(tmpdir):
+    """Test headshots are served with a strong ETag and cached for good."""
+    test_app = create_app(TestingConfig)
+    test_app.config['IMAGE_STORE_DIR'] = str(tmpdir)
+    name = ImageStore(str(tmpdir)).put(JPEG, '.jpg')
+    client = test_app.test_client()
+
+    # Images are streamed from their file, closed with the response
+    with client.get(f'/api/headshots/{name}') as response:
+        assert response.status_code == 200
+        assert response.data == JPEG
+        assert response.mimetype == 'image/jpeg'
+        assert response.headers['ETag'] == '"{}"'.format(name[:64])
+        assert 'immutable' in response.headers['Cache-Control']
+
+    with client.get(f'/api/headshots/{name}', headers={
+            'If-None-Match': response.headers['ETag']}) as response:
+        assert response.status_code == 304
+    assert client.get('/api/headshots/{}.jpg'.format(
+        '0' * 64)).status_code == 404
+    assert client.get('/api/headshots/..%2Fconfig.py').status_code == 404
+    with test_app.app_context():
+        assert image_store() is image_store()
+
+
+def test_mirror_headshots(app, tmpdir):
+    """Test headshots are mirrored concurrently and linked from players."""
+    app = app(TestingConfig)
+    db.session.add_all([
+        Player(slug='jamesle01', player_name='LeBron James',
+               player_image='jamesle01.jpg'),
+        Player(slug='jordami01', player_name='Michael Jordan',
+               player_image='jordami01.jpg'),
+        Player(slug='nobody01', player_name='No Image'),
+    ])
+    db.session.commit()
+    site = tmpdir.mkdir('site')
+    store = ImageStore(str(tmpdir.mkdir('store')))
+    metrics = CrawlMetrics()
+
+    with serve_images(str(site), {'jamesle01.jpg': JPEG}) as url:
+        failed = mirror_headshots(
+            db, store, url, 4, HostRateLimiter(0), metrics)
+    assert [url.rsplit('/', 1)[-1] for url, _ in failed] == ['jordami01.jpg']
+    assert metrics.counters['images_written'] == 1
+
+    player = Player.query.filter_by(slug='jamesle01').first()
+    assert store.read(player.headshot) == JPEG
+    assert player.to_dict()['_links']['headshot'].endswith(player.headshot)
+    assert Player.query.filter_by(slug='jordami01').first().headshot is None
+
+
+def test_mirrored_headshots_read_from_store(app, tmpdir):
+    """Test the player store serves the headshots written in bulk."""
+    app = app(TestingConfig)
+    app.config['PLAYER_STORE'] = True
+    cache.clear()
+    player = Player(slug='jamesle01', player_name='LeBron James',
+                    player_image='jamesle01.jpg')
+    db.session.add(player)
+    db.session.commit()
+    client = app.test_client()
+    assert client.get(f'/api/players/{player.id}').get_json()[
+        '_links']['headshot'] is None
+
+    store = ImageStore(str(tmpdir.mkdir('store')))
+    with serve_images(str(tmpdir.mkdir('site')),
+                      {'jamesle01.jpg': JPEG}) as url:
+        mirror_headshots(db, store, url, 1, HostRateLimiter(0),
+                         CrawlMetrics())
+
+    name = Player.query.get(player.id).headshot
+    assert client.get(f'/api/players/{player.id}').get_json()[
+        '_links']['headshot'].endswith(name)
+    assert player_store().check() == []
@@ -0,0 +1,39 @@
+import json
+from app.metrics import CrawlMetrics, format_progress
+
+
+def test_stage_timer():
+    """Test stage runs are counted and timed."""
+    metrics = CrawlMetrics()
+    with metrics.timer('fetch'):
+        pass
+    metrics.add_time('fetch', 0.5)
+
+    count, total, longest = metrics.stages['fetch']
+    assert count == 2
+    assert total >= 0.5
+    assert longest == 0.5
+
+
+def test_progress():
+    """Test finished pages include dead letters."""
+    metrics = CrawlMetrics()
+    metrics.incr('pages_queued', 10)
+    metrics.incr('pages_written', 4)
+    metrics.incr('dead_letters')
+
+    done, total, rate, eta = metrics.progress()
+    assert (done, total) == (5, 10)
+    assert format_progress(metrics).startswith('5/10 pages (50.0%)')
+
+
+def test_summary_is_json():
+    """Test the run summary is JSON serializable."""
+    metrics = CrawlMetrics()
+    metrics.add_time('write', 0.25)
+    metrics.incr('pages_written', 200)
+    summary = json.loads(json.dumps(metrics.summary()))
+
+    assert summary['stages']['write']['mean_ms'] == 250.0
+    assert summary['stages']['parse']['count'] == 0
+    assert summary['counters']['pages_written'] == 200
@@ -4,7 +4,7 @@ load_dotenv('.flaskenv')
 from test.support.configure_test import app
 from app import db
 from flask import url_for
-from app.models import Player
+from app.models import Player, PlayerSeason
 from config import TestingConfig
 
 
@@ -48,6 +48,22 @@ def test_player_db_delete(app):
         player_name='Test Name').first() is None
 
 
+def test_player_db_delete_seasons(app):
+    """Test a player's seasons are deleted with it."""
+    app = app(TestingConfig)
+
+    player = Player(player_name='Test Name', seasons=[
+        PlayerSeason(season=2019, team='LAL'),
+        PlayerSeason(season=2020, team='LAL')])
+    db.session.add(player)
+    db.session.commit()
+
+    db.session.delete(player)
+    db.session.commit()
+
+    assert db.session.query(PlayerSeason).count() == 0
+
+
 def test_valid_player_field(app):
     """Verify Player fields saved properly."""
     app = app(TestingConfig)
@@ -0,0 +1,52 @@
+import glob
+import os
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.stand_in_server import FIXTURE_SITE, stand_in_server
+from app.fetch import FetchPool, HTTPWorker, http_session
+from app.metrics import CrawlMetrics
+from app.page_cache import PageCache, reparse_page
+from app.throttle import AdaptiveLimiter, HostRateLimiter
+
+
+def test_page_cache_put_get(tmpdir):
+    """Test the last version of a page is returned and content is shared."""
+    cache = PageCache(str(tmpdir))
+    first = cache.put('/players/a/a01.html', '<html>old</html>')
+    cache.put('/players/b/b01.html', '<html>old</html>')
+    second = cache.put('/players/a/a01.html', '<html>new</html>')
+
+    assert first != second
+    assert cache.get('/players/a/a01.html') == '<html>new</html>'
+    assert cache.get('/players/c/c01.html') is None
+    assert cache.entries()['/players/b/b01.html']['sha256'] == first
+    assert len(glob.glob(os.path.join(str(tmpdir), 'objects', '*', '*'))) == 2
+
+
+def test_fetch_pool_writes_through(stand_in_server, tmpdir):
+    """Test fetched pages are stored in the page cache."""
+    cache = PageCache(str(tmpdir))
+    fetch_pool = FetchPool(
+        {0: HTTPWorker(http_session(1))}, AdaptiveLimiter(1, 1, 1),
+        HostRateLimiter(0), CrawlMetrics(), cache)
+    url = stand_in_server + '/players/j/jamesle01.html'
+    html = fetch_pool.fetch(url)
+
+    assert cache.get(url) == html
+
+
+def test_reparse_page(tmpdir):
+    """Test cached pages are parsed, and failures returned not raised."""
+    cache = PageCache(str(tmpdir))
+    path = os.path.join(FIXTURE_SITE, 'players', 'j', 'jamesle01.html')
+    with open(path) as f:
+        player = cache.put('/players/j/jamesle01.html', f.read())
+    empty = cache.put('/players/x/empty01.html', '<html></html>')
+
+    row, seconds = reparse_page(
+        str(tmpdir), '/players/j/jamesle01.html', player)
+    assert row['slug'] == 'jamesle01'
+    assert row['player_name'] == 'LeBron James'
+    assert seconds >= 0
+    row, _ = reparse_page(str(tmpdir), '/players/x/empty01.html', empty)
+    assert isinstance(row, Exception)
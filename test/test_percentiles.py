@@ -0,0 +1,51 @@
+import math
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db, cache
+from app.models import Player
+from app.percentiles import LeagueDistribution, PERCENTILE_STATS
+from config import TestingConfig
+
+
+def stat_rows(points):
+    """Return distribution rows with only 'points' known."""
+    index = PERCENTILE_STATS.index('points')
+    return [tuple(value if i == index else None
+                  for i in range(len(PERCENTILE_STATS))) for value in points]
+
+
+def test_rank():
+    """Test percentiles count half the ties and ranks count players above."""
+    distribution = LeagueDistribution(stat_rows([10.0, 20.0, 20.0, 30.0,
+                                                 None]))
+    percentiles, ranks, count = distribution.rank(
+        'points', [20.0, 30.0, 5.0, float('nan')])
+    assert count == 4
+    assert percentiles[:3].tolist() == [50.0, 87.5, 0.0]
+    assert math.isnan(percentiles[3])
+    assert ranks.tolist() == [2, 1, 5, 0]
+    assert distribution.rank('assists', [1.0])[2] == 0
+
+
+def test_get_player_percentiles(app):
+    """Test the percentiles and ranks of a player's stats are returned."""
+    app = app(TestingConfig)
+    cache.clear()
+    players = [Player(player_name=f'Player {points}', points=points)
+               for points in (10.0, 20.0, 30.0)]
+    db.session.add_all(players)
+    db.session.commit()
+    client = app.test_client()
+
+    data = client.get(f'/api/players/{players[1].id}/percentiles').get_json()
+    assert data['percentiles']['shooting']['points'] == {
+        'percentile': 50.0, 'rank': 2, 'of': 3}
+    assert data['percentiles']['assists'] is None
+
+    data = client.get(f'/api/players/{players[2].id}?percentiles=true'
+                      '&fields=points').get_json()
+    assert data['percentiles'] == {
+        'shooting': {'points': {'percentile': 83.3, 'rank': 1, 'of': 3}}}
+    assert client.get(f'/api/players/{players[0].id}').get_json().get(
+        'percentiles') is None
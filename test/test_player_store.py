@@ -0,0 +1,70 @@
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db, cache
+from app.models import Player
+from app.player_store import STORE_COLUMNS, PlayerStore
+from config import TestingConfig
+
+
+def store_values(id, **values):
+    """Return the column values of player 'id' with only 'values' set."""
+    return {column: id if column == 'id' else values.get(column)
+            for column in STORE_COLUMNS}
+
+
+def test_apply_changes():
+    """Test added, modified and deleted players update every index."""
+    store = PlayerStore()
+    store.apply({id: store_values(id, player_name=name, points=points)
+                 for id, name, points in [
+                     (1, 'Kobe Bryant', 25.0), (2, 'Kevin Durant', None),
+                     (3, 'Michael Jordan', 30.1)]})
+    assert store.values([3, 2], ['player_name', 'points']) == [
+        ('Michael Jordan', 30.1), ('Kevin Durant', None)]
+
+    store.apply({1: store_values(1, player_name='Kobe', points=26.0),
+                 2: None})
+    assert store.find(2) is None
+    assert store.find_name('Kobe') == 1
+    assert store.find_name('Kobe Bryant') is None
+    assert store.id_keys == [(1,), (3,)]
+    assert store.name_keys == [('Kobe', 1), ('Michael Jordan', 3)]
+    assert store.values([1], ['points']) == [(26.0,)]
+
+
+def test_name_range():
+    """Test the name keys of a prefix are found by binary search."""
+    store = PlayerStore()
+    store.apply({id: store_values(id, player_name=name) for id, name in [
+        (1, 'Kobe Bryant'), (2, 'Allen Iverson'), (3, 'Kevin Durant'),
+        (4, 'Kobe Bryant'), (5, None)]})
+    start, stop = store.name_range('K')
+    assert store.name_keys[start:stop] == [
+        ('Kevin Durant', 3), ('Kobe Bryant', 1), ('Kobe Bryant', 4)]
+    assert store.name_range('Z') == (4, 4)
+
+
+def test_store_follows_commits(app):
+    """Test the store is patched by commits and answers like the database."""
+    app = app(TestingConfig)
+    app.config['PLAYER_STORE'] = True
+    cache.clear()
+    players = [Player(player_name=name, points=points)
+               for name, points in [('Kobe Bryant', 25.0),
+                                    ('Kevin Durant', 27.3)]]
+    db.session.add_all(players)
+    db.session.commit()
+    client = app.test_client()
+
+    data = client.get('/api/players/index/k?per_page=1').get_json()
+    assert [item['player_name'] for item in data['items']] == [
+        'Kevin Durant']
+    assert data['_meta']['total_items'] == 2
+
+    players[0].points = 30.0
+    db.session.delete(players[1])
+    db.session.commit()
+    data = client.get(f'/api/players/{players[0].id}').get_json()
+    assert data['shooting']['points'] == 30.0
+    assert client.get('/api/players/Kevin+Durant').status_code == 404
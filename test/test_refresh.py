@@ -0,0 +1,38 @@
+from datetime import date
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db
+from app.refresh import current_season, refresh_selection
+from app.writer import upsert_players
+from config import TestingConfig
+
+
+def test_current_season():
+    """Test seasons are named after the year they end in."""
+    assert current_season(date(2020, 3, 1)) == 2020
+    assert current_season(date(2020, 8, 1)) == 2020
+    assert current_season(date(2020, 11, 1)) == 2021
+
+
+def test_refresh_selection(app):
+    """Test active players come first and stored retired ones are skipped."""
+    app = app(TestingConfig)
+    upsert_players(db, [
+        {'slug': 'jordami01', 'player_name': 'Michael Jordan',
+         'last_nba_season': 2003},
+        {'slug': 'bryanko01', 'player_name': 'Kobe Bryant',
+         'last_nba_season': 2015},
+    ])
+    db.session.commit()
+
+    assert refresh_selection(db, [
+        ('/players/b/bryanko01.html', 2016),
+        ('/players/j/jordami01.html', 2003),
+        ('/players/j/johnsma02.html', 1992),
+        ('/players/j/jamesle01.html', 2020),
+    ], 2020) == [
+        '/players/j/jamesle01.html',
+        '/players/b/bryanko01.html',
+        '/players/j/johnsma02.html',
+    ]
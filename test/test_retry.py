@@ -0,0 +1,42 @@
+from queue import Queue
+from app.metrics import CrawlMetrics
+from app.retry import RetryQueue, backoff_delay
+
+
+def test_backoff_delay_bounds():
+    """Test backoff grows exponentially, is capped and jittered."""
+    for attempt in range(1, 10):
+        delay = min(60, 2 * 2 ** (attempt - 1))
+        assert delay / 2 <= backoff_delay(attempt, 2, 60) <= delay
+
+
+def test_retry_queue_requeues():
+    """Test a failed URL is put back on the work queue after its delay."""
+    data_queue = Queue()
+    data_queue.put('/a.html')
+    retry_queue = RetryQueue(data_queue, 3, 0.01, 0.01, CrawlMetrics())
+
+    url = data_queue.get()
+    assert retry_queue.retry(url, ValueError('timeout'))
+    assert data_queue.get(timeout=1) == '/a.html'
+    data_queue.task_done()
+    data_queue.join()
+    retry_queue.close()
+
+    assert retry_queue.attempts['/a.html'] == 1
+    assert not retry_queue.dead_letters
+
+
+def test_retry_queue_dead_letters():
+    """Test a URL is given up on after max_attempts failures."""
+    data_queue = Queue()
+    data_queue.put('/a.html')
+    retry_queue = RetryQueue(data_queue, 2, 0.01, 0.01, CrawlMetrics())
+
+    assert retry_queue.retry(data_queue.get(), ValueError('timeout'))
+    assert not retry_queue.retry(data_queue.get(timeout=1),
+                                 ValueError('timeout'))
+    data_queue.join()
+    retry_queue.close()
+
+    assert retry_queue.dead_letters[0][:2] == ('/a.html', 2)
@@ -0,0 +1,85 @@
+import json
+import pytest
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from app import create_app
+from app.api import serializers
+from app.api.serializers import (
+    PLAYER_COLUMNS, dumps, link_template, parse_fields, player_serializer,
+    request_cache_key, serialize_players)
+from app.models import Player
+from config import TestingConfig
+
+
+def test_link_template():
+    """Test link templates build the same URLs as url_for."""
+    with create_app(TestingConfig).test_request_context():
+        assert link_template('api.get_player_id', 'id').format(12) == \
+            '/api/players/12'
+        assert link_template('api.get_headshot', 'name').format('ab.jpg') \
+            == '/api/headshots/ab.jpg'
+
+
+def test_serialize_players():
+    """Test players are serialized like Player.to_dict()."""
+    player = Player(id=3, player_name='LeBron James', position='Forward',
+                    points=27.1, turnovers=3.5, headshot='ab.jpg')
+    with create_app(TestingConfig).test_request_context():
+        row = tuple(getattr(player, column) for column in PLAYER_COLUMNS)
+        assert serialize_players([row]) == [player.to_dict()]
+
+        player.headshot = None
+        row = tuple(getattr(player, column) for column in PLAYER_COLUMNS)
+        assert serialize_players([row]) == [player.to_dict()]
+
+
+def test_parse_fields():
+    """Test fields are returned in canonical order and validated."""
+    assert parse_fields('assists, points,player_name,points') == (
+        'player_name', 'points', 'assists')
+    assert parse_fields('') is None
+    assert parse_fields(None) is None
+    with pytest.raises(ValueError):
+        parse_fields('points,salary')
+
+
+def test_player_serializer_fields():
+    """Test only the requested fields are read and returned."""
+    serializer = player_serializer(parse_fields('assists,points,headshot'))
+    assert serializer.columns == ('id', 'points', 'assists', 'headshot')
+    assert player_serializer(parse_fields('points,assists,headshot')) is \
+        serializer
+    with create_app(TestingConfig).test_request_context():
+        # Columns after the serializer's own, like a cursor's key, are ignored
+        assert serializer([(3, 27.1, 7.4, 'ab.jpg', 'LeBron James')]) == [{
+            'id': 3,
+            'shooting': {'points': 27.1},
+            'assists': 7.4,
+            '_links': {'self': '/api/players/3',
+                       'headshot': '/api/headshots/ab.jpg'}
+        }]
+        assert player_serializer(('player_name',))([(3, 'LeBron James')]) \
+            == [{'id': 3, 'player_name': 'LeBron James',
+                 '_links': {'self': '/api/players/3'}}]
+
+
+def test_request_cache_key(monkeypatch):
+    """Test requests for the same fields in any order share a cache key."""
+    monkeypatch.setattr(serializers, 'current_version', lambda: 1)
+    test_app = create_app(TestingConfig)
+    with test_app.test_request_context('/api/players/?fields=points,assists'
+                                       '&page=2'):
+        key = request_cache_key()
+    with test_app.test_request_context('/api/players/?page=2'
+                                       '&fields=assists,points'):
+        assert request_cache_key() == key
+    with test_app.test_request_context('/api/players/?page=2'):
+        assert request_cache_key() != key
+
+
+def test_dumps_without_orjson(monkeypatch):
+    """Test the standard library encoder is used without orjson."""
+    data = {'items': [{'id': 1, 'points': 27.1, 'name': 'Dončić'}]}
+    expected = dumps(data)
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert json.loads(dumps(data)) == json.loads(expected) == data
@@ -0,0 +1,66 @@
+import math
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from app import db, cache
+from app.models import Player
+from app.similarity import SIMILARITY_STATS, SimilarityIndex
+from config import TestingConfig
+
+
+def stat_row(**stats):
+    """Return a row of SIMILARITY_STATS with only 'stats' known."""
+    return [stats.get(stat) for stat in SIMILARITY_STATS]
+
+
+def test_neighbours():
+    """Test neighbours are ranked over the stats shared with the player."""
+    index = SimilarityIndex([1, 2, 3, 4, 5], [
+        stat_row(points=20.0, assists=5.0),
+        stat_row(points=21.0, assists=5.0),
+        stat_row(points=10.0, assists=2.0),
+        # Missing assists: compared on points alone
+        stat_row(points=20.0),
+        stat_row()])
+
+    neighbours = index.neighbours(1, 3)
+    assert [id for id, _ in neighbours] == [4, 2, 3]
+    assert neighbours[0][1] == 0.0
+    assert all(a <= b for (_, a), (_, b) in zip(neighbours, neighbours[1:]))
+    assert [id for id, _ in index.neighbours(1, 10)] == [4, 2, 3]
+    assert index.neighbours(5, 3) == []
+
+
+def test_distances_match_direct_computation():
+    """Test the expanded distances equal the direct ones."""
+    index = SimilarityIndex([1, 2, 3], [
+        stat_row(points=20.0, assists=5.0, steals=1.0),
+        stat_row(points=25.0, assists=2.0),
+        stat_row(points=10.0, assists=8.0, steals=2.0)])
+    # Standardised: points (20, 25, 10) and assists (5, 2, 8) have
+    # standard deviations sqrt(350/9) and sqrt(6); steals (1, 2) of 0.5
+    points, assists = math.sqrt(350 / 9), math.sqrt(6)
+    expected = {
+        2: math.sqrt(((5 / points) ** 2 + (3 / assists) ** 2) * 3 / 2),
+        3: math.sqrt((10 / points) ** 2 + (3 / assists) ** 2 + 2 ** 2)}
+    for id, distance in index.neighbours(1, 2):
+        assert math.isclose(distance, expected[id], rel_tol=1e-5)
+
+
+def test_get_similar_players(app):
+    """Test the most similar players are returned nearest first."""
+    app = app(TestingConfig)
+    cache.clear()
+    players = [Player(player_name=name, points=points, assists=assists)
+               for name, points, assists in [
+                   ('Michael Jordan', 30.1, 5.3), ('Kobe Bryant', 25.0, 4.7),
+                   ('Ben Wallace', 5.7, 1.3)]]
+    db.session.add_all(players)
+    db.session.commit()
+    client = app.test_client()
+
+    data = client.get(f'/api/players/{players[0].id}/similar?k=1').get_json()
+    assert [item['player_name'] for item in data['items']] == ['Kobe Bryant']
+    assert client.get('/api/players/0/similar').status_code == 404
+    assert client.get(
+        f'/api/players/{players[0].id}/similar?k=0').status_code == 400
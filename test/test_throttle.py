@@ -0,0 +1,43 @@
+from time import monotonic
+from app.throttle import AdaptiveLimiter, HostRateLimiter
+
+
+def run_window(limiter, latency, ok=True):
+    """Complete one window of fetches with the given latency."""
+    for _ in range(limiter.window):
+        limiter.acquire()
+        limiter.release(latency, ok)
+
+
+def test_limiter_additive_increase():
+    """Test the limit grows by one per healthy window up to maximum."""
+    limiter = AdaptiveLimiter(2, 1, 4, window=5)
+    run_window(limiter, 0.1)
+    assert limiter.limit == 3
+    run_window(limiter, 0.1)
+    run_window(limiter, 0.1)
+    assert limiter.limit == 4
+
+
+def test_limiter_decrease_on_errors():
+    """Test the limit is halved when the error rate is too high."""
+    limiter = AdaptiveLimiter(8, 1, 8, window=5)
+    run_window(limiter, 0.1, ok=False)
+    assert limiter.limit == 4
+
+
+def test_limiter_decrease_on_latency():
+    """Test the limit is halved when latency degrades."""
+    limiter = AdaptiveLimiter(8, 1, 16, window=5)
+    run_window(limiter, 0.1)
+    run_window(limiter, 0.5)
+    assert limiter.limit == 4
+
+
+def test_host_rate_limiter():
+    """Test requests to one host are spaced by the rate interval."""
+    rate_limiter = HostRateLimiter(50)
+    start = monotonic()
+    for _ in range(5):
+        rate_limiter.wait('http://127.0.0.1/players/a/')
+    assert monotonic() - start >= 4 / 50
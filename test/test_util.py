@@ -0,0 +1,100 @@
+import os
+import pytest
+import lxml.html
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.stand_in_server import FIXTURE_SITE
+from app.fetch import uncomment_tables
+from app.metrics import CrawlMetrics
+from app.retry import RetryQueue
+from app.util import (
+    footer_stats, parse_player_page, parse_queue_listener, player_index_rows,
+    PER_GAME_FIELDS)
+
+
+def read_fixture(path):
+    """Return a saved page with its stat tables un-commented."""
+    with open(os.path.join(FIXTURE_SITE, path)) as f:
+        return uncomment_tables(f.read())
+
+
+def test_parse_player_page():
+    """Test a player's row is parsed from the saved page."""
+    row = parse_player_page(read_fixture('players/j/jordami01.html'))
+
+    assert row['player_name'] == 'Michael Jordan'
+    assert row['player_image'] == 'jordami01.jpg'
+    assert row['first_nba_season'] == 1984
+    assert row['last_nba_season'] == 1999
+    assert row['position'] == 'SG, SF'
+    assert row['points'] == 18.7
+    assert row['true_stg_pct'] == 0.572
+
+
+def test_parse_player_seasons():
+    """Test a row is parsed for every season of the per game table."""
+    row = parse_player_page(read_fixture('players/j/jordami01.html'))
+    first = row['seasons'][0]
+
+    assert len(row['seasons']) == 15
+    assert first['season'] == 1985
+    assert first['team'] == 'CHI'
+    assert first['games'] == 71
+    assert first['points'] == 18.5
+    assert first['true_stg_pct'] == 0.646
+    assert row['seasons'][-1]['season'] == row['last_nba_season']
+
+
+def test_player_index_rows():
+    """Test player URLs are listed with the last season they played."""
+    rows = player_index_rows(read_fixture('players/j/index.html'), '')
+
+    assert ('/players/j/jamesle01.html', 2020) in rows
+    assert ('/players/j/jordami01.html', 1999) in rows
+
+
+def test_parse_player_page_missing_table():
+    """Test a page without per game stats raises ValueError."""
+    with pytest.raises(ValueError):
+        parse_player_page('<html><body><h1 itemprop="name">X</h1></body>'
+                          '</html>')
+
+
+def test_footer_stats_empty_cells():
+    """Test empty and missing footer cells are converted to None."""
+    table = lxml.html.fromstring(
+        '<table><tfoot><tr><th data-stat="season">Career</th>'
+        '<td data-stat="fg_per_g">9.1</td><td data-stat="fg3_per_g"></td>'
+        '</tr></tfoot></table>')
+    row = footer_stats(table, PER_GAME_FIELDS)
+
+    assert row['field_goal_made'] == 9.1
+    assert row['three_pt_made'] is None
+    assert row['turnovers'] is None
+
+
+def test_parse_queue_listener():
+    """Test pages are parsed in the process pool and routed by result."""
+    data_queue, html_queue, row_queue = Queue(), Queue(), Queue()
+    metrics = CrawlMetrics()
+    retry_queue = RetryQueue(data_queue, 1, 0, 0, metrics)
+    for url in ('players/j/jordami01.html', 'players/j/index.html'):
+        data_queue.put(url)
+        html_queue.put((data_queue.get(), read_fixture(url)))
+    html_queue.put('STOP')
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        parse_queue_listener(
+            html_queue, executor, 2, data_queue, row_queue, retry_queue,
+            metrics)
+    data_queue.join()
+    retry_queue.close()
+
+    results = dict(row_queue.get() for _ in range(2))
+    assert results['players/j/jordami01.html']['slug'] == 'jordami01'
+    assert isinstance(results['players/j/index.html'], ValueError)
+    assert retry_queue.dead_letters[0][0] == 'players/j/index.html'
+    assert metrics.stages['parse'][0] == 1
+    assert metrics.counters['dead_letters'] == 1
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from app.metrics import CrawlMetrics
+from app.work_queue import LeasedQueue, LeasedRetryQueue, RedisWorkQueue
+from test.support.stand_in_redis import StandInRedis
+
+
+URLS = [f'/players/a/a0{i}.html' for i in range(5)]
+
+
+def test_add_queues_each_url_once():
+    """Test URLs already queued or done are not queued again."""
+    work_queue = RedisWorkQueue(StandInRedis())
+    assert work_queue.add(URLS[:3] + URLS[:1]) == URLS[:3]
+    work_queue.complete(URLS[:1])
+
+    assert work_queue.add(URLS) == URLS[3:]
+    assert work_queue.remaining() == 4
+
+
+def test_leases_are_exclusive():
+    """Test concurrent workers never lease the same URL."""
+    redis = StandInRedis()
+    RedisWorkQueue(redis).add(URLS)
+    workers = [RedisWorkQueue(redis) for _ in range(4)]
+
+    def lease_all(work_queue):
+        leased = []
+        url = work_queue.lease()
+        while url is not None:
+            leased.append(url)
+            url = work_queue.lease()
+        return leased
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        leased = [url for urls in executor.map(lease_all, workers)
+                  for url in urls]
+
+    assert sorted(leased) == URLS
+    assert workers[0].remaining() == len(URLS)
+
+
+def test_expired_lease_is_taken_over():
+    """Test the URL of a worker that died is leased again."""
+    redis = StandInRedis()
+    dead_worker = RedisWorkQueue(redis, lease_seconds=0.05)
+    dead_worker.add(URLS[:1])
+    assert dead_worker.lease() == URLS[0]
+    worker = RedisWorkQueue(redis, lease_seconds=0.05)
+    assert worker.lease() is None
+
+    sleep(0.1)
+    assert worker.lease() == URLS[0]
+
+
+def test_complete_is_idempotent():
+    """Test completing a URL twice, e.g. after a takeover, is harmless."""
+    work_queue = RedisWorkQueue(StandInRedis())
+    work_queue.add(URLS[:2])
+    url = work_queue.lease()
+    work_queue.complete([url])
+    work_queue.complete([url])
+
+    assert work_queue.remaining() == 1
+    assert work_queue.lease() == URLS[1]
+
+
+def test_fail_backs_off_then_gives_up():
+    """Test failed URLs wait before a retry and are given up on."""
+    work_queue = RedisWorkQueue(StandInRedis())
+    work_queue.add(URLS[:1])
+    error = ValueError('boom')
+
+    assert work_queue.fail(work_queue.lease(), error, 2, 60, 60)
+    assert work_queue.lease() is None
+    assert work_queue.remaining() == 1
+
+    work_queue.redis.zadd(work_queue.key('queue'), {URLS[0]: 0}, xx=True)
+    assert not work_queue.fail(work_queue.lease(), error, 2, 60, 60)
+    assert work_queue.remaining() == 0
+    assert work_queue.dead_letters() == [(URLS[0], 2, repr(error))]
+
+
+def test_leased_retry_queue_counts_failures():
+    """Test failures, retries and dead letters are counted in metrics."""
+    metrics = CrawlMetrics()
+    work_queue = RedisWorkQueue(StandInRedis())
+    work_queue.add(URLS[:1])
+    retry_queue = LeasedRetryQueue(work_queue, 2, 0, 0, metrics)
+    retry_queue.retry(work_queue.lease(), ValueError('boom'))
+    retry_queue.retry(work_queue.lease(), ValueError('boom'))
+    retry_queue.close()
+
+    assert metrics.counters['failures'] == 2
+    assert metrics.counters['retries'] == 1
+    assert metrics.counters['dead_letters'] == 1
+    assert [url for url, _, _ in retry_queue.dead_letters] == URLS[:1]
+
+
+def test_leased_queue_join_waits_for_seeding():
+    """Test join() returns only once seeding is over and nothing is left."""
+    work_queue = RedisWorkQueue(StandInRedis())
+    data_queue = LeasedQueue(work_queue, poll=0.01)
+    work_queue.start_seeding()
+
+    def seed_and_crawl():
+        sleep(0.05)
+        data_queue.put(URLS[0])
+        work_queue.stop_seeding()
+        work_queue.complete([data_queue.get()])
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        crawl = executor.submit(seed_and_crawl)
+        data_queue.join()
+        assert crawl.done()
+        crawl.result()
+
+    data_queue.put('STOP')
+    assert data_queue.get() == 'STOP'
+
+
+def test_seeding_is_renewed():
+    """Test the seeding flag outlives lease_seconds until it is stopped."""
+    work_queue = RedisWorkQueue(StandInRedis(), lease_seconds=0.06)
+    work_queue.start_seeding()
+    sleep(0.15)
+    assert work_queue.seeding()
+
+    work_queue.stop_seeding()
+    assert not work_queue.seeding()
+    sleep(0.05)
+    assert not work_queue.seeding()
+
+
+def test_reset_releases_leases():
+    """Test a new crawl can lease URLs leased in the one it replaces."""
+    redis = StandInRedis()
+    old_worker = RedisWorkQueue(redis)
+    old_worker.add(URLS[:1])
+    assert old_worker.lease() == URLS[0]
+
+    worker = RedisWorkQueue(redis)
+    worker.reset()
+    worker.add(URLS[:1])
+    assert worker.lease() == URLS[0]
@@ -0,0 +1,202 @@
+import os
+import copy
+from queue import Queue
+from time import sleep
+from dotenv import load_dotenv
+load_dotenv('.flaskenv')
+from test.support.configure_test import app
+from test.support.stand_in_redis import StandInRedis
+from test.support.stand_in_server import FIXTURE_SITE
+from app import create_app, db
+from app.models import Player, PlayerSeason
+from app.checkpoint import add_player_pages, resume_crawl, start_crawl
+from app.fetch import uncomment_tables
+from app.metrics import CrawlMetrics
+from app.util import parse_page
+from app.work_queue import LeasedQueue, RedisWorkQueue
+from app.writer import (
+    changed_rows, upsert_players, player_writer, write_batch, write_seasons)
+from config import TestingConfig
+
+
+def test_upsert_players_insert(app):
+    """Test new slugs are inserted."""
+    app = app(TestingConfig)
+
+    upsert_players(db, [
+        {'slug': 'jamesle01', 'player_name': 'LeBron James', 'points': 27.1},
+        {'slug': 'jordami01', 'player_name': 'Michael Jordan', 'points': 30.1},
+    ])
+    db.session.commit()
+
+    assert db.session.query(Player).count() == 2
+
+
+def test_upsert_players_update(app):
+    """Test existing slugs are updated instead of duplicated."""
+    app = app(TestingConfig)
+
+    upsert_players(db, [
+        {'slug': 'jamesle01', 'player_name': 'LeBron James', 'points': 27.1}])
+    db.session.commit()
+    upsert_players(db, [
+        {'slug': 'jamesle01', 'player_name': 'LeBron James', 'points': 27.2}])
+    db.session.commit()
+
+    assert db.session.query(Player).count() == 1
+    assert db.session.query(Player).one().points == 27.2
+
+
+def test_player_writer_batches(app):
+    """
+    Test the writer stage writes every (url, row) pair, including a partial
+    batch, and checkpoints the URLs of rows and of failures.
+    """
+    app = app(TestingConfig)
+    urls = [f'/players/p/player{i}.html' for i in range(6)]
+    start_crawl(db, ['/players/p/'])
+    add_player_pages(db, '/players/p/', urls)
+    row_queue = Queue()
+    errors = []
+    for i, url in enumerate(urls[:5]):
+        row_queue.put((url, {'slug': f'player{i}',
+                             'player_name': f'Player {i}'}))
+    row_queue.put((urls[5], ValueError('timeout')))
+    row_queue.put('STOP')
+
+    player_writer(row_queue, db, app, 2, errors)
+
+    assert not errors
+    assert db.session.query(Player).count() == 5
+    assert resume_crawl(db) == ([], [urls[5]])
+
+
+def test_player_writer_fails_unwritable_urls(monkeypatch):
+    """
+    Test the URLs of a batch that cannot be written are failed in the work
+    queue until given up on, so waiting for the crawl still returns.
+    """
+    test_app = create_app(TestingConfig)
+    test_app.config.update(CRAWL_MAX_ATTEMPTS=2, CRAWL_RETRY_DELAY=0.01,
+                           CRAWL_MAX_RETRY_DELAY=0.01)
+
+    def write_batch(*args):
+        raise ValueError('value too long for type character varying(3)')
+    monkeypatch.setattr('app.writer.write_batch', write_batch)
+    urls = [f'/players/p/player{i}.html' for i in range(3)]
+    work_queue = RedisWorkQueue(StandInRedis())
+    work_queue.add(urls)
+
+    errors = []
+    for _ in range(2):
+        sleep(0.05)
+        row_queue = Queue()
+        for url in iter(work_queue.lease, None):
+            row_queue.put((url, {'slug': url.split('/')[-1][:-5]}))
+        row_queue.put('STOP')
+        player_writer(row_queue, db, test_app, 10, errors,
+                      checkpoint=False, work_queue=work_queue)
+
+    assert len(errors) == 2
+    assert work_queue.remaining() == 0
+    LeasedQueue(work_queue).join()
+    assert [(url, attempts) for url, attempts, _
+            in work_queue.dead_letters()] == [(url, 2) for url in urls]
+
+
+def test_changed_rows(app):
+    """Test only new players and players with different values are kept."""
+    app = app(TestingConfig)
+    upsert_players(db, [
+        {'slug': 'jamesle01', 'player_name': 'LeBron James', 'points': 27.1},
+        {'slug': 'jordami01', 'player_name': 'Michael Jordan', 'points': 30.1},
+    ])
+    db.session.commit()
+
+    rows = changed_rows(db, [
+        {'slug': 'jamesle01', 'player_name': 'LeBron James', 'points': 27.1},
+        {'slug': 'jordami01', 'player_name': 'Michael Jordan', 'points': 30.2},
+        {'slug': 'bryanko01', 'player_name': 'Kobe Bryant', 'points': 25.0},
+    ])
+
+    assert [row['slug'] for row in rows] == ['jordami01', 'bryanko01']
+
+
+def test_write_seasons_current_season(app):
+    """
+    Test a refresh rewrites only current seasons and keeps the career line
+    parsed from the page.
+    """
+    app = app(TestingConfig)
+
+    def season(year, points):
+        return {'season': year, 'team': 'LAL', 'games': 50,
+                'points': points}
+    row = {'slug': 'jamesle01', 'player_name': 'LeBron James',
+           'seasons': [season(2019, 27.4), season(2020, 25.3)]}
+    upsert_players(db, [{'slug': 'jamesle01', 'player_name': 'LeBron James',
+                         'points': 26.4}])
+    write_seasons(db, [row])
+    db.session.commit()
+    first = db.session.query(PlayerSeason).filter_by(season=2019).one().id
+
+    row['seasons'] = [season(2019, 0.0), season(2020, 26.3)]
+    write_seasons(db, [row], season=2020)
+    db.session.commit()
+
+    seasons = db.session.query(PlayerSeason).order_by(PlayerSeason.season)
+    assert [s.points for s in seasons] == [27.4, 26.3]
+    assert seasons[0].id == first
+    assert db.session.query(Player).one().points == 26.4
+
+
+def test_refresh_unchanged_pages(app):
+    """
+    Test refreshing a player whose current season changed writes it once,
+    then refreshing the same page again writes nothing.
+    """
+    app = app(TestingConfig)
+    url = '/players/j/jamesle01.html'
+    with open(os.path.join(FIXTURE_SITE, 'players', 'j',
+                           'jamesle01.html')) as f:
+        row = parse_page(url, uncomment_tables(f.read()))
+    write_batch(db, [(url, copy.deepcopy(row))], CrawlMetrics(),
+                checkpoint=False)
+    season = row['seasons'][-1]['season']
+    row['seasons'][-1]['games'] += 1
+    row['points'] = round(row['points'] + 0.1, 1)
+
+    written = []
+    for _ in range(3):
+        metrics = CrawlMetrics()
+        write_batch(db, [(url, copy.deepcopy(row))], metrics,
+                    checkpoint=False, season=season)
+        written.append(metrics.counters['pages_written'])
+
+    assert written == [1, 0, 0]
+    assert db.session.query(Player).one().points == row['points']
+
+
+def test_refresh_current_season_only(app):
+    """
+    Test a refresh rewrites a current season that changed even when the
+    player row and the number of seasons did not.
+    """
+    app = app(TestingConfig)
+
+    def season(year, games, points):
+        return {'season': year, 'team': 'LAL', 'games': games,
+                'points': points}
+    row = {'slug': 'jamesle01', 'player_name': 'LeBron James',
+           'points': 26.4, 'seasons': [season(2019, 50, 27.4),
+                                       season(2020, 10, 26.0)]}
+    write_batch(db, [('/players/j/jamesle01.html', copy.deepcopy(row))],
+                CrawlMetrics(), checkpoint=False)
+    row['seasons'][-1] = season(2020, 11, 26.4)
+
+    assert changed_rows(db, [row], season=2020) == [row]
+    write_batch(db, [('/players/j/jamesle01.html', copy.deepcopy(row))],
+                CrawlMetrics(), checkpoint=False, season=2020)
+    current = db.session.query(PlayerSeason).filter_by(season=2020).one()
+    assert (current.games, current.points) == (11, 26.4)
+    assert changed_rows(db, [row], season=2020) == []